@@ -2,13 +2,25 @@
 FastAPI 异步问答接口
 仅调用 Service 层，禁止直接写 DB/RAG 逻辑
 """
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import asyncio
+import json
+import math
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
 from api.routes.health import router as health_router
 from api.routes.upload import router as upload_router
 from api.routes.search import router as search_router
 from api.routes.tags import router as tags_router
+from api.routes.documents import router as documents_router
+from core.config import settings
+from core.db_executor import VectorDBBusyError
+from core.deadline import DeadlineExceeded, ask_deadline, deadline_scope
+from core.llm import LLMUnavailableError
 from core.rag_service import RAGService
 from core.logger import get_logger
 
@@ -22,29 +34,111 @@ class AskRequest(BaseModel):
 class AskResponse(BaseModel):
     answer: str
     sources: list[str]
+    degraded: bool = Field(False, description="大模型超时或不可用，answer 为检索原文摘录")
+
+
+class CorrectionRequest(BaseModel):
+    question: str = Field(..., min_length=1)
+    answer: str = Field(..., min_length=1, description="正确答案")
+    wrong_answer: str = Field("", description="原错误回答")
+
+
+class CorrectionResponse(BaseModel):
+    id: int
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 本地模型冷加载需数十秒：启动后在后台预热，不阻塞服务就绪
+    if settings.OLLAMA_WARMUP and hasattr(rag.llm, "warm_up"):
+        app.state.warmup = asyncio.create_task(rag.llm.warm_up())
+    yield
 
-app = FastAPI(title="QMS-Nexus API", version="0.1.0")
+
+app = FastAPI(title="QMS-Nexus API", version="0.1.0", lifespan=lifespan)
 
 # 注册路由
 app.include_router(health_router)
 app.include_router(upload_router)
 app.include_router(search_router)
 app.include_router(tags_router)
+app.include_router(documents_router)
 
 rag = RAGService()
 
 
 @app.post("/ask", response_model=AskResponse)
-async def ask(req: AskRequest):
-    """RAG 问答，无结果时返回固定文案"""
+async def ask(req: AskRequest, x_api_key: Optional[str] = Header(None)):
+    """RAG 问答，无结果时返回固定文案；大模型超时或不可用时返回检索原文（degraded=true），更早阶段超时 504"""
     try:
-        answer, sources = await rag.answer(req.question)
+        with deadline_scope(ask_deadline(x_api_key)):
+            answer, sources = await rag.answer(req.question)
         return AskResponse(answer=answer, sources=sources)
+    except DeadlineExceeded as e:
+        if e.partial is None:
+            raise HTTPException(status_code=504, detail=str(e))
+        answer, sources = e.partial
+        return AskResponse(answer=answer, sources=sources, degraded=True)
+    except LLMUnavailableError as e:
+        if e.partial is None:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+        answer, sources = e.partial
+        return AskResponse(answer=answer, sources=sources, degraded=True)
+    except VectorDBBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _ask_events(sources: list[str], pieces: AsyncIterator[str]) -> AsyncIterator[str]:
+    # 客户端断开时 Starlette 取消本生成器，finally 中关闭 pieces 即断开上游大模型请求
+    answer = []
+    try:
+        yield _sse("sources", {"sources": sources})
+        async for piece in pieces:
+            answer.append(piece)
+            yield _sse("token", {"text": piece})
+        yield _sse("done", {"answer": "".join(answer), "sources": sources})
+    except Exception as e:
+        logger.error(f"流式问答中断: {e}")
+        yield _sse("error", {"detail": str(e)})
+    finally:
+        await pieces.aclose()
+
+
+@app.post("/ask/stream")
+async def ask_stream(req: AskRequest, x_api_key: Optional[str] = Header(None)):
+    """流式 RAG 问答（SSE）：sources 事件 → 若干 token 事件 → done 事件（完整答案，同时写入答案缓存）"""
+    try:
+        with deadline_scope(ask_deadline(x_api_key)):
+            sources, pieces = await rag.open_stream(req.question)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except VectorDBBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        _ask_events(sources, pieces),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/corrections", response_model=CorrectionResponse)
+async def add_correction(req: CorrectionRequest):
+    """提交人工修正答案（US-Alpha-03），之后相同/相近问题直接返回该答案"""
+    try:
+        correction_id = await rag.add_correction(req.question, req.answer, req.wrong_answer)
+    except VectorDBBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return CorrectionResponse(id=correction_id)
+
+
 @app.get("/metrics")
 def metrics():
     """Prometheus 指标暴露"""
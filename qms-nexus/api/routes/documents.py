@@ -0,0 +1,77 @@
+"""
+知识库文档管理：列出已入库文档、按文件删除（单个/批量）、清空知识库
+"""
+from typing import Dict, List
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+
+from core.db_executor import VectorDBBusyError
+from core.logger import get_logger
+from core.vectordb import VectorDBClient
+
+logger = get_logger(__name__)
+
+router = APIRouter()
+client = VectorDBClient()
+
+
+class DocumentOut(BaseModel):
+    filename: str
+    chunks: int
+    version: int
+
+
+class BulkDeleteRequest(BaseModel):
+    filenames: List[str] = Field(..., min_length=1, max_length=1000, description="待删除的文件名")
+
+
+class DeleteResult(BaseModel):
+    deleted: Dict[str, int]  # filename -> 删除 chunk 数
+
+
+def _busy(e: VectorDBBusyError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+
+@router.get("/documents", response_model=List[DocumentOut])
+async def list_documents():
+    """列出已入库文档及其 chunk 数、版本号。"""
+    try:
+        docs = await client.documents()
+    except VectorDBBusyError as e:
+        raise _busy(e)
+    return [DocumentOut(filename=name, chunks=n, version=v) for name, n, v in docs]
+
+
+@router.delete("/documents/{filename}", response_model=DeleteResult)
+async def delete_document(filename: str):
+    """删除单个文档的全部 chunk。"""
+    try:
+        n = await client.delete_by_filename(filename)
+    except VectorDBBusyError as e:
+        raise _busy(e)
+    if n == 0:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    return DeleteResult(deleted={filename: n})
+
+
+@router.post("/documents/delete", response_model=DeleteResult)
+async def delete_documents(body: BulkDeleteRequest):
+    """批量删除文档，一次写任务完成。"""
+    try:
+        deleted = await client.delete_by_filenames(body.filenames)
+    except VectorDBBusyError as e:
+        raise _busy(e)
+    return DeleteResult(deleted=deleted)
+
+
+@router.delete("/documents")
+async def clear_documents():
+    """清空知识库（US-MVP-07）：删除并重建 collection，重新上传可正常入库。"""
+    try:
+        await client.clear_collection()
+    except VectorDBBusyError as e:
+        raise _busy(e)
+    logger.info("知识库已清空", extra={"user": "anonymous"})
+    return {"detail": "知识库已清空"}
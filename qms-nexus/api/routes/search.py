@@ -1,14 +1,15 @@
 """
-检索接口：支持 ?q=&filter_tags=
+检索接口：支持 ?q=&filter_tags=&tag_expr=&mode=&collections=，以及 POST /search/batch 批量检索
 """
 import time
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Query
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
 
+from core.db_executor import VectorDBBusyError
 from core.vectordb import VectorDBClient
-from core.metrics import search_counter, search_duration
+from core.metrics import search_counter, search_duration, search_batch_size
 
 router = APIRouter()
 client = VectorDBClient()
@@ -18,20 +19,50 @@ class SearchResult(BaseModel):
     text: str
     source: str
     tags: List[str]
-    score: float
+    score: float  # 余弦相似度
+    rrf_score: Optional[float] = None  # 混合检索的 RRF 融合分，结果按此排序
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=64, description="查询文本列表")
+    filter_tags: List[str] = Field(default_factory=list, description="标签过滤，对全部查询生效")
+    tag_expr: Optional[str] = Field(None, description="标签表达式，支持 AND / OR / NOT 与括号")
+    top_k: int = Field(5, ge=1, le=100)
+    mode: Literal["vector", "hybrid"] = "vector"
+
+
+class BatchSearchItem(BaseModel):
+    q: str
+    results: List[SearchResult]
 
 
 @router.get("/search", response_model=List[SearchResult])
 async def search(
     q: str = Query(..., description="查询文本"),
-    filter_tags: Optional[List[str]] = Query(None, description="标签过滤"),
+    filter_tags: Optional[List[str]] = Query(None, description="标签过滤（任一命中）"),
+    tag_expr: Optional[str] = Query(None, description="标签表达式，如 设计文档 AND NOT 作废"),
     top_k: int = Query(5, ge=1, le=100),
+    mode: Literal["vector", "hybrid"] = Query("vector", description="vector：纯向量；hybrid：BM25 + 向量 RRF 融合"),
+    collections: Optional[List[str]] = Query(None, description="并发检索多个知识库，按分数合并取 top_k"),
 ):
     """语义检索，返回带标签的结果。"""
     t0 = time.time()
     status = "ok"
     try:
-        results = await client.similarity_search(q, top_k=top_k, filter_tags=filter_tags)
+        if collections:
+            results = await client.search_collections(
+                q, collections, top_k=top_k, filter_tags=filter_tags, mode=mode, tag_expr=tag_expr
+            )
+        else:
+            results = await client.similarity_search(
+                q, top_k=top_k, filter_tags=filter_tags, mode=mode, tag_expr=tag_expr
+            )
+    except VectorDBBusyError as e:
+        status = "busy"
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        status = "bad_request"
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception:
         status = "error"
         raise
@@ -44,6 +75,45 @@ async def search(
             source=r.source,
             tags=r.tags,
             score=r.score,
+            rrf_score=r.rrf_score,
         )
         for r in results
-    ]
\ No newline at end of file
+    ]
+
+
+@router.post("/search/batch", response_model=List[BatchSearchItem])
+async def search_batch(body: BatchSearchRequest):
+    """批量语义检索，一次向量库往返，结果顺序与 queries 一致。"""
+    t0 = time.time()
+    status = "ok"
+    try:
+        batches = await client.similarity_search_many(
+            body.queries,
+            top_k=body.top_k,
+            filter_tags=body.filter_tags or None,
+            mode=body.mode,
+            tag_expr=body.tag_expr,
+        )
+    except VectorDBBusyError as e:
+        status = "busy"
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        status = "bad_request"
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        search_duration.observe(time.time() - t0)
+        search_counter.labels(status=status).inc(len(body.queries))
+        search_batch_size.observe(len(body.queries))
+    return [
+        BatchSearchItem(
+            q=q,
+            results=[
+                SearchResult(text=r.text, source=r.source, tags=r.tags, score=r.score, rrf_score=r.rrf_score)
+                for r in results
+            ],
+        )
+        for q, results in zip(body.queries, batches)
+    ]
@@ -0,0 +1,162 @@
+"""
+Roaring 风格压缩位图：按高 16 位分桶，稀疏桶存有序 uint16 数组，稠密桶存 65536 位位图。
+用于标签 → chunk 序号的倒排，集合运算均为 numpy 向量化实现。
+"""
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+ARRAY_MAX = 4096  # 数组容器上限，超过后转为位图容器（8KB）
+_WORDS = 1024  # 65536 位 / 64
+
+
+def _is_bitmap(c: np.ndarray) -> bool:
+    return c.dtype == np.uint64
+
+
+def _to_words(c: np.ndarray) -> np.ndarray:
+    if _is_bitmap(c):
+        return c
+    bits = np.zeros(65536, dtype=bool)
+    bits[c] = True
+    return np.packbits(bits, bitorder="little").view(np.uint64)
+
+
+def _words_to_array(words: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder="little")).astype(np.uint16)
+
+
+def _cardinality(c: np.ndarray) -> int:
+    if _is_bitmap(c):
+        return int(np.unpackbits(c.view(np.uint8)).sum())
+    return len(c)
+
+
+def _bits_of(words: np.ndarray, values: np.ndarray) -> np.ndarray:
+    v = values.astype(np.uint64)
+    return ((words[v >> np.uint64(6)] >> (v & np.uint64(63))) & np.uint64(1)).astype(bool)
+
+
+def _normalize(c: np.ndarray) -> Optional[np.ndarray]:
+    """按基数选择容器类型，空容器返回 None。"""
+    if _is_bitmap(c):
+        n = _cardinality(c)
+        if n == 0:
+            return None
+        return _words_to_array(c) if n <= ARRAY_MAX else c
+    if len(c) == 0:
+        return None
+    return _to_words(c) if len(c) > ARRAY_MAX else c
+
+
+def _and(a: np.ndarray, b: np.ndarray) -> Optional[np.ndarray]:
+    if _is_bitmap(a) and _is_bitmap(b):
+        return _normalize(a & b)
+    if _is_bitmap(a):
+        a, b = b, a
+    if _is_bitmap(b):
+        return _normalize(a[_bits_of(b, a)])
+    return _normalize(np.intersect1d(a, b, assume_unique=True))
+
+
+def _or(a: np.ndarray, b: np.ndarray) -> Optional[np.ndarray]:
+    if not _is_bitmap(a) and not _is_bitmap(b) and len(a) + len(b) <= ARRAY_MAX:
+        return _normalize(np.union1d(a, b))
+    return _normalize(_to_words(a) | _to_words(b))
+
+
+def _andnot(a: np.ndarray, b: np.ndarray) -> Optional[np.ndarray]:
+    if _is_bitmap(a):
+        return _normalize(a & ~_to_words(b))
+    if _is_bitmap(b):
+        return _normalize(a[~_bits_of(b, a)])
+    return _normalize(np.setdiff1d(a, b, assume_unique=True))
+
+
+class RoaringBitmap:
+    """不可变风格的 uint32 集合：运算返回新对象，add/discard 原地修改。"""
+
+    __slots__ = ("_containers",)
+
+    def __init__(self, values: Optional[Iterable[int]] = None):
+        self._containers: Dict[int, np.ndarray] = {}
+        if values is not None:
+            self.add_many(values)
+
+    @classmethod
+    def _from_containers(cls, containers: Dict[int, np.ndarray]) -> "RoaringBitmap":
+        bm = cls()
+        bm._containers = containers
+        return bm
+
+    @classmethod
+    def _from_values(cls, values: Iterable[int]) -> "RoaringBitmap":
+        arr = np.unique(np.asarray(values if isinstance(values, np.ndarray) else list(values), dtype=np.uint32))
+        containers: Dict[int, np.ndarray] = {}
+        if len(arr):
+            highs = arr >> 16
+            keys, starts = np.unique(highs, return_index=True)
+            bounds = list(starts[1:]) + [len(arr)]
+            for key, start, end in zip(keys.tolist(), starts.tolist(), bounds):
+                containers[key] = _normalize((arr[start:end] & 0xFFFF).astype(np.uint16))
+        return cls._from_containers(containers)
+
+    # -------- 原地修改 --------
+    def add_many(self, values: Iterable[int]) -> None:
+        self._containers = (self | self._from_values(values))._containers
+
+    def discard_many(self, values: Iterable[int]) -> None:
+        self._containers = (self - self._from_values(values))._containers
+
+    # -------- 集合运算 --------
+    def __and__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        out = {}
+        for key in self._containers.keys() & other._containers.keys():
+            c = _and(self._containers[key], other._containers[key])
+            if c is not None:
+                out[key] = c
+        return self._from_containers(out)
+
+    def __or__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        out = dict(self._containers)
+        for key, c in other._containers.items():
+            out[key] = _or(out[key], c) if key in out else c
+        return self._from_containers(out)
+
+    def __sub__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        out = {}
+        for key, c in self._containers.items():
+            if key in other._containers:
+                c = _andnot(c, other._containers[key])
+            if c is not None:
+                out[key] = c
+        return self._from_containers(out)
+
+    def __len__(self) -> int:
+        return sum(_cardinality(c) for c in self._containers.values())
+
+    def __bool__(self) -> bool:
+        return bool(self._containers)
+
+    def __contains__(self, value: int) -> bool:
+        c = self._containers.get(value >> 16)
+        if c is None:
+            return False
+        low = value & 0xFFFF
+        if _is_bitmap(c):
+            return bool((int(c[low >> 6]) >> (low & 63)) & 1)
+        i = np.searchsorted(c, low)
+        return i < len(c) and c[i] == low
+
+    def to_array(self) -> np.ndarray:
+        parts = [
+            (np.uint32(key) << np.uint32(16)) | (_words_to_array(c) if _is_bitmap(c) else c).astype(np.uint32)
+            for key, c in sorted(self._containers.items())
+        ]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.uint32)
+
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self._containers.values())
+
+    def __repr__(self) -> str:
+        return f"RoaringBitmap(len={len(self)}, containers={len(self._containers)})"
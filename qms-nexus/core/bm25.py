@@ -0,0 +1,122 @@
+"""
+进程内中文 BM25 倒排索引：CJK 二元切分 + 字母数字整词，增量维护。
+持久化为追加式段文件（正排词频），启动时回放段文件即可，无需重新分词。
+"""
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Container, Dict, Iterable, List, Optional, Tuple
+
+from core.segment_index import SegmentedIndex
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.\-_/][a-z0-9]+)*|[\u3400-\u9fff\uf900-\ufaff]+")
+_SUB = re.compile(r"[a-z]+|[0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """CJK 连续段切二元组（单字段保留单字）；型号/条款号整词保留，并补充字母、数字子词。"""
+    tokens: List[str] = []
+    for m in _TOKEN.finditer(unicodedata.normalize("NFKC", text).lower()):
+        run = m.group()
+        if run[0].isascii():
+            tokens.append(run)
+            parts = _SUB.findall(run)
+            if len(parts) > 1:
+                tokens.extend(parts)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index(SegmentedIndex):
+    """BM25 倒排索引；add/remove 先进内存，commit() 落一个段文件。"""
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75, max_segments: int = 32):
+        super().__init__(path, max_segments)
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._total_len = 0
+        self._open()
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    # -------- 内存结构 --------
+    def _reset(self) -> None:
+        self._postings.clear()
+        self._doc_terms.clear()
+        self._doc_len.clear()
+        self._total_len = 0
+
+    def _apply_add(self, doc_id: str, terms: Dict[str, int]) -> None:
+        self._apply_del(doc_id)
+        self._doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self._doc_len[doc_id] = length
+        self._total_len += length
+        for term, tf in terms.items():
+            self._postings[term][doc_id] = tf
+
+    def _apply_del(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._total_len -= self._doc_len.pop(doc_id)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    def _live_items(self):
+        return self._doc_terms.items()
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]) -> None:
+        """新增或覆盖文档。"""
+        with self._lock:
+            for doc_id, text in zip(ids, texts):
+                terms = dict(Counter(tokenize(text)))
+                self._apply_add(doc_id, terms)
+                self._record_add(doc_id, terms)
+
+    def remove(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for doc_id in ids:
+                self._apply_del(doc_id)
+                self._record_del(doc_id)
+
+    def search(self, query: str, top_k: int = 10, candidates: Optional[Container[str]] = None) -> List[Tuple[str, float]]:
+        """返回 [(doc_id, bm25 分)]，按分数降序；candidates 非空时只在其中打分。"""
+        with self._lock:
+            n = len(self._doc_len)
+            if n == 0:
+                return []
+            avgdl = self._total_len / n
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    if candidates is not None and doc_id not in candidates:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avgdl)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """RRF 融合多路排序：score = Σ 1 / (k + rank)。"""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
@@ -1,24 +1,366 @@
 """
-Redis 缓存封装（TTL、序列化）
+Redis 缓存封装（TTL、序列化），基于 redis.asyncio，不阻塞事件循环
+同一进程内的 CacheClient 共享一个按 CACHE_POOL_SIZE 限额的连接池，连接用尽时排队等待。
+答案可登记所引用的文档：反向索引 deps:<filename> → 缓存 key，文档变更时只删除受影响的答案。
+写入时 SETEX、反向索引登记、失效广播在同一 pipeline 中一次往返完成；mget/mset 批量读写。
+缓存值经 CacheCodec 编码为带格式号的二进制（见 core/codec.py），兼容读取旧的 JSON 文本。
+可选 L1 进程内缓存（按字节限额的 LRU + 每条 TTL）挡在 Redis 前面；写入/删除经 Redis pub/sub 广播，
+各副本同时丢弃本地副本。订阅由后台 asyncio 任务维护，断开期间不使用 L1，重连后清空。
+使用共享连接池的 CacheClient 在进程内共用一份 L1 与一个订阅任务；get_cache_client() 返回进程级共享实例。
 """
+import asyncio
 import json
-import redis
-from typing import Any, Optional
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import redis.asyncio as aioredis
+
+from core.codec import CacheCodec
+from core.config import settings
+from core.logger import get_logger
+from core.metrics import answer_cache_l1_bytes, answer_cache_requests, cache_op_duration
+
+logger = get_logger(__name__)
+
+_DEPS_KEY = "deps:{}"
+_INVALIDATE_CHANNEL = "qms:cache:invalidate"
+_ENTRY_OVERHEAD = 200  # 每条的 dict/OrderedDict 开销估算（字节）
+_POLL_TIMEOUT = 30.0  # 订阅空闲时单次等待消息的秒数
+
+# 仅当 value 仍是自己的 token 时删除，避免误删他人续上的租约
+_RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+_pools: Dict[str, aioredis.BlockingConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_redis(url: Optional[str] = None) -> aioredis.Redis:
+    """按 URL 共享连接池的 Redis 客户端；池满时最多等待 CACHE_SOCKET_TIMEOUT 秒。"""
+    url = url or settings.CACHE_URL
+    with _pools_lock:
+        pool = _pools.get(url)
+        if pool is None:
+            pool = _pools[url] = aioredis.BlockingConnectionPool.from_url(
+                url,
+                max_connections=settings.CACHE_POOL_SIZE,
+                timeout=settings.CACHE_SOCKET_TIMEOUT,
+                socket_timeout=settings.CACHE_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.CACHE_SOCKET_TIMEOUT,
+                decode_responses=False,  # 缓存值为二进制编码
+            )
+    return aioredis.Redis(connection_pool=pool)
+
+
+@contextmanager
+def _timed(op: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        cache_op_duration.labels(op=op).observe(time.perf_counter() - t0)
+
+
+class LocalCache:
+    """按字节限额的 LRU，每条带过期时间；线程安全。"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()  # key -> (值, 字节数, 过期时刻)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: Any, size: int, ttl: float) -> None:
+        size += len(key) + _ENTRY_OVERHEAD
+        if size > self.max_bytes or ttl <= 0:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+        answer_cache_l1_bytes.set(self.nbytes)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+        answer_cache_l1_bytes.set(self.nbytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+        answer_cache_l1_bytes.set(0)
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[1]
+
+
+class _L1Channel:
+    """L1 及其失效订阅；广播消息带本通道 id，收到自己发出的消息不处理。"""
+
+    def __init__(self, r: aioredis.Redis, max_bytes: int):
+        self.r = r
+        self.l1 = LocalCache(max_bytes)
+        self.id = uuid.uuid4().hex
+        self.subscribed = False
+        self._listener: Optional[asyncio.Task] = None
+
+    def local(self) -> Optional[LocalCache]:
+        """订阅在线时返回 L1；订阅任务未运行（或属于已结束的事件循环）时在当前事件循环启动。"""
+        loop = asyncio.get_running_loop()
+        if self._listener is None or self._listener.done() or self._listener.get_loop() is not loop:
+            self.subscribed = False
+            self._listener = loop.create_task(self._listen())
+        return self.l1 if self.subscribed else None
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(_INVALIDATE_CHANNEL)
+                # 断线期间可能漏掉失效消息，重新订阅后清空
+                self.l1.clear()
+                self.subscribed = True
+                while True:
+                    # 带超时轮询：空闲时返回 None，不会被连接的 socket_timeout 误判为断线
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=_POLL_TIMEOUT)
+                    if message is not None:
+                        self.on_invalidate(message["data"])
+            except asyncio.CancelledError:
+                self.subscribed = False
+                raise
+            except Exception as e:
+                if self.subscribed:
+                    logger.warning(f"缓存失效订阅断开，暂停 L1: {e}")
+                self.subscribed = False
+                self.l1.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def on_invalidate(self, data: Union[str, bytes]) -> None:
+        message = json.loads(data)
+        if message["from"] == self.id:
+            return
+        for key in message["keys"]:
+            self.l1.pop(key)
+
+    def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        self.subscribed = False
+
+
+_channels: Dict[Tuple[str, int], _L1Channel] = {}
+_channels_lock = threading.Lock()
+
+
+def _shared_channel(url: str, r: aioredis.Redis, max_bytes: int) -> _L1Channel:
+    """同一 URL（共享连接池）、同一容量的 L1 进程内只建一份。"""
+    with _channels_lock:
+        channel = _channels.get((url, max_bytes))
+        if channel is None:
+            channel = _channels[(url, max_bytes)] = _L1Channel(r, max_bytes)
+    return channel
 
 
 class CacheClient:
-    """问答结果缓存，默认 TTL 5 min"""
+    """问答结果缓存，默认 TTL 5 min；l1_max_bytes > 0 时启用进程内 L1。
+
+    redis_client 需以 decode_responses=False 创建，默认使用 get_redis() 的共享连接池，此时 L1 与订阅任务进程内共享；
+    传入 redis_client 时 L1 与订阅为本实例独占。codec 默认按 CACHE_SERIALIZER / CACHE_COMPRESSION 配置。
+    """
 
-    def __init__(self, url: str = "redis://localhost:6379/1", ttl: int = 300):
-        self.r = redis.from_url(url, decode_responses=True)
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        ttl: int = 300,
+        l1_max_bytes: Optional[int] = None,
+        l1_ttl: Optional[float] = None,
+        redis_client: Optional[aioredis.Redis] = None,
+        codec: Optional[CacheCodec] = None,
+    ):
+        url = url or settings.CACHE_URL
+        self.r = redis_client if redis_client is not None else get_redis(url)
+        self.codec = codec or CacheCodec(
+            settings.CACHE_SERIALIZER, settings.CACHE_COMPRESSION, settings.CACHE_COMPRESS_THRESHOLD
+        )
         self.ttl = ttl
+        if l1_max_bytes is None:
+            l1_max_bytes = settings.CACHE_L1_MAX_MB * 1024 * 1024
+        self.l1_ttl = settings.CACHE_L1_TTL if l1_ttl is None else l1_ttl
+        self._shared = redis_client is None
+        self._channel: Optional[_L1Channel] = None
+        if l1_max_bytes > 0:
+            self._channel = (
+                _shared_channel(url, self.r, l1_max_bytes) if self._shared else _L1Channel(self.r, l1_max_bytes)
+            )
+        self.l1 = self._channel.l1 if self._channel is not None else None
+        # 广播消息带发送方 id，收到自己的消息不处理；未启用 L1 的进程同样要广播，其他副本可能启用了 L1
+        self._id = self._channel.id if self._channel is not None else uuid.uuid4().hex
 
-    def get(self, key: str) -> Optional[Any]:
-        v = self.r.get(key)
-        return json.loads(v) if v else None
+    # -------- L1 与失效广播 --------
+    def _l1(self) -> Optional[LocalCache]:
+        return self._channel.local() if self._channel is not None else None
+
+    def _on_invalidate(self, data: Union[str, bytes]) -> None:
+        self._channel.on_invalidate(data)
+
+    def _broadcast(self, pipe, keys: List[str]) -> None:
+        """在同一 pipeline 中发布失效消息，不增加往返；本进程启用了 L1 时直接丢弃本地副本。"""
+        if not keys:
+            return
+        if self.l1 is not None:
+            for key in keys:
+                self.l1.pop(key)
+        pipe.publish(_INVALIDATE_CHANNEL, json.dumps({"from": self._id, "keys": keys}, ensure_ascii=False))
+
+    async def close(self) -> None:
+        """停止本实例独占的订阅任务；共享的 L1、订阅与连接池随进程存在，不在此关闭。"""
+        if self._channel is not None and not self._shared:
+            self._channel.stop()
+
+    # -------- 读写 --------
+    async def get(self, key: str) -> Optional[Any]:
+        return (await self.mget([key]))[0]
+
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        """批量读取，顺序与 keys 一致；L1 未命中的 key 一次往返取值（启用 L1 时连同剩余有效期）。"""
+        found: List[Optional[Any]] = [None] * len(keys)
+        l1 = self._l1()
+        missing = list(range(len(keys)))
+        if l1 is not None:
+            missing = []
+            for i, key in enumerate(keys):
+                found[i] = l1.get(key)
+                if found[i] is None:
+                    missing.append(i)
+            answer_cache_requests.labels(tier="l1", result="hit").inc(len(keys) - len(missing))
+            answer_cache_requests.labels(tier="l1", result="miss").inc(len(missing))
+        if not missing:
+            return found
+        names = [keys[i] for i in missing]
+        with _timed("mget" if len(keys) > 1 else "get"):
+            if l1 is not None:
+                # 同一往返取值与剩余有效期，L1 副本不比 Redis 活得久
+                pipe = self.r.pipeline(transaction=False)
+                pipe.mget(names)
+                for name in names:
+                    pipe.pttl(name)
+                raw, *ttls = await pipe.execute()
+            else:
+                raw, ttls = await self.r.mget(names), [0] * len(names)
+        hits = 0
+        for i, v, ttl_ms in zip(missing, raw, ttls):
+            if v is None:
+                continue
+            try:
+                found[i] = self.codec.decode(v)
+            except Exception as e:
+                # 例如滚动升级期间其他副本用本进程未安装的编码写入：按未命中处理，重新生成后覆盖
+                logger.warning(f"缓存值解码失败，按未命中处理: {e}")
+                continue
+            hits += 1
+            if l1 is not None and ttl_ms > 0:
+                l1.set(keys[i], found[i], len(v), min(ttl_ms / 1000, self.l1_ttl))
+        answer_cache_requests.labels(tier="l2", result="hit").inc(hits)
+        answer_cache_requests.labels(tier="l2", result="miss").inc(len(missing) - hits)
+        return found
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None, documents: Iterable[str] = ()) -> None:
+        """documents 为该值依赖的文档，登记到反向索引，文档变更时由 invalidate_documents 删除。"""
+        await self.mset({key: value}, ttl=ttl, documents=documents)
+
+    async def mset(self, items: Dict[str, Any], ttl: Optional[int] = None, documents: Iterable[str] = ()) -> None:
+        """批量写入，所有值共用 ttl 与依赖文档；SETEX、反向索引与失效广播一次往返。"""
+        if not items:
+            return
+        ttl = ttl or self.ttl
+        raws = {key: self.codec.encode(value) for key, value in items.items()}
+        pipe = self.r.pipeline()
+        for key, raw in raws.items():
+            pipe.setex(key, ttl, raw)
+        for doc in documents:
+            dep = _DEPS_KEY.format(doc)
+            pipe.sadd(dep, *raws)
+            pipe.expire(dep, ttl)
+        # 其他副本可能持有这些 key 的旧值
+        self._broadcast(pipe, list(raws))
+        with _timed("mset" if len(items) > 1 else "set"):
+            await pipe.execute()
+        l1 = self._l1()
+        if l1 is not None:
+            for key, raw in raws.items():
+                l1.set(key, items[key], len(raw), min(ttl, self.l1_ttl))
+
+    async def invalidate_documents(self, documents: Iterable[str]) -> int:
+        """删除依赖这些文档的缓存值及其反向索引，返回删除的缓存条数。"""
+        deps = [_DEPS_KEY.format(doc) for doc in documents]
+        if not deps:
+            return 0
+        with _timed("invalidate"):
+            keys = sorted(k.decode("utf-8") for k in await self.r.sunion(deps))
+            pipe = self.r.pipeline()
+            pipe.delete(*deps)
+            if keys:
+                pipe.delete(*keys)
+                self._broadcast(pipe, keys)
+            results = await pipe.execute()
+        return results[1] if keys else 0
+
+    async def delete(self, key: str) -> None:
+        pipe = self.r.pipeline()
+        pipe.delete(key)
+        self._broadcast(pipe, [key])
+        with _timed("delete"):
+            await pipe.execute()
+
+    async def exists(self, key: str) -> bool:
+        with _timed("exists"):
+            return bool(await self.r.exists(key))
+
+    async def acquire(self, key: str, ttl: int) -> Optional[str]:
+        """SET NX 租约，成功返回 token，已被占用返回 None。"""
+        token = uuid.uuid4().hex
+        with _timed("acquire"):
+            return token if await self.r.set(key, token, nx=True, ex=ttl) else None
+
+    async def release(self, key: str, token: str) -> None:
+        with _timed("release"):
+            await self.r.eval(_RELEASE, 1, key, token)
+
+
+_default: Optional[CacheClient] = None
+_default_lock = threading.Lock()
 
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        self.r.setex(key, ttl or self.ttl, json.dumps(value, ensure_ascii=False))
 
-    def delete(self, key: str) -> None:
-        self.r.delete(key)
\ No newline at end of file
+def get_cache_client() -> CacheClient:
+    """进程级共享的答案缓存客户端。"""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = CacheClient()
+    return _default
@@ -0,0 +1,112 @@
+"""
+缓存值编解码：首字节为格式号，其后为载荷
+序列化优先 msgpack（未安装时 JSON），超过阈值的载荷用 zstd（未安装时 zlib）压缩。
+解码只看格式号、与当前配置无关，滚动升级期间新旧副本写入的值都能读取；
+没有格式号的旧值（JSON 文本，首字节可打印）按 JSON 解析。
+"""
+import json
+import time
+import zlib
+from typing import Any
+
+from core.logger import get_logger
+from core.metrics import cache_codec_bytes, cache_codec_seconds
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+logger = get_logger(__name__)
+
+SERIALIZERS = ("json", "msgpack")
+COMPRESSIONS = ("none", "zlib", "zstd")
+
+
+def _format_id(serializer: str, compression: str) -> int:
+    # 1..6，均小于任何 JSON 文本的首字节
+    return 1 + SERIALIZERS.index(serializer) * len(COMPRESSIONS) + COMPRESSIONS.index(compression)
+
+
+def _parse_format(fid: int) -> tuple:
+    return SERIALIZERS[(fid - 1) // len(COMPRESSIONS)], COMPRESSIONS[(fid - 1) % len(COMPRESSIONS)]
+
+
+_MAX_FORMAT = _format_id(SERIALIZERS[-1], COMPRESSIONS[-1])
+
+
+class CacheCodec:
+    """可插拔的缓存值编解码器；serializer/compression 为 auto 时取已安装的最优实现。"""
+
+    def __init__(self, serializer: str = "auto", compression: str = "auto", threshold: int = 1024, level: int = 3):
+        self.serializer = self._resolve(serializer, SERIALIZERS, "msgpack", msgpack is not None, "json")
+        self.compression = self._resolve(compression, COMPRESSIONS, "zstd", zstandard is not None, "zlib")
+        self.threshold = threshold
+        self.level = level
+        if self.compression == "zstd":
+            self._zstd_c = zstandard.ZstdCompressor(level=level)
+        self._zstd_d = zstandard.ZstdDecompressor() if zstandard is not None else None
+
+    @staticmethod
+    def _resolve(name: str, choices: tuple, optional: str, available: bool, fallback: str) -> str:
+        if name == "auto":
+            return optional if available else fallback
+        if name not in choices:
+            raise ValueError(f"不支持的缓存编码: {name}，可选 auto/{'/'.join(choices)}")
+        if name == optional and not available:
+            logger.warning(f"未安装 {optional}，缓存编码退回 {fallback}")
+            return fallback
+        return name
+
+    def encode(self, value: Any) -> bytes:
+        t0 = time.perf_counter()
+        if self.serializer == "msgpack":
+            payload = msgpack.packb(value, use_bin_type=True)
+        else:
+            payload = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        cache_codec_bytes.labels(stage="serialized").observe(len(payload))
+        compression = "none"
+        if self.compression != "none" and len(payload) >= self.threshold:
+            packed = self._compress(payload)
+            # 压缩收益不足时保留原文，解码免去一次解压
+            if len(packed) < len(payload) * 0.9:
+                payload, compression = packed, self.compression
+        data = bytes([_format_id(self.serializer, compression)]) + payload
+        cache_codec_seconds.labels(op="encode").observe(time.perf_counter() - t0)
+        cache_codec_bytes.labels(stage="encoded").observe(len(data))
+        return data
+
+    def decode(self, data: bytes) -> Any:
+        t0 = time.perf_counter()
+        if not data or data[0] > _MAX_FORMAT:
+            value = json.loads(data)  # 旧格式：无格式号的 JSON 文本
+        else:
+            serializer, compression = _parse_format(data[0])
+            payload = self._decompress(data[1:], compression)
+            if serializer == "msgpack":
+                if msgpack is None:
+                    raise RuntimeError("缓存值为 msgpack 编码，但本进程未安装 msgpack")
+                value = msgpack.unpackb(payload, raw=False)
+            else:
+                value = json.loads(payload)
+        cache_codec_seconds.labels(op="decode").observe(time.perf_counter() - t0)
+        return value
+
+    def _compress(self, payload: bytes) -> bytes:
+        if self.compression == "zstd":
+            return self._zstd_c.compress(payload)
+        return zlib.compress(payload, self.level)
+
+    def _decompress(self, payload: bytes, compression: str) -> bytes:
+        if compression == "zstd":
+            if self._zstd_d is None:
+                raise RuntimeError("缓存值为 zstd 压缩，但本进程未安装 zstandard")
+            return self._zstd_d.decompress(payload)
+        if compression == "zlib":
+            return zlib.decompress(payload)
+        return payload
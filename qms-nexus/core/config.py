@@ -1,16 +1,160 @@
 """
-Redis 和异步任务相关配置
+Redis 和异步任务相关配置，以及 config.yaml 业务配置加载
 """
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict
+
+import yaml
 from pydantic_settings import BaseSettings
 
+from core.models import EmbeddingConfig, LLMConfig
+
 
 class Settings(BaseSettings):
     # Redis 配置
     REDIS_URL: str = "redis://localhost:6379/0"
     ARQ_QUEUE_NAME: str = "qms_nexus_queue"
 
+    # 向量库执行层：读线程池大小、读/写排队上限（超出即背压拒绝）
+    VECTORDB_READ_WORKERS: int = 8
+    VECTORDB_MAX_PENDING_READS: int = 64
+    VECTORDB_MAX_PENDING_WRITES: int = 16
+    # 同时缓存的 collection 句柄数（含其 BM25/标签/注册表索引），超出按 LRU 淘汰
+    VECTORDB_MAX_COLLECTIONS: int = 16
+    # 流式写入的单批 chunk 数（同时受后端 max_batch_size 限制）
+    VECTORDB_UPSERT_BATCH: int = 256
+    # 检索路径上重新扫描文档注册表段目录的最短间隔（秒），写路径总是先刷新
+    VECTORDB_REFRESH_INTERVAL: float = 1.0
+
+    # 混合检索：BM25 索引开关；每路召回候选数（不少于 top_k）
+    BM25_ENABLED: bool = True
+    HYBRID_CANDIDATES: int = 40
+
+    # 向量存储：chroma 为 HNSW 全精度常驻内存；int8 / pq 为压缩码常驻内存 + 磁盘全精度重排
+    # （需配置本地向量模型；切换后需清空并重建知识库）
+    VECTOR_STORE: str = "chroma"
+    VECTOR_TRUNCATE_DIM: int = 0  # 压缩码使用的前若干维，0 为不截断
+    PQ_SUBSPACES: int = 32
+    QUANT_TRAIN_SIZE: int = 4096  # 向量数达到该值时训练量化器，此前直接精确检索
+    QUANT_RERANK: int = 100  # 每条查询参与全精度重排的候选数
+    QUANT_NLIST: int = 0  # IVF 桶数，0 为按训练样本自动取（QUANT_TRAIN_SIZE // 39）
+    QUANT_NPROBE: int = 8  # 每条查询扫描的桶数
+    QUANT_VACUUM_RATIO: float = 0.3  # 覆盖写入/删除留下的失效行占比超过该值（且不少于 1024 行）时重写存储回收内存
+
+    # 标签预过滤：命中 chunk 数不超过该值时精确扫描其向量，否则 HNSW 扩大召回后过滤
+    TAG_PREFILTER_EXACT_MAX: int = 2000
+    TAG_POSTFILTER_OVERSAMPLE: int = 4
+
+    # 检索结果缓存：进程内条目上限，0 为禁用；按 Redis 中的索引代数失效
+    SEARCH_CACHE_MAX_ENTRIES: int = 2048
+
+    # 人工修正库：SQLite 路径；问题向量相似度不低于阈值视为同一问题（需本地向量模型）
+    CORRECTIONS_DB: str = "./chroma_data/corrections.db"
+    CORRECTION_MATCH_THRESHOLD: float = 0.95
+    # 问答路径上加载其他进程新增修正的最短间隔（秒），本进程提交的修正立即生效
+    CORRECTIONS_REFRESH_INTERVAL: float = 1.0
+
+    # 问答上下文：检索条数、token 预算、分数断崖（低于最高分该倍数即丢弃）、近似重复阈值（3-gram Jaccard）
+    CONTEXT_TOP_K: int = 8
+    CONTEXT_TOKEN_BUDGET: int = 1500
+    CONTEXT_MIN_SCORE_RATIO: float = 0.7
+    CONTEXT_DEDUP_THRESHOLD: float = 0.8
+
+    # 答案缓存 Redis：进程内共享连接池大小、连接/读写超时（秒）
+    CACHE_URL: str = "redis://localhost:6379/1"
+    CACHE_POOL_SIZE: int = 32
+    CACHE_SOCKET_TIMEOUT: float = 1.0
+
+    # 答案缓存编码：序列化 auto/msgpack/json，压缩 auto/zstd/zlib/none，序列化后达到阈值（字节）才压缩
+    CACHE_SERIALIZER: str = "auto"
+    CACHE_COMPRESSION: str = "auto"
+    CACHE_COMPRESS_THRESHOLD: int = 1024
+
+    # 答案缓存 L1：进程内字节上限（MB，0 为禁用）与单条最长存活秒数（失效广播丢失时的兜底）
+    CACHE_L1_MAX_MB: int = 32
+    CACHE_L1_TTL: int = 60
+
+    # 答案缓存有效期（秒）：引用了文档的答案在文档更新/删除时按依赖失效，可设较长；无来源的答案仍为 5 min
+    ANSWER_CACHE_TTL: int = 21600
+
+    # 大模型连接池与超时（秒）：首字节超时为发出请求到收到响应头的上限；装有 h2 时启用 HTTP/2
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_MAX_KEEPALIVE: int = 10
+    LLM_KEEPALIVE_EXPIRY: float = 30.0
+    LLM_HTTP2: bool = True
+    LLM_CONNECT_TIMEOUT: float = 3.0
+    LLM_READ_TIMEOUT: float = 60.0
+    LLM_FIRST_BYTE_TIMEOUT: float = 30.0
+    LLM_POOL_TIMEOUT: float = 5.0
+    # 大模型重试（429/5xx 与连接错误，全抖动指数退避）与熔断（连续失败次数、熔断秒数）
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    LLM_RETRY_MAX_DELAY: float = 8.0
+    LLM_BREAKER_FAILURES: int = 5
+    LLM_BREAKER_RESET: float = 30.0
+
+    # 大模型提供方：openai（OPENAI_BASE_URL 兼容端点）/ ollama（本地原生 API）；config.yaml 配置 llm.backends 时以其为准
+    LLM_PROVIDER: str = "openai"
+    # 本地 Ollama：keep_alive 为模型常驻时长（如 30m，-1 为永久）；启动时预热，冷加载可达数十秒
+    OLLAMA_BASE_URL: str = "http://localhost:11434"
+    OLLAMA_MODEL: str = "qwen2.5:7b"
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    OLLAMA_WARMUP: bool = True
+    OLLAMA_WARMUP_TIMEOUT: float = 120.0
+    # 每个模型的并发上限（宜与 Ollama 的 OLLAMA_NUM_PARALLEL 一致），超出排队；排队数达上限直接拒绝（503 / 降级）
+    OLLAMA_MAX_CONCURRENCY: int = 4
+    OLLAMA_MAX_QUEUE: int = 16
+    # Ollama 首字节超时：非流式请求生成完毕才返回响应头，需覆盖整段生成；非流式请求超时不重试（重试等于重新生成一遍）
+    OLLAMA_FIRST_BYTE_TIMEOUT: float = 120.0
+    OLLAMA_MAX_RETRIES: int = 1
+
+    # /ask 截止时间（秒，US-Alpha-10 要求 10 s 内给出答案）；可按 X-API-Key 覆盖，如 {"batch-key": 30}
+    ASK_DEADLINE_SECONDS: float = 10.0
+    ASK_DEADLINE_BY_KEY: Dict[str, float] = {}
+    # 剩余时间不足该值（秒）时不再调用大模型，直接返回检索原文作为降级答案；降级答案附带的原文段数
+    ASK_LLM_MIN_SECONDS: float = 1.5
+    ASK_DEGRADED_PASSAGES: int = 3
+
+    # 问答请求合并：跨副本租约有效期（秒，应大于 LLM 超时），未抢到租约的副本轮询结果的间隔
+    ASK_LEASE_TTL: int = 90
+    ASK_LEASE_POLL: float = 0.2
+
+    # 语义答案缓存：问题向量相似度不低于阈值且来源文档未更新时复用答案；条目数为 0 禁用（需本地向量模型）
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1000
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_TTL: int = 86400
+
+    # 向量缓存：目录为空则禁用；容量按 MB 折算槽位数，满后 LRU 淘汰
+    EMBEDDING_CACHE_DIR: str = "./chroma_data/embedding_cache"
+    EMBEDDING_CACHE_MAX_MB: int = 256
+
+    # 业务配置文件路径
+    CONFIG_PATH: str = "config/config.yaml"
+
     class Config:
         env_file = ".env"
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
+
+
+
+@lru_cache(maxsize=1)
+def get_embedding_config() -> EmbeddingConfig:
+    """读取 config.yaml 的 embedding 段；文件不存在时使用默认值。"""
+    path = Path(settings.CONFIG_PATH)
+    if not path.exists():
+        return EmbeddingConfig()
+    data = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    return EmbeddingConfig(**(data.get("embedding") or {}))
+
+
+@lru_cache(maxsize=1)
+def get_llm_config() -> LLMConfig:
+    """读取 config.yaml 的 llm 段；文件不存在或未配置时使用默认值（单一端点）。"""
+    path = Path(settings.CONFIG_PATH)
+    if not path.exists():
+        return LLMConfig()
+    data = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    return LLMConfig(**(data.get("llm") or {}))
@@ -0,0 +1,129 @@
+"""
+人工修正库（US-Alpha-03 / US-Alpha-06）：SQLite 持久化 {问题, 正确答案, 原错误回答}，
+问答时先于检索查询，命中直接返回正确答案。
+两级查找：规范化问题哈希（O(1)）→ 问题向量余弦相似度（配置了本地向量模型时）。
+内存索引按自增 id 增量加载；查找只读内存，SQLite 读写由调用方放到线程中执行，
+其他进程新增的修正在调用方下一次定期 refresh 后可见。
+"""
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from core.embedding_cache import normalize_text
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS corrections (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question TEXT NOT NULL,
+    question_key TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    wrong_answer TEXT NOT NULL DEFAULT '',
+    embedding BLOB,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_corrections_key ON corrections(question_key);
+"""
+
+
+@dataclass
+class Correction:
+    id: int
+    question: str
+    answer: str
+    wrong_answer: str
+    similarity: float = 1.0
+
+
+class CorrectionStore:
+    """人工修正库；同一问题多次修正以最新一条为准。"""
+
+    def __init__(self, path: str, dim: int = 0, threshold: float = 0.95):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.threshold = threshold
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._by_key: Dict[str, Correction] = {}
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._vector_keys: List[str] = []
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    @property
+    def has_vectors(self) -> bool:
+        return bool(len(self._vector_keys))
+
+    def refresh_due(self, interval: float) -> bool:
+        """距上次 refresh 已满 interval 秒时返回 True 并记为已刷新，并发请求只有一个去执行 refresh。"""
+        now = time.monotonic()
+        if now - self._refreshed_at < interval:
+            return False
+        self._refreshed_at = now
+        return True
+
+    def refresh(self) -> int:
+        """加载 id 大于已加载最大 id 的新修正，返回新增条数。"""
+        with self._lock:
+            self._refreshed_at = time.monotonic()
+            rows = self._conn.execute(
+                "SELECT id, question, question_key, answer, wrong_answer, embedding FROM corrections "
+                "WHERE id > ? ORDER BY id",
+                (self._last_id,),
+            ).fetchall()
+            if not rows:
+                return 0
+            vectors, keys = [], []
+            for row_id, question, key, answer, wrong, blob in rows:
+                self._by_key[key] = Correction(row_id, question, answer, wrong)
+                if self.dim and blob is not None:
+                    vectors.append(np.frombuffer(blob, dtype=np.float32))
+                    keys.append(key)
+                self._last_id = row_id
+            if vectors:
+                # 先追加 key 再替换矩阵：无锁读取的 lookup_similar 不会取到越界下标
+                self._vector_keys.extend(keys)
+                self._vectors = np.vstack([self._vectors, np.stack(vectors)])
+            return len(rows)
+
+    def add(self, question: str, answer: str, wrong_answer: str = "", vector: Optional[np.ndarray] = None) -> int:
+        """写入一条修正并加载到内存索引，返回 id。"""
+        blob = None
+        if self.dim and vector is not None:
+            v = np.asarray(vector, dtype=np.float32).reshape(-1)
+            blob = (v / (np.linalg.norm(v) + 1e-12)).tobytes()
+        with self._lock:
+            with self._conn:
+                cur = self._conn.execute(
+                    "INSERT INTO corrections (question, question_key, answer, wrong_answer, embedding, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (question, normalize_text(question), answer, wrong_answer or "", blob, time.time()),
+                )
+            row_id = cur.lastrowid
+        self.refresh()
+        return row_id
+
+    def lookup(self, question: str) -> Optional[Correction]:
+        """规范化问题精确命中；只读内存索引。"""
+        return self._by_key.get(normalize_text(question))
+
+    def lookup_similar(self, vector: np.ndarray) -> Optional[Correction]:
+        """问题向量最相似且不低于阈值的修正；同一问题的旧向量对应到最新答案。"""
+        if not len(self._vector_keys):
+            return None
+        q = np.asarray(vector, dtype=np.float32).reshape(-1)
+        sims = self._vectors @ (q / (np.linalg.norm(q) + 1e-12))
+        best = int(sims.argmax())
+        if sims[best] < self.threshold:
+            return None
+        latest = self._by_key[self._vector_keys[best]]
+        return Correction(latest.id, latest.question, latest.answer, latest.wrong_answer, float(sims[best]))
@@ -0,0 +1,119 @@
+"""
+向量库异步执行层：读线程池 + 独立写通道，带排队上限与耗时指标。
+Chroma 客户端是同步的，所有调用都必须经由这里离开事件循环线程。
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from core.config import settings
+from core.metrics import (
+    vectordb_inflight,
+    vectordb_queue_wait,
+    vectordb_exec_duration,
+    vectordb_rejected_counter,
+)
+
+
+class VectorDBBusyError(RuntimeError):
+    """执行通道排队已满，调用方应稍后重试（对外映射为 503）。"""
+
+
+class _Lane:
+    """单个执行通道：线程池 + 排队计数。"""
+
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.max_pending = max_pending
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"vdb-{name}")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return False
+            self._pending += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+
+class DBExecutor:
+    """读操作并发执行，写操作串行执行；排队超限立即拒绝而非无限堆积。"""
+
+    def __init__(
+        self,
+        read_workers: int = 8,
+        max_pending_reads: int = 64,
+        max_pending_writes: int = 16,
+    ):
+        self.reader = _Lane("read", read_workers, max_pending_reads)
+        # 写通道单线程：Chroma 的 HNSW/SQLite 写入本就串行，避免写写争锁
+        self.writer = _Lane("write", 1, max_pending_writes)
+
+    async def read(self, op: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """在读线程池中执行 fn。"""
+        return await self._submit(self.reader, op, fn, *args, **kwargs)
+
+    async def write(self, op: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """在写通道中执行 fn。"""
+        return await self._submit(self.writer, op, fn, *args, **kwargs)
+
+    async def _submit(self, lane: _Lane, op: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        if not lane.try_acquire():
+            vectordb_rejected_counter.labels(lane=lane.name, op=op).inc()
+            raise VectorDBBusyError(f"向量库{lane.name}通道繁忙（排队 {lane.pending}），请稍后重试")
+        vectordb_inflight.labels(lane=lane.name).inc()
+        t_submit = time.perf_counter()
+
+        def _run():
+            t_start = time.perf_counter()
+            vectordb_queue_wait.labels(lane=lane.name, op=op).observe(t_start - t_submit)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                vectordb_exec_duration.labels(lane=lane.name, op=op).observe(time.perf_counter() - t_start)
+
+        def _done(_):
+            # 在线程池 future 完成时释放名额：调用方被取消时线程可能仍在执行，不能提前归还
+            lane.release()
+            vectordb_inflight.labels(lane=lane.name).dec()
+
+        try:
+            future = lane.pool.submit(_run)
+        except BaseException:
+            _done(None)
+            raise
+        future.add_done_callback(_done)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.reader.pool.shutdown(wait=wait)
+        self.writer.pool.shutdown(wait=wait)
+
+
+_default: Optional[DBExecutor] = None
+_default_lock = threading.Lock()
+
+
+def get_executor() -> DBExecutor:
+    """进程级共享执行层，保证并发上限对所有 VectorDBClient 实例生效。"""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = DBExecutor(
+                    read_workers=settings.VECTORDB_READ_WORKERS,
+                    max_pending_reads=settings.VECTORDB_MAX_PENDING_READS,
+                    max_pending_writes=settings.VECTORDB_MAX_PENDING_WRITES,
+                )
+    return _default
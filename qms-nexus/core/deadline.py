@@ -0,0 +1,65 @@
+"""
+请求截止时间：contextvar 保存本请求的绝对截止时刻，沿调用链（含派生的 asyncio 任务）传递。
+各阶段用 within() 在剩余时间内等待，超时按阶段计数并抛 DeadlineExceeded；未设置截止时间时不限时。
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Iterator, Optional
+
+from core.config import settings
+from core.metrics import deadline_exceeded
+
+_deadline: ContextVar[Optional[float]] = ContextVar("qms_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """某阶段未能在截止时间前完成；partial 为可降级返回的结果（如检索原文），没有则为 None。"""
+
+    def __init__(self, stage: str, partial: Any = None):
+        super().__init__(f"{stage} 阶段超出请求截止时间")
+        self.stage = stage
+        self.partial = partial
+
+
+def ask_deadline(api_key: Optional[str] = None) -> float:
+    """/ask 的截止秒数：按 API Key 覆盖，否则取默认值。"""
+    return settings.ASK_DEADLINE_BY_KEY.get(api_key or "", settings.ASK_DEADLINE_SECONDS)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """在作用域内设置截止时间；已有更早的截止时间时保留更早者。"""
+    deadline = time.monotonic() + seconds if seconds and seconds > 0 else None
+    current = _deadline.get()
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """距截止时间的秒数（可能为负）；未设置时返回 None。"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+async def within(stage: str, aw: Awaitable, min_left: float = 0.0) -> Any:
+    """在剩余时间内等待 aw；剩余时间不足 min_left 时不再执行，直接按超时处理。"""
+    left = remaining()
+    if left is None:
+        return await aw
+    if left <= min_left:
+        if asyncio.iscoroutine(aw):
+            aw.close()
+        deadline_exceeded.labels(stage=stage).inc()
+        raise DeadlineExceeded(stage)
+    try:
+        return await asyncio.wait_for(aw, left)
+    except asyncio.TimeoutError:
+        deadline_exceeded.labels(stage=stage).inc()
+        raise DeadlineExceeded(stage) from None
@@ -0,0 +1,78 @@
+"""
+文档注册表：filename → chunk id 列表与文档版本号，随写入/删除增量维护。
+按文件删除时直接取出 id，无需在 Chroma 中做元数据扫描；版本号在每次入库后递增。
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.segment_index import SegmentedIndex
+
+
+class DocumentRegistry(SegmentedIndex):
+    """add_chunks/bump/remove 先进内存，commit() 落一个段文件。"""
+
+    def __init__(self, path: Optional[str] = None, max_segments: int = 32):
+        super().__init__(path, max_segments)
+        self._docs: Dict[str, dict] = {}
+        # 每次清空递增（合并段不变），持有 collection 句柄的实例据此重新获取
+        self.epoch = 0
+        self._open()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # -------- 内存结构 --------
+    def _reset(self) -> None:
+        self._docs.clear()
+
+    def _on_clear(self) -> None:
+        self.epoch += 1
+
+    def _apply_add(self, filename: str, entry: dict) -> None:
+        self._docs[filename] = entry
+
+    def _apply_del(self, filename: str) -> None:
+        self._docs.pop(filename, None)
+
+    def _live_items(self):
+        return self._docs.items()
+
+    def _put(self, filename: str, entry: dict) -> None:
+        self._apply_add(filename, entry)
+        self._record_add(filename, entry)
+
+    # -------- 写入 --------
+    def add_chunks(self, filename: str, ids: Iterable[str]) -> None:
+        """登记文档新写入的 chunk id（重复 id 只记一次）。"""
+        with self._lock:
+            entry = self._docs.get(filename) or {"ids": [], "version": 0}
+            merged = list(dict.fromkeys([*entry["ids"], *ids]))
+            self._put(filename, {"ids": merged, "version": entry["version"]})
+
+    def bump(self, filenames: Iterable[str]) -> None:
+        """一次入库完成后递增文档版本号。"""
+        with self._lock:
+            for filename in filenames:
+                entry = self._docs.get(filename)
+                if entry is not None:
+                    self._put(filename, {"ids": entry["ids"], "version": entry["version"] + 1})
+
+    def remove(self, filenames: Iterable[str]) -> None:
+        with self._lock:
+            for filename in filenames:
+                self._apply_del(filename)
+                self._record_del(filename)
+
+    # -------- 查询 --------
+    def ids(self, filename: str) -> Optional[List[str]]:
+        """文档的 chunk id；未登记返回 None。"""
+        entry = self._docs.get(filename)
+        return list(entry["ids"]) if entry is not None else None
+
+    def version(self, filename: str) -> int:
+        entry = self._docs.get(filename)
+        return entry["version"] if entry is not None else 0
+
+    def documents(self) -> List[Tuple[str, int, int]]:
+        """[(filename, chunk 数, 版本号)]，按文件名排序。"""
+        with self._lock:
+            return sorted((name, len(e["ids"]), e["version"]) for name, e in self._docs.items())
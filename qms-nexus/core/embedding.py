@@ -0,0 +1,140 @@
+"""
+本地 CPU 向量化引擎：按 EmbeddingConfig 加载本地模型，长度排序分批、批内补齐。
+默认走 ONNX Runtime，优先 int8 量化模型。
+"""
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from core.logger import get_logger
+from core.models import EmbeddingConfig
+
+logger = get_logger(__name__)
+
+
+class EmbeddingEngine:
+    """向量化基类：负责排序、分批与还原顺序，子类只实现单批推理。"""
+
+    def __init__(self, config: EmbeddingConfig):
+        self.config = config
+
+    @property
+    def model_name(self) -> str:
+        return self.config.model
+
+    def _encode(self, texts: List[str]) -> list:
+        """预处理（如分词），结果直接交给 _embed_batch，避免重复分词。"""
+        return list(texts)
+
+    def _length(self, item) -> int:
+        """用于排序的长度，子类可替换为真实 token 数。"""
+        return len(item)
+
+    def embed(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """返回 (n, dim) float32 单位向量，顺序与输入一致。"""
+        if not texts:
+            return np.zeros((0, self.config.dim), dtype=np.float32)
+        bs = batch_size or self.config.batch_size
+        # 按长度排序后切批，同批文本长度相近，补齐浪费最少
+        items = self._encode(texts)
+        order = np.argsort([self._length(it) for it in items], kind="stable")
+        out = np.empty((len(texts), self.config.dim), dtype=np.float32)
+        for start in range(0, len(order), bs):
+            idx = order[start:start + bs]
+            vecs = self._embed_batch([items[i] for i in idx])
+            if vecs.shape[1] != self.config.dim:
+                raise ValueError(f"模型输出维度 {vecs.shape[1]} 与配置 dim={self.config.dim} 不一致")
+            out[idx] = vecs
+        return out
+
+    def _embed_batch(self, items: list) -> np.ndarray:
+        raise NotImplementedError
+
+
+def _pad(seqs: List[List[int]], pad_id: int = 0) -> np.ndarray:
+    """补齐到本批最大长度。"""
+    width = max(len(s) for s in seqs)
+    arr = np.full((len(seqs), width), pad_id, dtype=np.int64)
+    for i, s in enumerate(seqs):
+        arr[i, :len(s)] = s
+    return arr
+
+
+class OnnxEmbeddingEngine(EmbeddingEngine):
+    """ONNX Runtime 推理，模型目录需含 tokenizer.json 与 model(_quantized).onnx。"""
+
+    def __init__(self, config: EmbeddingConfig):
+        super().__init__(config)
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        root = Path(config.model_path)
+        self.tokenizer = Tokenizer.from_file(str(root / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=config.max_length)
+        self.tokenizer.no_padding()
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = config.num_threads
+        opts.inter_op_num_threads = 1
+        model_file = self._resolve_model(root)
+        self.session = ort.InferenceSession(str(model_file), sess_options=opts, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        logger.info(f"向量模型已加载：{model_file}")
+
+    def _resolve_model(self, root: Path) -> Path:
+        candidates = [root / "model.onnx", root / "onnx" / "model.onnx"]
+        fp32 = next((p for p in candidates if p.exists()), None)
+        if self.config.quantized:
+            for p in [root / "model_quantized.onnx", root / "onnx" / "model_quantized.onnx"]:
+                if p.exists():
+                    return p
+            # 模型目录可能只读或被多进程共享，加载时不做量化；int8 模型由 scripts/quantize_embedding.py 预先生成
+            logger.warning(f"{root} 下没有 model_quantized.onnx，使用 fp32 模型；可执行 python scripts/quantize_embedding.py 生成")
+        if fp32 is None:
+            raise FileNotFoundError(f"{root} 下未找到 ONNX 模型")
+        return fp32
+
+    def _encode(self, texts: List[str]) -> list:
+        return self.tokenizer.encode_batch(texts)
+
+    def _length(self, item) -> int:
+        return len(item.ids)
+
+    def _embed_batch(self, encodings: list) -> np.ndarray:
+        input_ids = _pad([e.ids for e in encodings])
+        attention_mask = _pad([e.attention_mask for e in encodings])
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]
+        if self.config.pooling == "mean":
+            mask = attention_mask[..., None].astype(np.float32)
+            vecs = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        else:
+            vecs = hidden[:, 0]
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        return (vecs / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+_engines: Dict[str, Optional[EmbeddingEngine]] = {}
+_engines_lock = threading.Lock()
+
+
+def get_embedding_engine(config: EmbeddingConfig) -> Optional[EmbeddingEngine]:
+    """按配置获取进程级共享引擎；未配置本地模型或加载失败时返回 None。"""
+    key = f"{config.model}|{config.model_path}|{config.quantized}"
+    if key not in _engines:
+        with _engines_lock:
+            if key not in _engines:
+                engine = None
+                if config.model_path and Path(config.model_path).exists():
+                    try:
+                        engine = OnnxEmbeddingEngine(config)
+                    except Exception as e:
+                        logger.warning(f"向量模型加载失败：{e}")
+                if engine is None:
+                    logger.warning(f"未找到本地向量模型 {config.model_path}，退回 Chroma 默认向量化，与配置 {config.model} 不一致")
+                _engines[key] = engine
+    return _engines[key]
@@ -0,0 +1,194 @@
+"""
+内容寻址向量缓存：key = hash(模型名, 规范化文本)，重复上传与模板段落跳过向量化。
+向量以 float16 存于内存映射文件，槽位 key 与访问时间同样落盘，重启后直接复用。
+只用于入库路径（查询向量不进缓存，避免挤掉 chunk 向量）；每个进程用文件锁独占一个分区，
+API 与 worker 进程不会互相覆盖槽位，重启后重新认领同一分区。
+"""
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from core.config import settings
+from core.embedding import EmbeddingEngine
+from core.file_lock import FileLock
+from core.logger import get_logger
+from core.metrics import (
+    embedding_cache_requests,
+    embedding_cache_evictions,
+    embedding_cache_entries,
+)
+
+logger = get_logger(__name__)
+
+_WS = re.compile(r"\s+")
+_MAX_PARTITIONS = 64
+
+
+def normalize_text(text: str) -> str:
+    """全半角统一 + 空白折叠，使仅有排版差异的段落命中同一 key。"""
+    return _WS.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def content_key(model: str, text: str) -> int:
+    """64 位内容哈希；0 保留为空槽位标记。"""
+    digest = hashlib.blake2b(f"{model}\0{normalize_text(text)}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class EmbeddingCache:
+    """定长槽位的持久化向量缓存，满后按 LRU 淘汰；打开时认领一个未被其他进程占用的分区。"""
+
+    def __init__(self, path: str, dim: int, max_entries: int):
+        self.dim = dim
+        self.max_entries = max_entries
+        root = Path(path)
+        root.mkdir(parents=True, exist_ok=True)
+        self.partition, self._file_lock = self._claim(root, dim)
+        # 分区 0 沿用原文件名，已有缓存继续可用
+        suffix = f"_{self.partition}" if self.partition else ""
+        self._vectors = self._open(root / f"vectors_{dim}{suffix}.f16", np.float16, (max_entries, dim))
+        # 槽位 key 落盘：读取时校验，文件损坏或被截断时不会返回错误向量
+        self._keys = self._open(root / f"keys_{dim}{suffix}.u64", np.uint64, (max_entries,))
+        self._atime = self._open(root / f"atime_{dim}{suffix}.u64", np.uint64, (max_entries,))
+        self._lock = threading.Lock()
+        self._tick = int(self._atime.max()) if max_entries else 0
+        self._index: "OrderedDict[int, int]" = OrderedDict()
+        used = np.nonzero(self._keys)[0]
+        for slot in used[np.argsort(self._atime[used], kind="stable")]:
+            self._index[int(self._keys[slot])] = int(slot)
+        self._free = sorted(set(range(max_entries)) - set(int(s) for s in used), reverse=True)
+        self.hits = 0
+        self.misses = 0
+        embedding_cache_entries.set(len(self._index))
+
+    @staticmethod
+    def _claim(root: Path, dim: int):
+        for i in range(_MAX_PARTITIONS):
+            lock = FileLock(root / f"lock_{dim}_{i}")
+            if lock.acquire(blocking=False):
+                return i, lock
+        raise RuntimeError(f"向量缓存分区已满（{_MAX_PARTITIONS} 个进程同时占用 {root}）")
+
+    @staticmethod
+    def _open(path: Path, dtype, shape) -> np.memmap:
+        expected = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if path.exists() and path.stat().st_size == expected:
+            return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+        return np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+
+    def get_many(self, keys: List[int]) -> Dict[int, np.ndarray]:
+        """返回 {输入下标: float32 向量}，未命中的下标不出现。"""
+        found: Dict[int, np.ndarray] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                slot = self._index.get(key)
+                if slot is None or int(self._keys[slot]) != key:
+                    continue
+                self._index.move_to_end(key)
+                self._tick += 1
+                self._atime[slot] = self._tick
+                found[i] = self._vectors[slot].astype(np.float32)
+        hits = len(found)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        embedding_cache_requests.labels(result="hit").inc(hits)
+        embedding_cache_requests.labels(result="miss").inc(len(keys) - hits)
+        return found
+
+    def put_many(self, keys: List[int], vectors: np.ndarray) -> None:
+        with self._lock:
+            for key, vec in zip(keys, vectors):
+                slot = self._index.get(key)
+                if slot is None:
+                    slot = self._allocate()
+                    self._index[key] = slot
+                self._index.move_to_end(key)
+                self._tick += 1
+                self._vectors[slot] = vec.astype(np.float16)
+                self._keys[slot] = key
+                self._atime[slot] = self._tick
+            embedding_cache_entries.set(len(self._index))
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        _, slot = self._index.popitem(last=False)
+        embedding_cache_evictions.inc()
+        return slot
+
+    def flush(self) -> None:
+        with self._lock:
+            self._vectors.flush()
+            self._keys.flush()
+            self._atime.flush()
+
+    def close(self) -> None:
+        """落盘并释放分区，之后同一目录可被其他实例认领。"""
+        self.flush()
+        self._file_lock.release()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "capacity": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+class CachedEmbeddingEngine(EmbeddingEngine):
+    """先查缓存，只对未命中的文本调用底层引擎，结果回填缓存；落盘由调用方按批调用 flush()。"""
+
+    def __init__(self, engine: EmbeddingEngine, cache: EmbeddingCache):
+        super().__init__(engine.config)
+        self.engine = engine
+        self.cache = cache
+
+    def embed(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        if not texts:
+            return self.engine.embed(texts)
+        keys = [content_key(self.model_name, t) for t in texts]
+        out = np.empty((len(texts), self.config.dim), dtype=np.float32)
+        found = self.cache.get_many(keys)
+        for i, vec in found.items():
+            out[i] = vec
+        # 同一批内重复文本只向量化一次
+        pending: Dict[int, List[int]] = {}
+        for i, key in enumerate(keys):
+            if i not in found:
+                pending.setdefault(key, []).append(i)
+        if pending:
+            first = [idx[0] for idx in pending.values()]
+            vecs = self.engine.embed([texts[i] for i in first], batch_size=batch_size)
+            for idx, vec in zip(pending.values(), vecs):
+                out[idx] = vec
+            self.cache.put_many(list(pending.keys()), vecs)
+        return out
+
+    def flush(self) -> None:
+        self.cache.flush()
+
+
+_caches: Dict[int, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(dim: int) -> Optional[EmbeddingCache]:
+    """按维度获取进程级共享缓存；EMBEDDING_CACHE_DIR 为空时禁用。"""
+    if not settings.EMBEDDING_CACHE_DIR or settings.EMBEDDING_CACHE_MAX_MB <= 0:
+        return None
+    if dim not in _caches:
+        with _caches_lock:
+            if dim not in _caches:
+                max_entries = settings.EMBEDDING_CACHE_MAX_MB * 1024 * 1024 // (dim * 2 + 16)
+                _caches[dim] = EmbeddingCache(settings.EMBEDDING_CACHE_DIR, dim, max_entries)
+                logger.info(f"向量缓存已加载：{len(_caches[dim]._index)}/{max_entries} 条")
+    return _caches[dim]
@@ -1,11 +1,106 @@
 """
 OpenAI-API 兼容封装，支持 base_url / api_key 热切换，异步流式。
+连接池与超时（连接 / 读取 / 首字节）可配置，装有 h2 时启用 HTTP/2；
+429/5xx 与连接错误按抖动退避重试（不超过请求截止时间），连续失败后熔断，熔断期间直接失败；
+收到响应头后读取正文时的传输错误与读取超时同样计入熔断，并转为 LLMUnavailableError（不重试）。
 """
+import asyncio
+import importlib.util
+import json
 import os
-from typing import List, Dict, Any, Optional, AsyncIterator
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Dict, Any, Optional, AsyncIterator, Iterator
 import httpx
+from core.config import settings
+from core.deadline import remaining
+from core.logger import get_logger
+from core.metrics import llm_breaker_rejected, llm_breaker_state, llm_inflight, llm_retries
 from core.models import GlobalConfig
 
+logger = get_logger(__name__)
+
+# 可重试的状态码：限流与网关/服务端临时错误
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+class LLMUnavailableError(RuntimeError):
+    """大模型端点不可用（熔断中或重试耗尽），对外映射为 503；retry_after 为建议重试秒数。
+
+    partial 为可降级返回的结果（如检索原文），由 RAGService 填入。
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0, partial: Any = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.partial = partial
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断 reset_timeout 秒；之后放行一个探测请求，成功则恢复，失败则继续熔断。"""
+
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, endpoint: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_at: Optional[float] = None
+        self._set(self.CLOSED)
+
+    def _set(self, state: int) -> None:
+        self.state = state
+        llm_breaker_state.labels(endpoint=self.endpoint).set(state)
+
+    def allows(self) -> bool:
+        """当前是否会放行请求（不改变状态），供路由挑选后端。"""
+        if self.state == self.OPEN:
+            return time.monotonic() >= self._opened_at + self.reset_timeout
+        if self.state == self.HALF_OPEN:
+            return self._probe_at is None or time.monotonic() - self._probe_at >= self.reset_timeout
+        return True
+
+    def before_call(self) -> None:
+        """熔断中抛出 LLMUnavailableError；半开状态只放行一个探测请求（超时未回的探测视为丢失）。"""
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            wait = self._opened_at + self.reset_timeout - now
+            if wait > 0:
+                llm_breaker_rejected.labels(endpoint=self.endpoint).inc()
+                raise LLMUnavailableError(f"大模型端点熔断中: {self.endpoint}", retry_after=wait)
+            self._set(self.HALF_OPEN)
+            self._probe_at = None
+        if self.state == self.HALF_OPEN:
+            if self._probe_at is not None and now - self._probe_at < self.reset_timeout:
+                llm_breaker_rejected.labels(endpoint=self.endpoint).inc()
+                raise LLMUnavailableError(f"大模型端点恢复探测中: {self.endpoint}", retry_after=1.0)
+            self._probe_at = now
+
+    def record_success(self) -> None:
+        self.failures = 0
+        if self.state != self.CLOSED:
+            logger.info(f"大模型端点恢复: {self.endpoint}")
+            self._set(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            logger.warning(f"大模型端点连续失败 {self.failures} 次，熔断 {self.reset_timeout:.0f}s: {self.endpoint}")
+            self._opened_at = time.monotonic()
+            self._set(self.OPEN)
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    try:
+        return float(resp.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
 class LLMClient:
     """线程安全、异步的 LLM 客户端，兼容任意 OpenAI-API 端点。"""
 
@@ -14,12 +109,16 @@ class LLMClient:
         base_url: str = None,
         api_key: str = None,
         model: str = "gpt-3.5-turbo",
-        timeout: int = 60,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
     ):
         self.base_url = (base_url or os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")).rstrip("/")
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.model = model
-        self.timeout = timeout
+        self.timeout = timeout or settings.LLM_READ_TIMEOUT
+        self.max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.first_byte_timeout = settings.LLM_FIRST_BYTE_TIMEOUT
+        self.breaker = CircuitBreaker(self.base_url, settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET)
         self._client: Optional[httpx.AsyncClient] = None
 
     @property
@@ -27,11 +126,99 @@ class LLMClient:
         if self._client is None:
             self._client = httpx.AsyncClient(
                 base_url=self.base_url,
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                timeout=self.timeout,
+                headers={"Authorization": f"Bearer {self.api_key}"} if self.api_key else {},
+                timeout=httpx.Timeout(
+                    connect=settings.LLM_CONNECT_TIMEOUT,
+                    read=self.timeout,
+                    write=settings.LLM_CONNECT_TIMEOUT,
+                    pool=settings.LLM_POOL_TIMEOUT,
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE,
+                    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+                ),
+                # 未安装 h2 时 httpx 无法协商 HTTP/2，退回 HTTP/1.1
+                http2=settings.LLM_HTTP2 and _HTTP2,
             )
         return self._client
 
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """全抖动指数退避；服务端给出 Retry-After 时以其为下限。"""
+        delay = random.uniform(0, min(settings.LLM_RETRY_MAX_DELAY, settings.LLM_RETRY_BASE_DELAY * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, settings.LLM_RETRY_MAX_DELAY))
+        return delay
+
+    def _retry_on_timeout(self, payload: Dict[str, Any]) -> bool:
+        """超时后是否重试；子类可按端点特性关闭。"""
+        return True
+
+    async def _send(self, payload: Dict[str, Any], path: str = "/chat/completions") -> httpx.Response:
+        """发送请求直到收到 2xx 响应头，返回未读取正文的响应（调用方负责关闭）。"""
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            retry_after = None
+            try:
+                request = self.client.build_request("POST", path, json=payload)
+                # 首字节超时：等待响应头；非流式端点通常在生成完毕后才返回响应头
+                resp = await asyncio.wait_for(self.client.send(request, stream=True), self.first_byte_timeout)
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                self.breaker.record_failure()
+                reason = "timeout" if isinstance(e, (asyncio.TimeoutError, httpx.TimeoutException)) else "transport"
+                detail = f"{type(e).__name__} {e}".strip()
+            else:
+                if resp.status_code not in _RETRY_STATUS:
+                    if resp.is_error:
+                        # 4xx 说明端点可达，不计入熔断；直接抛出，不重试
+                        self.breaker.record_success()
+                        await resp.aclose()
+                        resp.raise_for_status()
+                    return resp  # 2xx 在正文读完后（_reading）才记为成功
+                await resp.aclose()
+                if resp.status_code == 429:
+                    self.breaker.record_success()  # 限流：端点健康，只需退避
+                else:
+                    self.breaker.record_failure()
+                reason = detail = str(resp.status_code)
+                retry_after = _retry_after(resp)
+            left = remaining()
+            delay = self._backoff(attempt, retry_after)
+            if (
+                attempt >= self.max_retries
+                or (left is not None and delay >= left)
+                or (reason == "timeout" and not self._retry_on_timeout(payload))
+            ):
+                raise LLMUnavailableError(f"大模型请求失败（{detail}），已重试 {attempt} 次", retry_after=retry_after or 1.0)
+            llm_retries.labels(reason=reason).inc()
+            logger.warning(f"大模型请求失败（{detail}），{delay:.2f}s 后第 {attempt + 1} 次重试")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @contextmanager
+    def _reading(self) -> Iterator[None]:
+        """读取响应正文：读完才算成功；传输错误与读取超时计入熔断并转为 LLMUnavailableError，路由据此换后端、/ask 据此降级。"""
+        try:
+            yield
+        except httpx.TransportError as e:
+            self.breaker.record_failure()
+            detail = f"{type(e).__name__} {e}".strip()
+            raise LLMUnavailableError(f"大模型响应读取失败（{detail}）") from e
+        self.breaker.record_success()
+
+    @asynccontextmanager
+    async def _post(self, payload: Dict[str, Any], path: str = "/chat/completions") -> AsyncIterator[httpx.Response]:
+        llm_inflight.labels(endpoint=self.base_url).inc()
+        try:
+            resp = await self._send(payload, path)
+            try:
+                yield resp
+            finally:
+                await resp.aclose()
+        finally:
+            llm_inflight.labels(endpoint=self.base_url).dec()
+
     async def chat(
         self,
         system: str,
@@ -51,9 +238,10 @@ class LLMClient:
             "max_tokens": max_tokens,
             "stream": False,
         }
-        resp = await self.client.post("/chat/completions", json=payload)
-        resp.raise_for_status()
-        data = await resp.json()
+        async with self._post(payload) as resp:
+            with self._reading():
+                await resp.aread()
+        data = resp.json()
         return data["choices"][0]["message"]["content"]
 
     async def chat_stream(
@@ -63,7 +251,10 @@ class LLMClient:
         temperature: float = 0.3,
         max_tokens: int = 1024,
     ) -> AsyncIterator[str]:
-        """流式聊天，逐句 yield。"""
+        """流式聊天，逐段 yield 增量文本；解析 OpenAI SSE 格式（data: {...}，以 data: [DONE] 结束）。
+
+        只在收到响应头之前重试，已开始输出后出错直接抛出。
+        """
         payload = {
             "model": self.model,
             "messages": [
@@ -74,15 +265,22 @@ class LLMClient:
             "max_tokens": max_tokens,
             "stream": True,
         }
-        async with self.client.stream("POST", "/chat/completions", json=payload) as resp:
-            async for line in resp.aiter_lines():
-                if line.startswith("data: "):
-                    chunk = line[6:]
+        async with self._post(payload) as resp:
+            with self._reading():
+                async for line in resp.aiter_lines():
+                    # 空行分隔事件，":" 开头为注释/心跳
+                    if not line.startswith("data:"):
+                        continue
+                    chunk = line[5:].strip()
                     if chunk == "[DONE]":
                         break
-                    data = await resp.json() if chunk else None
-                    if data and data["choices"][0]["delta"].get("content"):
-                        yield data["choices"][0]["delta"]["content"]
+                    if not chunk:
+                        continue
+                    data = json.loads(chunk)
+                    choices = data.get("choices") or []
+                    content = (choices[0].get("delta") or {}).get("content") if choices else None
+                    if content:
+                        yield content
 
     async def ping(self) -> bool:
         """健康检查：调用 models 端点。"""
@@ -95,4 +293,4 @@ class LLMClient:
     async def close(self):
         """优雅关闭连接池。"""
         if self._client:
-            await self._client.aclose()
\ No newline at end of file
+            await self._client.aclose()
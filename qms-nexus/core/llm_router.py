@@ -0,0 +1,225 @@
+"""
+多后端大模型路由（云端 OpenAI 兼容端点 + 本地 Ollama 等，US-Beta-05）
+每个后端维护延迟与错误率的指数滑动平均（EWMA），请求发往“预估延迟 × (1 + 错误惩罚) / 权重”最小的健康后端；
+熔断中或本小时费用已达上限的后端不参与路由，后端不可用时依次换下一个。
+开启对冲时，首选后端超过其 p90 延迟仍未返回即向次选后端再发一次，取先返回者并取消另一个；
+被取消一方的已耗时作为延迟下界计入统计，避免慢后端因总被取消而始终保持旧的低估计。
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import AsyncIterator, Deque, List, Optional, Set, Union
+
+from core.config import get_llm_config, settings
+from core.llm import LLMClient, LLMUnavailableError
+from core.logger import get_logger
+from core.metrics import llm_backend_cost, llm_backend_ewma, llm_backend_latency, llm_backend_wins
+from core.models import LLMBackendConfig, LLMConfig
+from core.ollama import OllamaClient
+from core.tokens import count_tokens
+
+logger = get_logger(__name__)
+
+_HOUR = 3600.0
+_P90_MIN_SAMPLES = 10
+
+
+class Backend:
+    """单个后端的客户端与路由统计。"""
+
+    def __init__(self, config: LLMBackendConfig, client: LLMClient, alpha: float = 0.2, prior_latency: float = 5.0):
+        self.config = config
+        self.name = config.name
+        self.client = client
+        self.alpha = alpha
+        self.prior_latency = prior_latency
+        self.latency: Optional[float] = None  # 成功请求耗时的 EWMA，未有样本时为 None
+        self.error_rate = 0.0
+        self.recent: Deque[float] = deque(maxlen=200)
+        self.spent = 0.0
+        self._window = time.monotonic()
+
+    def available(self) -> bool:
+        """未熔断且本小时费用未达上限。"""
+        if not self.client.breaker.allows():
+            return False
+        if time.monotonic() - self._window >= _HOUR:
+            self._window, self.spent = time.monotonic(), 0.0
+        return not self.config.hourly_cost_cap or self.spent < self.config.hourly_cost_cap
+
+    def score(self, penalty: float) -> float:
+        # 尚未请求过的后端预估为 0，优先试探一次；试探失败后按 prior_latency 计，错误率随之生效
+        return (self.latency or 0.0) * (1 + penalty * self.error_rate) / self.config.weight
+
+    def p90(self) -> Optional[float]:
+        if len(self.recent) < _P90_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[int(0.9 * (len(ordered) - 1))]
+
+    def record(self, elapsed: Optional[float], tokens: int = 0, waited: float = 0.0) -> None:
+        """elapsed 为 None 表示失败，waited 为失败前已耗时（真实延迟的下界，如超时）。"""
+        if elapsed is None:
+            self.error_rate += self.alpha * (1 - self.error_rate)
+            if self.latency is None:
+                # 从未成功：预估延迟为 0 时错误惩罚不起作用，一直失败的后端会在每次请求时排在最前
+                self.latency = max(waited, self.prior_latency)
+            elif waited > self.latency:
+                self.latency += self.alpha * (waited - self.latency)
+        else:
+            self.error_rate -= self.alpha * self.error_rate
+            self.latency = elapsed if self.latency is None else self.latency + self.alpha * (elapsed - self.latency)
+            self.recent.append(elapsed)
+            llm_backend_latency.labels(backend=self.name).observe(elapsed)
+            cost = tokens / 1000 * self.config.cost_per_1k_tokens
+            if cost:
+                self.spent += cost
+                llm_backend_cost.labels(backend=self.name).inc(cost)
+        llm_backend_ewma.labels(backend=self.name, stat="latency").set(self.latency or 0.0)
+        llm_backend_ewma.labels(backend=self.name, stat="error_rate").set(self.error_rate)
+
+    def record_censored(self, elapsed: float) -> None:
+        """请求被取消时的已耗时，真实延迟不低于它；不高于当前估计时不含新信息，直接忽略。"""
+        if self.latency is not None and elapsed <= self.latency:
+            return
+        self.latency = elapsed if self.latency is None else self.latency + self.alpha * (elapsed - self.latency)
+        self.recent.append(elapsed)
+        llm_backend_ewma.labels(backend=self.name, stat="latency").set(self.latency)
+
+
+class LLMRouter:
+    """与 LLMClient 接口一致（chat / chat_stream / ping / close），RAGService 无需区分。"""
+
+    def __init__(self, backends: List[Backend], config: Optional[LLMConfig] = None):
+        if not backends:
+            raise ValueError("LLMRouter 至少需要一个后端")
+        self.backends = backends
+        self.config = config or LLMConfig()
+
+    def ranked(self) -> List[Backend]:
+        """按预估延迟排序的可用后端。"""
+        candidates = [b for b in self.backends if b.available()]
+        return sorted(candidates, key=lambda b: b.score(self.config.error_penalty))
+
+    async def _call(self, backend: Backend, system: str, user: str, **kwargs) -> str:
+        t0 = time.monotonic()
+        try:
+            answer = await backend.client.chat(system=system, user=user, **kwargs)
+        except asyncio.CancelledError:
+            backend.record_censored(time.monotonic() - t0)
+            raise
+        except Exception:
+            backend.record(None, waited=time.monotonic() - t0)
+            raise
+        backend.record(time.monotonic() - t0, count_tokens(system) + count_tokens(user) + count_tokens(answer))
+        return answer
+
+    async def chat(self, system: str, user: str, **kwargs) -> str:
+        """路由到最快的健康后端；不可用时换下一个，开启对冲时超过 p90 向次选后端再发一次。"""
+        ranked = self.ranked()
+        if not ranked:
+            raise LLMUnavailableError("没有可用的大模型后端（均熔断或超出费用上限）", retry_after=5.0)
+        tried: Set[str] = set()
+        error: Optional[Exception] = None
+        for i, backend in enumerate(ranked):
+            if backend.name in tried:
+                continue
+            rest = [b for b in ranked[i + 1:] if b.name not in tried]
+            backup = rest[0] if self.config.hedge and rest else None
+            try:
+                return await self._hedged(backend, backup, tried, system, user, **kwargs)
+            except LLMUnavailableError as e:
+                logger.warning(f"大模型后端 {backend.name} 不可用，尝试下一个: {e}")
+                error = e
+        raise error
+
+    async def _hedged(
+        self, primary: Backend, backup: Optional[Backend], tried: Set[str], system: str, user: str, **kwargs
+    ) -> str:
+        tried.add(primary.name)
+        delay = primary.p90() if backup is not None else None
+        if delay is None:
+            answer = await self._call(primary, system, user, **kwargs)
+            llm_backend_wins.labels(backend=primary.name, role="primary").inc()
+            return answer
+        tasks = {asyncio.ensure_future(self._call(primary, system, user, **kwargs)): (primary, "primary")}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=max(delay, self.config.hedge_min_delay))
+            if not done:
+                logger.info(f"{primary.name} 超过 p90 {delay:.2f}s 未返回，对冲到 {backup.name}")
+                tried.add(backup.name)
+                tasks[asyncio.ensure_future(self._call(backup, system, user, **kwargs))] = (backup, "hedge")
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        backend, role = tasks[task]
+                        llm_backend_wins.labels(backend=backend.name, role=role).inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if task.done() and not task.cancelled():
+                    task.exception()  # 已取得结果，失败的一方只需标记为已处理
+                else:
+                    task.cancel()
+
+    async def chat_stream(self, system: str, user: str, **kwargs) -> AsyncIterator[str]:
+        """流式请求不对冲：发往首选后端，在输出任何片段前不可用则换下一个。"""
+        ranked = self.ranked()
+        if not ranked:
+            raise LLMUnavailableError("没有可用的大模型后端（均熔断或超出费用上限）", retry_after=5.0)
+        for i, backend in enumerate(ranked):
+            t0 = time.monotonic()
+            pieces: List[str] = []
+            try:
+                # 显式关闭后端流：本迭代器被提前关闭时立即释放后端的 HTTP 响应与并发名额，不等垃圾回收
+                async with aclosing(backend.client.chat_stream(system=system, user=user, **kwargs)) as stream:
+                    async for piece in stream:
+                        pieces.append(piece)
+                        yield piece
+            except LLMUnavailableError as e:
+                backend.record(None, waited=time.monotonic() - t0)
+                if pieces or i == len(ranked) - 1:
+                    raise
+                logger.warning(f"大模型后端 {backend.name} 不可用，尝试下一个: {e}")
+                continue
+            backend.record(time.monotonic() - t0, count_tokens(system) + count_tokens(user) + count_tokens("".join(pieces)))
+            llm_backend_wins.labels(backend=backend.name, role="primary").inc()
+            return
+
+    async def warm_up(self) -> bool:
+        """预热支持预热的后端（本地模型）。"""
+        results = await asyncio.gather(*(b.client.warm_up() for b in self.backends if hasattr(b.client, "warm_up")))
+        return all(results)
+
+    async def ping(self) -> bool:
+        results = await asyncio.gather(*(b.client.ping() for b in self.backends))
+        return any(results)
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.client.close()
+
+
+def _client(b: LLMBackendConfig) -> LLMClient:
+    if b.kind == "ollama":
+        return OllamaClient(base_url=b.base_url, model=b.model, keep_alive=b.keep_alive)
+    return LLMClient(base_url=b.base_url, api_key=os.getenv(b.api_key_env) if b.api_key_env else None, model=b.model)
+
+
+def create_llm(config: Optional[LLMConfig] = None) -> Union[LLMClient, LLMRouter]:
+    """按 config.yaml 的 llm 段创建客户端：未配置 backends 时按 LLM_PROVIDER 使用单一端点。"""
+    config = config or get_llm_config()
+    if not config.backends:
+        return OllamaClient() if settings.LLM_PROVIDER == "ollama" else LLMClient()
+    backends = [
+        Backend(b, _client(b), alpha=config.ewma_alpha, prior_latency=config.prior_latency) for b in config.backends
+    ]
+    logger.info(f"大模型路由：{', '.join(b.name for b in backends)}（对冲{'开启' if config.hedge else '关闭'}）")
+    return LLMRouter(backends, config)
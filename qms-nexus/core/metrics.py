@@ -1,7 +1,7 @@
 """
 Prometheus 指标定义
 """
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 
 # 接口请求量
 upload_counter = Counter("qms_upload_total", "文件上传次数", ["status"])
@@ -9,4 +9,130 @@ search_counter = Counter("qms_search_total", "语义检索次数", ["status"])
 
 # 接口延迟
 upload_duration = Histogram("qms_upload_duration_seconds", "上传接口耗时")
-search_duration = Histogram("qms_search_duration_seconds", "检索接口耗时")
\ No newline at end of file
+search_duration = Histogram("qms_search_duration_seconds", "检索接口耗时")
+search_batch_size = Histogram("qms_search_batch_size", "批量检索单次查询条数", buckets=(1, 2, 4, 8, 16, 32, 64))
+
+# 向量库执行层
+vectordb_inflight = Gauge("qms_vectordb_inflight", "向量库通道排队+执行中的操作数", ["lane"])
+vectordb_queue_wait = Histogram("qms_vectordb_queue_wait_seconds", "向量库操作排队等待耗时", ["lane", "op"])
+vectordb_exec_duration = Histogram("qms_vectordb_exec_seconds", "向量库操作执行耗时", ["lane", "op"])
+vectordb_rejected_counter = Counter("qms_vectordb_rejected_total", "向量库通道饱和被拒绝次数", ["lane", "op"])
+upsert_batch_duration = Histogram("qms_vectordb_upsert_batch_seconds", "流式写入单批耗时", ["stage"])
+upserted_chunks_counter = Counter("qms_vectordb_upserted_chunks_total", "写入向量库的 chunk 数")
+tag_prefilter_counter = Counter("qms_tag_prefilter_total", "标签预过滤策略选择次数", ["strategy"])
+
+# 检索结果缓存
+search_cache_requests = Counter("qms_search_cache_requests_total", "检索缓存查询条数", ["result"])
+search_cache_saved_seconds = Counter("qms_search_cache_saved_seconds_total", "检索缓存命中节省的检索耗时")
+
+# 人工修正库
+correction_hits = Counter("qms_correction_hits_total", "人工修正库命中次数", ["tier"])
+
+# 问答上下文组装
+context_tokens = Histogram(
+    "qms_context_tokens",
+    "问答上下文 token 数（raw 为检索结果全部拼接，packed 为组装后）",
+    ["stage"],
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000),
+)
+
+# 请求截止时间
+deadline_exceeded = Counter("qms_deadline_exceeded_total", "超出请求截止时间的次数", ["stage"])
+degraded_answers = Counter(
+    "qms_degraded_answers_total", "大模型超时或不可用而返回检索原文的问答次数", ["reason"]
+)
+
+# 大模型调用
+llm_inflight = Gauge("qms_llm_inflight_requests", "进行中的大模型请求数（连接池占用）", ["endpoint"])
+llm_retries = Counter("qms_llm_retries_total", "大模型请求重试次数", ["reason"])
+llm_breaker_state = Gauge("qms_llm_breaker_state", "大模型熔断器状态（0 关闭 / 1 半开 / 2 熔断）", ["endpoint"])
+llm_breaker_rejected = Counter("qms_llm_breaker_rejected_total", "熔断期间直接拒绝的大模型请求数", ["endpoint"])
+
+# 多后端路由
+llm_backend_latency = Histogram(
+    "qms_llm_backend_latency_seconds",
+    "各大模型后端成功请求耗时",
+    ["backend"],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60),
+)
+llm_backend_ewma = Gauge("qms_llm_backend_ewma", "各后端延迟（秒）/ 错误率的滑动平均，用于路由", ["backend", "stat"])
+llm_backend_wins = Counter(
+    "qms_llm_router_wins_total", "各后端胜出（返回最终答案）的次数；role=hedge 为对冲请求胜出", ["backend", "role"]
+)
+llm_backend_cost = Counter("qms_llm_backend_cost_total", "各后端估算费用（按 token 数与单价）", ["backend"])
+
+# 本地 Ollama
+ollama_queue_wait = Histogram(
+    "qms_ollama_queue_wait_seconds",
+    "等待模型并发名额的时间",
+    ["model"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20),
+)
+ollama_queue_depth = Gauge("qms_ollama_queue_depth", "等待模型并发名额的请求数", ["model"])
+ollama_queue_rejected = Counter("qms_ollama_queue_rejected_total", "排队已满而直接拒绝的请求数", ["model"])
+ollama_request_seconds = Histogram(
+    "qms_ollama_request_seconds",
+    "获得名额后的请求耗时，按开始时的并发数（含本请求）分组，用于观察负载对延迟的影响",
+    ["model", "concurrency"],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60),
+)
+ollama_model_load = Histogram(
+    "qms_ollama_model_load_seconds",
+    "Ollama 返回的模型加载耗时（load_duration）；持续偏高说明 keep_alive 过短、模型被换出",
+    ["model"],
+    buckets=(0.01, 0.1, 0.5, 1, 2, 5, 10, 20, 40, 80),
+)
+
+# 流式问答
+llm_ttft = Histogram(
+    "qms_llm_ttft_seconds",
+    "流式问答首个答案片段的耗时（自收到请求起，含检索）",
+    buckets=(0.25, 0.5, 1, 1.5, 2, 3, 5, 8, 10, 20),
+)
+llm_tokens_per_second = Histogram(
+    "qms_llm_tokens_per_second",
+    "流式问答生成速度（首个片段之后，按 core.tokens 估算）",
+    buckets=(5, 10, 20, 30, 50, 75, 100, 150, 200),
+)
+
+# 问答请求合并
+coalesced_requests = Counter("qms_coalesced_requests_total", "合并到进行中问答的请求数", ["scope"])
+
+# 答案缓存（L1 进程内 / L2 Redis）
+answer_cache_requests = Counter("qms_answer_cache_requests_total", "答案缓存查询次数", ["tier", "result"])
+answer_cache_l1_bytes = Gauge("qms_answer_cache_l1_bytes", "答案缓存 L1 占用字节数（估算）")
+cache_op_duration = Histogram(
+    "qms_cache_op_seconds",
+    "答案缓存 Redis 单次操作耗时（含连接池排队）",
+    ["op"],
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+cache_codec_bytes = Histogram(
+    "qms_cache_value_bytes",
+    "缓存值字节数（serialized 为序列化后、encoded 为压缩并加格式号后，即 Redis 实际存储）",
+    ["stage"],
+    buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536, 262144),
+)
+cache_codec_seconds = Histogram(
+    "qms_cache_codec_seconds",
+    "缓存值编码/解码耗时",
+    ["op"],
+    buckets=(0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01),
+)
+
+# 答案缓存依赖失效
+answer_cache_invalidated = Counter("qms_answer_cache_invalidated_total", "来源文档变更而删除的缓存答案数")
+
+# 语义答案缓存
+semantic_cache_requests = Counter("qms_semantic_cache_requests_total", "语义答案缓存查询次数", ["result"])
+semantic_cache_similarity = Histogram(
+    "qms_semantic_cache_similarity",
+    "新问题与最相似缓存问题的余弦相似度（用于调整阈值）",
+    buckets=(0.5, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 1.0),
+)
+llm_calls_avoided = Counter("qms_llm_calls_avoided_total", "答案缓存命中而省去的大模型调用次数", ["cache"])
+
+# 向量缓存
+embedding_cache_requests = Counter("qms_embedding_cache_requests_total", "向量缓存查询条数", ["result"])
+embedding_cache_evictions = Counter("qms_embedding_cache_evictions_total", "向量缓存 LRU 淘汰条数")
+embedding_cache_entries = Gauge("qms_embedding_cache_entries", "向量缓存当前条数")
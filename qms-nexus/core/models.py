@@ -1,7 +1,7 @@
 """
 基础数据模型，全局无业务硬编码。
 """
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 from pydantic import BaseModel, Field
 
 # -----------------------
@@ -17,6 +17,31 @@ class EmbeddingConfig(BaseModel):
     dim: int = 512
     chunk_size: int = 800
     overlap: int = 100
+    model_path: Optional[str] = Field(None, description="本地模型目录（含 tokenizer.json 与 ONNX 模型），为空则交由 Chroma 默认向量化")
+    batch_size: int = Field(32, ge=1, description="向量化批大小")
+    num_threads: int = Field(4, ge=1, description="ONNX Runtime 推理线程数")
+    quantized: bool = Field(True, description="优先使用 int8 量化模型")
+    max_length: int = Field(512, ge=8, description="单条文本最大 token 数，超出截断")
+    pooling: str = Field("cls", description="池化方式：cls（bge 系列）/ mean")
+
+class LLMBackendConfig(BaseModel):
+    name: str = Field(..., description="后端名称，用于指标标签")
+    kind: Literal["openai", "ollama"] = Field("openai", description="openai 兼容端点 / ollama 原生 API")
+    base_url: str
+    model: str = "gpt-3.5-turbo"
+    api_key_env: Optional[str] = Field("OPENAI_API_KEY", description="存放 API Key 的环境变量名，密钥不写入配置文件")
+    weight: float = Field(1.0, gt=0, description="路由权重：预估延迟除以权重后比较，越大越优先")
+    cost_per_1k_tokens: float = Field(0.0, ge=0, description="每千 token 费用（提示词与答案合计，估算）")
+    hourly_cost_cap: float = Field(0.0, ge=0, description="每小时费用上限，达到后本小时内不再路由到该后端；0 为不限")
+    keep_alive: Optional[str] = Field(None, description="仅 ollama：模型常驻时长，默认取 OLLAMA_KEEP_ALIVE")
+
+class LLMConfig(BaseModel):
+    backends: List[LLMBackendConfig] = Field(default_factory=list, description="为空则使用 OPENAI_BASE_URL 单一端点")
+    hedge: bool = Field(False, description="首选后端超过其 p90 延迟仍未返回时，向次选后端发出对冲请求")
+    hedge_min_delay: float = Field(0.5, ge=0, description="对冲等待下限（秒）")
+    ewma_alpha: float = Field(0.2, gt=0, le=1, description="延迟/错误率指数滑动平均系数")
+    error_penalty: float = Field(4.0, ge=0, description="错误率对预估延迟的放大系数")
+    prior_latency: float = Field(5.0, gt=0, description="从未成功过的后端失败后采用的预估延迟（秒）")
 
 class ParserRule(BaseModel):
     mime: str
@@ -30,6 +55,7 @@ class GlobalConfig(BaseModel):
     company: CompanyConfig
     tag_pool: List[str] = Field(default_factory=list)
     embedding: EmbeddingConfig = Field(default_factory=EmbeddingConfig)
+    llm: LLMConfig = Field(default_factory=LLMConfig)
     parser: ParserConfig
 
 # -----------------------
@@ -54,11 +80,18 @@ class Document(BaseModel):
 # 检索模型
 # -----------------------
 class SearchResult(BaseModel):
+    id: Optional[str] = None  # chunk id
     text: str
-    score: float
+    score: float  # 余弦相似度
     source: str  # [来源：文件名, 第X页]
     tags: List[str]
     metadata: Dict[str, Any] = Field(default_factory=dict)
+    rrf_score: Optional[float] = None  # 混合检索的 RRF 融合分，仅用于排序
+
+    @property
+    def rank_score(self) -> float:
+        """排序依据：混合检索用 RRF 融合分，纯向量检索用相似度。"""
+        return self.score if self.rrf_score is None else self.rrf_score
 
 class SearchRequest(BaseModel):
     q: str = Field(..., min_length=1)
@@ -0,0 +1,196 @@
+"""
+本地 Ollama 原生 API 适配（US-Beta-05 全本地推理），接口与 LLMClient 一致，可单独使用或作为路由后端。
+/api/chat 按行返回 JSON 增量；请求带 keep_alive 使模型常驻，启动时预热，避免首个提问承担数十秒冷加载。
+Ollama 单模型并行数有限（OLLAMA_NUM_PARALLEL），超出的请求在服务端排队且不可见：
+这里按模型在进程内限流，排队数有上限，超出直接拒绝（503 / 降级），排队时间与负载下的耗时计入指标。
+首字节超时与重试次数独立配置（OLLAMA_FIRST_BYTE_TIMEOUT / OLLAMA_MAX_RETRIES）：非流式请求生成完毕才有响应头，
+超时后不重试，否则会在已满载的本地模型上再生成一遍。
+"""
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Union
+
+import httpx
+
+from core.config import settings
+from core.llm import LLMClient, LLMUnavailableError
+from core.logger import get_logger
+from core.metrics import (
+    ollama_model_load,
+    ollama_queue_depth,
+    ollama_queue_rejected,
+    ollama_queue_wait,
+    ollama_request_seconds,
+)
+
+logger = get_logger(__name__)
+
+
+class _ModelGate:
+    """单个模型的并发闸门：最多 limit 个请求同时进行，最多 max_queue 个排队。"""
+
+    def __init__(self, model: str, limit: int, max_queue: int):
+        self.model = model
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self._sem = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[int]:
+        """获得名额后 yield 当前并发数（含本请求）；排队已满抛 LLMUnavailableError。"""
+        if self._sem.locked() and self.waiting >= self.max_queue:
+            ollama_queue_rejected.labels(model=self.model).inc()
+            raise LLMUnavailableError(f"本地模型 {self.model} 排队已满（{self.waiting}），请稍后重试", retry_after=1.0)
+        self.waiting += 1
+        ollama_queue_depth.labels(model=self.model).set(self.waiting)
+        t0 = time.perf_counter()
+        try:
+            await self._sem.acquire()
+        finally:
+            self.waiting -= 1
+            ollama_queue_depth.labels(model=self.model).set(self.waiting)
+        ollama_queue_wait.labels(model=self.model).observe(time.perf_counter() - t0)
+        self.active += 1
+        try:
+            yield self.active
+        finally:
+            self.active -= 1
+            self._sem.release()
+
+
+_gates: Dict[Tuple[str, str], _ModelGate] = {}
+
+
+def get_gate(base_url: str, model: str) -> _ModelGate:
+    """进程级共享闸门，保证同一模型的并发上限对所有客户端实例生效。"""
+    key = (base_url, model)
+    if key not in _gates:
+        _gates[key] = _ModelGate(model, settings.OLLAMA_MAX_CONCURRENCY, settings.OLLAMA_MAX_QUEUE)
+    return _gates[key]
+
+
+def _keep_alive(value: str) -> Union[str, int]:
+    # Ollama 接受时长字符串（30m）或秒数；纯数字按秒传，-1 为永久常驻
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+class OllamaClient(LLMClient):
+    """Ollama 原生 API 客户端；连接池、退避与熔断沿用 LLMClient，首字节超时与重试策略单独配置。"""
+
+    def __init__(
+        self,
+        base_url: str = None,
+        model: str = None,
+        keep_alive: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+    ):
+        super().__init__(
+            base_url=base_url or settings.OLLAMA_BASE_URL,
+            model=model or settings.OLLAMA_MODEL,
+            # 读取超时不短于首字节超时，否则非流式请求在等待响应头时先被读取超时打断
+            timeout=timeout or max(settings.LLM_READ_TIMEOUT, settings.OLLAMA_FIRST_BYTE_TIMEOUT),
+            max_retries=settings.OLLAMA_MAX_RETRIES if max_retries is None else max_retries,
+        )
+        self.first_byte_timeout = settings.OLLAMA_FIRST_BYTE_TIMEOUT
+        self.api_key = None  # 本地端点无需鉴权，不外发 OPENAI_API_KEY
+        self.keep_alive = _keep_alive(keep_alive or settings.OLLAMA_KEEP_ALIVE)
+        self.gate = get_gate(self.base_url, self.model)
+
+    def _payload(self, system: str, user: str, temperature: float, max_tokens: int, stream: bool) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": {"temperature": temperature, "num_predict": max_tokens},
+        }
+
+    @asynccontextmanager
+    async def _post(self, payload: Dict[str, Any], path: str = "/api/chat") -> AsyncIterator[httpx.Response]:
+        async with self.gate.slot() as concurrency:
+            t0 = time.perf_counter()
+            async with super()._post(payload, path) as resp:
+                yield resp
+            ollama_request_seconds.labels(model=self.model, concurrency=str(concurrency)).observe(
+                time.perf_counter() - t0
+            )
+
+    def _retry_on_timeout(self, payload: Dict[str, Any]) -> bool:
+        # 流式请求的响应头在首个 token 时返回，超时多为冷加载或排队，可重试
+        return bool(payload.get("stream"))
+
+    def _observe_load(self, data: Dict[str, Any]) -> None:
+        # load_duration 单位为纳秒；模型已常驻时仅为毫秒级
+        if data.get("load_duration"):
+            ollama_model_load.labels(model=self.model).observe(data["load_duration"] / 1e9)
+
+    async def chat(
+        self,
+        system: str,
+        user: str,
+        temperature: float = 0.3,
+        max_tokens: int = 1024,
+        stream: bool = False,
+    ) -> str:
+        """非流式聊天，返回完整字符串。"""
+        async with self._post(self._payload(system, user, temperature, max_tokens, stream=False)) as resp:
+            with self._reading():
+                await resp.aread()
+        data = resp.json()
+        self._observe_load(data)
+        return data["message"]["content"]
+
+    async def chat_stream(
+        self,
+        system: str,
+        user: str,
+        temperature: float = 0.3,
+        max_tokens: int = 1024,
+    ) -> AsyncIterator[str]:
+        """流式聊天：每行一个 JSON（message.content 为增量），done 为 true 的行附带耗时统计。"""
+        async with self._post(self._payload(system, user, temperature, max_tokens, stream=True)) as resp:
+            with self._reading():
+                async for line in resp.aiter_lines():
+                    if not line.strip():
+                        continue
+                    data = json.loads(line)
+                    if "error" in data:
+                        raise LLMUnavailableError(f"本地模型 {self.model} 生成失败: {data['error']}")
+                    content = (data.get("message") or {}).get("content")
+                    if content:
+                        yield content
+                    if data.get("done"):
+                        self._observe_load(data)
+                        break
+
+    async def warm_up(self) -> bool:
+        """预热：不带 prompt 的 generate 请求只加载模型并按 keep_alive 常驻，不占并发名额。"""
+        t0 = time.perf_counter()
+        try:
+            resp = await self.client.post(
+                "/api/generate",
+                json={"model": self.model, "keep_alive": self.keep_alive},
+                timeout=settings.OLLAMA_WARMUP_TIMEOUT,
+            )
+            resp.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"本地模型 {self.model} 预热失败: {type(e).__name__} {e}")
+            return False
+        self._observe_load(resp.json())
+        logger.info(f"本地模型 {self.model} 预热完成，耗时 {time.perf_counter() - t0:.1f}s")
+        return True
+
+    async def ping(self) -> bool:
+        """健康检查：调用 tags 端点。"""
+        try:
+            resp = await self.client.get("/api/tags")
+            return resp.status_code == 200
+        except Exception:
+            return False
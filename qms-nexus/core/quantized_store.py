@@ -0,0 +1,486 @@
+"""
+量化向量存储：内存中只保留压缩码（int8 标量量化或 PQ 乘积量化，可先截断维度），
+全精度 float32 向量顺序追加到磁盘文件并以 memmap 读取，仅对候选做精确重排。
+压缩码按粗聚类中心分桶（IVF），查询只扫描最近的 nprobe 个桶。
+
+文件布局（<path>/）：
+- vectors.f32   全精度向量，按行追加，行号即存储位置；覆盖写入 = 追加新行并让旧行失效
+- codes.bin     与 vectors.f32 行号对齐的压缩码，训练量化器之后才生成
+- lists.bin     与行号对齐的 IVF 桶号（uint16）
+- quantizer.npz 量化器参数（IVF 中心 + int8 每维缩放 / PQ 码本），向量数达到 train_size 时训练一次
+- rows/         id → 行号映射（段文件，与 BM25/标签索引同格式）
+- writer.lock   写入锁：行号按文件长度分配，追加、训练与重写在跨进程文件锁内完成，API 与 worker 进程可同时写入
+- generation    重写代号：失效行占比超过 vacuum_ratio 时 commit() 把存活行重写为新文件并重排行号，
+                重写期间代号为奇数，读端此时改在写入锁内加载，保证文件与行号映射一致
+读端 refresh() 增量加载其他进程追加的行，代号变化时整体重载。
+"""
+import itertools
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Container, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.file_lock import FileLock
+from core.segment_index import SegmentedIndex
+
+_BLOCK = 65536  # 近似打分的分块行数，限制临时内存
+
+
+class _RowMap(SegmentedIndex):
+    """chunk id → 行号；同时维护行号 → id 与存活标记。"""
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__(path)
+        self.rows: Dict[str, int] = {}
+        self.row_ids: List[Optional[str]] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self._open()
+
+    def _reset(self) -> None:
+        self.rows.clear()
+        self.row_ids.clear()
+        self.alive = np.zeros(0, dtype=bool)
+
+    def _ensure(self, row: int) -> None:
+        if row >= len(self.row_ids):
+            self.row_ids.extend([None] * (row + 1 - len(self.row_ids)))
+        if row >= len(self.alive):
+            grown = np.zeros(max(row + 1, 2 * len(self.alive)), dtype=bool)
+            grown[: len(self.alive)] = self.alive
+            self.alive = grown
+
+    def _apply_add(self, doc_id: str, row: int) -> None:
+        old = self.rows.get(doc_id)
+        if old is not None:
+            self.alive[old] = False
+            self.row_ids[old] = None
+        self._ensure(row)
+        self.rows[doc_id] = row
+        self.row_ids[row] = doc_id
+        self.alive[row] = True
+
+    def _apply_del(self, doc_id: str) -> None:
+        row = self.rows.pop(doc_id, None)
+        if row is not None:
+            self.alive[row] = False
+            self.row_ids[row] = None
+
+    def _live_items(self):
+        return self.rows.items()
+
+    def rebase(self, rows: Dict[str, int]) -> None:
+        """存储重写后整体替换映射，写为一个基准段；调用方需已 commit 且持有存储的写入锁。"""
+        with self._writing():
+            self._reset()
+            for doc_id, row in rows.items():
+                self._apply_add(doc_id, row)
+            self._write_segment({"base": True, "add": [[d, r] for d, r in rows.items()], "del": []})
+            self._drop_older_segments()
+
+    def assign(self, doc_id: str, row: int) -> None:
+        with self._lock:
+            self._apply_add(doc_id, row)
+            self._record_add(doc_id, row)
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            self._apply_del(doc_id)
+            self._record_del(doc_id)
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return x / (np.linalg.norm(x, axis=-1, keepdims=True) + 1e-12)
+
+
+def _kmeans(x: np.ndarray, k: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+    for _ in range(iters):
+        dist = (x ** 2).sum(1, keepdims=True) - 2 * x @ centroids.T + (centroids ** 2).sum(1)
+        assign = dist.argmin(1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # 空簇重新随机取点
+        if empty.any():
+            centroids[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class QuantizedVectorStore:
+    """压缩码近似召回 + memmap 全精度重排；method 为 "int8" 或 "pq"。"""
+
+    def __init__(
+        self,
+        path: str,
+        dim: int,
+        method: str = "int8",
+        truncate_dim: int = 0,
+        pq_subspaces: int = 32,
+        train_size: int = 4096,
+        rerank: int = 100,
+        nlist: int = 0,
+        nprobe: int = 8,
+        vacuum_ratio: float = 0.3,
+        vacuum_min_rows: int = 1024,
+    ):
+        if method not in ("int8", "pq"):
+            raise ValueError(f"不支持的量化方式: {method}")
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.method = method
+        self.code_dim = truncate_dim if 0 < truncate_dim < dim else dim
+        if method == "pq" and self.code_dim % pq_subspaces:
+            raise ValueError(f"PQ 子空间数 {pq_subspaces} 须整除向量维度 {self.code_dim}")
+        self.pq_subspaces = pq_subspaces
+        self.train_size = max(train_size, 256)
+        self.rerank = rerank
+        # 每个桶至少约 39 个训练样本，k-means 中心才稳定
+        self.nlist = min(nlist or max(1, self.train_size // 39), self.train_size // 39 or 1, 65535)
+        self.nprobe = nprobe
+        self.vacuum_ratio = vacuum_ratio
+        self.vacuum_min_rows = vacuum_min_rows
+        self.code_size = self.code_dim if method == "int8" else pq_subspaces
+        self._code_dtype = np.int8 if method == "int8" else np.uint8
+
+        self._vec_file = self.path / "vectors.f32"
+        self._codes_file = self.path / "codes.bin"
+        self._lists_file = self.path / "lists.bin"
+        self._quant_file = self.path / "quantizer.npz"
+        self._gen_file = self.path / "generation"
+        self._gen = 0
+        self._rows = _RowMap(str(self.path / "rows"))
+        self._lock = threading.RLock()
+        # 同一进程内由 _lock 串行，跨进程由文件锁串行：两个写入者不会拿到重叠的行号
+        self._writer_lock = FileLock(self.path / "writer.lock")
+        self._reset_memory()
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self._rows.rows)
+
+    # -------- 内存状态 --------
+    def _reset_memory(self) -> None:
+        self._vectors: Optional[np.memmap] = None
+        self._n_vectors = 0
+        self._codes = np.empty((0, self.code_size), dtype=self._code_dtype)
+        self._n_codes = 0
+        self._lists = np.empty(0, dtype=np.uint16)
+        self._buckets: Optional[Tuple[np.ndarray, np.ndarray]] = None  # (按桶排序的行号, 各桶起点)
+        self._quantizer: Optional[Dict[str, np.ndarray]] = None
+
+    def _file_rows(self, path: Path, row_bytes: int) -> int:
+        try:
+            return path.stat().st_size // row_bytes
+        except FileNotFoundError:
+            return 0
+
+    def _append_codes(self, codes: np.ndarray, lists: np.ndarray) -> None:
+        need = self._n_codes + len(codes)
+        if need > len(self._codes):
+            cap = max(need, 2 * len(self._codes))
+            grown = np.empty((cap, self.code_size), dtype=self._code_dtype)
+            grown[: self._n_codes] = self._codes[: self._n_codes]
+            self._codes = grown
+            grown_lists = np.empty(cap, dtype=np.uint16)
+            grown_lists[: self._n_codes] = self._lists[: self._n_codes]
+            self._lists = grown_lists
+        self._codes[self._n_codes: need] = codes
+        self._lists[self._n_codes: need] = lists
+        self._n_codes = need
+        self._buckets = None
+
+    def _generation(self) -> int:
+        try:
+            return int(self._gen_file.read_text() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _set_generation(self, gen: int) -> None:
+        tmp = self.path / f".generation.{os.getpid()}"
+        tmp.write_text(str(gen))
+        os.replace(tmp, self._gen_file)
+
+    def refresh(self) -> None:
+        """加载其他进程追加的行、量化器与压缩码；文件被截断（清空）或重写时整体重载。"""
+        with self._lock:
+            gen = self._generation()
+            if gen % 2 == 0:
+                self._refresh(gen)
+                if self._generation() == gen:
+                    return
+            # 重写进行中或加载期间发生了重写：在写入锁内重新加载
+            with self._writer_lock:
+                self._refresh(self._generation())
+
+    def _refresh(self, gen: int) -> None:
+        """调用方持有 _lock；gen 与已加载的代号不同时丢弃内存状态重新加载。"""
+        if gen != self._gen:
+            self._reset_memory()
+            self._gen = gen
+        self._rows.refresh()
+        n_vec = self._file_rows(self._vec_file, self.dim * 4)
+        n_codes = min(self._file_rows(self._codes_file, self.code_size), self._file_rows(self._lists_file, 2))
+        if n_vec < self._n_vectors or n_codes < self._n_codes or (
+            self._quantizer is not None and not self._quant_file.exists()
+        ):
+            self._reset_memory()
+        if n_vec != self._n_vectors:
+            self._vectors = (
+                np.memmap(self._vec_file, dtype=np.float32, mode="r", shape=(n_vec, self.dim)) if n_vec else None
+            )
+            self._n_vectors = n_vec
+        if self._quantizer is None and self._quant_file.exists():
+            with np.load(self._quant_file) as data:
+                self._quantizer = {k: data[k] for k in data.files}
+        if self._quantizer is not None and n_codes > self._n_codes:
+            count = n_codes - self._n_codes
+            with open(self._codes_file, "rb") as f:
+                f.seek(self._n_codes * self.code_size)
+                codes = np.frombuffer(f.read(count * self.code_size), dtype=self._code_dtype)
+            with open(self._lists_file, "rb") as f:
+                f.seek(self._n_codes * 2)
+                lists = np.frombuffer(f.read(count * 2), dtype=np.uint16)
+            self._append_codes(codes.reshape(-1, self.code_size), lists)
+
+    # -------- 量化 --------
+    def _truncate(self, x: np.ndarray) -> np.ndarray:
+        return _normalize(x[..., : self.code_dim]) if self.code_dim < self.dim else x
+
+    def _train(self) -> None:
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(self._n_vectors, min(self._n_vectors, 20000), replace=False))
+        sample = self._truncate(np.asarray(self._vectors[sample_rows]))
+        params = {"coarse": _normalize(_kmeans(sample, self.nlist, 15, rng)).astype(np.float32)}
+        if self.method == "int8":
+            params["scale"] = (np.abs(sample).max(0) / 127).clip(1e-6).astype(np.float32)
+        else:
+            dsub = self.code_dim // self.pq_subspaces
+            params["codebook"] = np.stack(
+                [_kmeans(sample[:, j * dsub:(j + 1) * dsub], 256, 15, rng) for j in range(self.pq_subspaces)]
+            ).astype(np.float32)
+        tmp = self.path / f".quantizer.{os.getpid()}.npz"
+        np.savez(tmp, **params)
+        os.replace(tmp, self._quant_file)
+        self._quantizer = params
+        # 已有向量全部编码，写入新的压缩码与桶号文件
+        encoded = [self._encode(np.asarray(self._vectors[i:i + _BLOCK])) for i in range(0, self._n_vectors, _BLOCK)]
+        codes = np.concatenate([c for c, _ in encoded])
+        lists = np.concatenate([b for _, b in encoded])
+        for data, target in ((lists, self._lists_file), (codes, self._codes_file)):
+            tmp = self.path / f".{target.name}.{os.getpid()}"
+            data.tofile(tmp)
+            os.replace(tmp, target)
+        self._n_codes = 0
+        self._append_codes(codes, lists)
+
+    def _encode(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (压缩码, IVF 桶号)。"""
+        x = self._truncate(x)
+        lists = (x @ self._quantizer["coarse"].T).argmax(1).astype(np.uint16)
+        if self.method == "int8":
+            return np.clip(np.rint(x / self._quantizer["scale"]), -127, 127).astype(np.int8), lists
+        codebook = self._quantizer["codebook"]
+        dsub = codebook.shape[2]
+        codes = np.empty((len(x), self.pq_subspaces), dtype=np.uint8)
+        for j in range(self.pq_subspaces):
+            sub = x[:, j * dsub:(j + 1) * dsub]
+            dist = -2 * sub @ codebook[j].T + (codebook[j] ** 2).sum(1)
+            codes[:, j] = dist.argmin(1)
+        return codes, lists
+
+    # -------- 写入 --------
+    def add(self, ids: List[str], vectors: np.ndarray) -> None:
+        """追加向量（已存在的 id 指向新行）；达到 train_size 时训练量化器。"""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"向量维度 {vectors.shape[1]} 与存储维度 {self.dim} 不一致")
+        with self._lock, self._writer_lock:
+            self._refresh(self._generation())
+            start = self._n_vectors
+            with open(self._vec_file, "ab") as f:
+                vectors.tofile(f)
+            if self._quantizer is not None:
+                codes, lists = self._encode(vectors)
+                # 先写桶号再写压缩码，读端以两者较短者为准
+                with open(self._lists_file, "ab") as f:
+                    lists.tofile(f)
+                with open(self._codes_file, "ab") as f:
+                    codes.tofile(f)
+            self._refresh(self._generation())
+            for offset, doc_id in enumerate(ids):
+                self._rows.assign(doc_id, start + offset)
+            # 行号映射在写入锁内落盘：重写时锁外不存在未提交的新行，其他进程未提交的只有按 id 的删除
+            self._rows.commit()
+            if self._quantizer is None and self._n_vectors >= self.train_size:
+                self._train()
+
+    def remove(self, ids: List[str]) -> None:
+        """删除只让行失效；commit() 时失效行占比超过 vacuum_ratio 则重写回收内存与磁盘。"""
+        with self._lock:
+            for doc_id in ids:
+                self._rows.remove(doc_id)
+
+    def commit(self) -> None:
+        with self._lock:
+            self._rows.commit()
+            dead = self._n_vectors - len(self)
+            if dead >= self.vacuum_min_rows and dead > self.vacuum_ratio * self._n_vectors:
+                with self._writer_lock:
+                    self._vacuum()
+
+    def _vacuum(self) -> None:
+        """把存活行重写为新的向量、压缩码与桶号文件并重排行号；调用方持有 _lock 与写入锁。"""
+        self._refresh(self._generation())
+        n = self._n_vectors
+        if self._quantizer is not None and self._n_codes != n:
+            return  # 压缩码与向量行数不一致（写入中断），不重写
+        live = np.flatnonzero(self._rows.alive[:n])
+        if n - len(live) < self.vacuum_min_rows or n - len(live) <= self.vacuum_ratio * n:
+            return
+        gen = self._generation()
+        gen += 1 if gen % 2 == 0 else 2
+        self._set_generation(gen)  # 奇数：重写中，读端改在写入锁内加载
+        targets = [self._vec_file]
+        with open(self.path / f".{self._vec_file.name}.{os.getpid()}", "wb") as f:
+            for i in range(0, len(live), _BLOCK):
+                np.asarray(self._vectors[live[i:i + _BLOCK]]).tofile(f)
+        if self._quantizer is not None:
+            targets += [self._lists_file, self._codes_file]
+            self._lists[live].tofile(self.path / f".{self._lists_file.name}.{os.getpid()}")
+            self._codes[live].tofile(self.path / f".{self._codes_file.name}.{os.getpid()}")
+        for target in targets:
+            os.replace(self.path / f".{target.name}.{os.getpid()}", target)
+        row_ids = self._rows.row_ids
+        self._rows.rebase({row_ids[row]: i for i, row in enumerate(live.tolist())})
+        self._set_generation(gen + 1)
+        self._refresh(gen + 1)
+
+    def clear(self) -> None:
+        with self._lock, self._writer_lock:
+            for p in (self._vec_file, self._codes_file, self._lists_file, self._quant_file):
+                p.unlink(missing_ok=True)
+            self._reset_memory()
+            self._rows.clear()
+
+    # -------- 检索 --------
+    def get_vectors(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """按 id 取全精度向量，返回 (存在的 id, 向量矩阵)。"""
+        with self._lock:
+            found = [(doc_id, self._rows.rows[doc_id]) for doc_id in ids if doc_id in self._rows.rows]
+            if not found:
+                return [], np.empty((0, self.dim), dtype=np.float32)
+            rows = np.array([row for _, row in found])
+            return [doc_id for doc_id, _ in found], np.asarray(self._vectors[rows])
+
+    def _probe(self, qt: np.ndarray, n: int, nprobe: int) -> np.ndarray:
+        """最近 nprobe 个桶内的行号。"""
+        if self._buckets is None:
+            order = np.argsort(self._lists[: self._n_codes], kind="stable")
+            starts = np.searchsorted(self._lists[: self._n_codes][order], np.arange(self.nlist + 1))
+            self._buckets = (order, starts)
+        order, starts = self._buckets
+        nearest = np.argsort(-(self._quantizer["coarse"] @ qt))[:nprobe]
+        rows = np.concatenate([order[starts[b]:starts[b + 1]] for b in nearest])
+        return rows[rows < n]
+
+    def _approx_scores(self, q: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        if self._quantizer is None:
+            # 未训练（向量较少）时直接精确打分
+            return np.concatenate([np.asarray(self._vectors[rows[i:i + _BLOCK]]) @ q for i in range(0, len(rows), _BLOCK)])
+        qt = self._truncate(q)
+        if self.method == "int8":
+            w = qt * self._quantizer["scale"]
+            return np.concatenate(
+                [self._codes[rows[i:i + _BLOCK]].astype(np.float32) @ w for i in range(0, len(rows), _BLOCK)]
+            )
+        codebook = self._quantizer["codebook"]
+        dsub = codebook.shape[2]
+        lut = np.einsum("jkd,jd->jk", codebook, qt.reshape(self.pq_subspaces, dsub))
+        sub = np.arange(self.pq_subspaces)
+        return np.concatenate(
+            [lut[sub, self._codes[rows[i:i + _BLOCK]].astype(np.intp)].sum(1) for i in range(0, len(rows), _BLOCK)]
+        )
+
+    def _candidates(
+        self, rows: np.ndarray, scores: np.ndarray, want: int, accept: Optional[Container[str]]
+    ) -> np.ndarray:
+        """取近似分最高的候选行；有 accept 时逐轮放大，直到过滤后够数或扫完。"""
+        valid = int(np.isfinite(scores).sum())
+        k = min(valid, want if accept is None else want * 4)
+        while k > 0:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = rows[top[np.argsort(-scores[top])]]
+            if accept is not None:
+                row_ids = self._rows.row_ids
+                top = np.array([r for r in top if row_ids[r] in accept], dtype=np.intp)
+            if len(top) >= want or k >= valid:
+                return top[:want]
+            k = min(valid, k * 4)
+        return np.empty(0, dtype=np.intp)
+
+    def search(
+        self, queries: np.ndarray, top_k: int, accept: Optional[Container[str]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """返回每条查询的 [(id, 余弦相似度)]；accept 为可选的 id 过滤集合。"""
+        queries = _normalize(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            n = min(self._n_vectors, self._n_codes) if self._quantizer is not None else self._n_vectors
+            if n == 0:
+                return [[] for _ in queries]
+            alive = self._rows.alive[:n]
+            if len(alive) < n:
+                alive = np.concatenate([alive, np.zeros(n - len(alive), dtype=bool)])
+            want = max(self.rerank, top_k)
+            results = []
+            for q in queries:
+                nprobe = self.nprobe
+                while True:
+                    if self._quantizer is None or nprobe >= self.nlist:
+                        rows = np.arange(n)
+                    else:
+                        rows = self._probe(self._truncate(q), n, nprobe)
+                    scores = self._approx_scores(q, rows)
+                    scores[~alive[rows]] = -np.inf
+                    cand = self._candidates(rows, scores, want, accept)
+                    # 桶内候选不足（过滤条件较严或桶太小）时扩大探测范围
+                    if len(cand) >= want or len(rows) == n:
+                        break
+                    nprobe *= 4
+                if not len(cand):
+                    results.append([])
+                    continue
+                cand = np.sort(cand)  # 按行号顺序读 memmap，减少随机 IO
+                exact = np.asarray(self._vectors[cand]) @ q
+                order = np.argsort(-exact)[:top_k]
+                results.append([(self._rows.row_ids[cand[i]], float(exact[i])) for i in order])
+            return results
+
+    def _rows_bytes(self) -> int:
+        """id → 行号映射的常驻内存：dict 与 row_ids 列表本身、id 字符串、行号 int 对象、存活标记。"""
+        rows, row_ids = self._rows.rows, self._rows.row_ids
+        total = sys.getsizeof(rows) + sys.getsizeof(row_ids) + self._rows.alive.nbytes
+        if rows:
+            # row_ids 与 dict 共用同一批 id 字符串；逐个统计为 O(n)，取前 1000 个估算平均长度
+            sample = list(itertools.islice(rows, 1000))
+            per_id = sum(sys.getsizeof(doc_id) for doc_id in sample) / len(sample)
+            total += len(rows) * (per_id + sys.getsizeof(1 << 20))
+        return int(total)
+
+    def stats(self) -> Dict[str, int]:
+        """存活行的常驻内存（压缩码 + 桶号 + id 映射）与磁盘全精度向量大小，单位字节；
+        失效行在下次重写前仍占用的部分单独以 dead_rows 给出。"""
+        live_codes = int(self._rows.alive[: self._n_codes].sum())
+        return {
+            "vectors": len(self),
+            "rows": self._n_vectors,
+            "dead_rows": self._n_vectors - len(self),
+            "codes_bytes": live_codes * self.code_size,
+            "resident_bytes": int(live_codes * (self.code_size + 2) + self._rows_bytes()),
+            "disk_bytes": int(len(self) * self.dim * 4),
+        }
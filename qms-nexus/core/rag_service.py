@@ -2,45 +2,332 @@
 RAG 业务 Service 层
 封装检索 + 大模型调用，禁止在 API 层直接写逻辑
 """
+import asyncio
 import time
-from core.llm import LLMClient
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+import numpy as np
+
+from core.config import settings
+from core.corrections import Correction, CorrectionStore
+from core.deadline import DeadlineExceeded, within
+from core.embedding_cache import normalize_text
+from core.llm import LLMUnavailableError
+from core.llm_router import create_llm
+from core.metrics import (
+    coalesced_requests,
+    correction_hits,
+    degraded_answers,
+    llm_calls_avoided,
+    llm_tokens_per_second,
+    llm_ttft,
+    semantic_cache_requests,
+)
+from core.models import SearchResult
+from core.semantic_cache import CachedAnswer, SemanticAnswerCache
+from core.single_flight import SingleFlight
+from core.tokens import count_tokens
 from core.vectordb import VectorDBClient
+from services.context_builder import ContextBuilder
 from services.prompt_service import PromptService
 from core.logger import get_logger
-from core.cache import CacheClient
+from core.cache import get_cache_client
 
 logger = get_logger(__name__)
 
+# 修正库命中时的来源标注（US-Alpha-06）
+CORRECTION_SOURCE = "人工修正答案"
+# 大模型未能在截止时间内完成时，降级答案的开头说明
+DEGRADED_NOTICE = "大模型未能在时限内生成答案，以下为知识库中最相关的原文："
+NO_RESULT = "知识库中暂无相关记录"
+LLM_USER_PROMPT = "请回答上述问题。"
+
+
+@dataclass
+class _Retrieval:
+    """检索与上下文组装的结果：system 为渲染后的提示词，versions 为生成前记录的来源版本。"""
+
+    system: str
+    results: List[SearchResult]
+    sources: List[str]
+    filenames: List[str]
+    versions: Dict[str, Optional[tuple]]
+
 
 class RAGService:
     def __init__(self):
-        self.db = VectorDBClient()
-        self.llm = LLMClient()
+        self.cache = get_cache_client()
+        self.db = VectorDBClient(answer_cache=self.cache)
+        self.llm = create_llm()
         self.prompt = PromptService()
-        self.cache = CacheClient()
+        self.context = ContextBuilder()
+        self.flight = SingleFlight()
+        self.corrections = CorrectionStore(
+            settings.CORRECTIONS_DB,
+            dim=self.db.embedding_config.dim if self.db.embedder is not None else 0,
+            threshold=settings.CORRECTION_MATCH_THRESHOLD,
+        )
+        # 语义缓存需要本地向量模型
+        self.semantic: Optional[SemanticAnswerCache] = None
+        if self.db.embedder is not None and settings.SEMANTIC_CACHE_MAX_ENTRIES > 0:
+            self.semantic = SemanticAnswerCache(
+                self.db.embedding_config.dim,
+                max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                ttl=settings.SEMANTIC_CACHE_TTL,
+            )
+
+    async def _embed_question(self, question: str) -> Optional[np.ndarray]:
+        if self.db.embedder is None:
+            return None
+        return (await self.db.executor.read("embed", self.db.embedder.embed, [question]))[0]
+
+    async def _semantic_lookup(self, question: str, vector: Optional[np.ndarray]) -> Optional[CachedAnswer]:
+        """相似问题的缓存答案；其引用的文档已更新或删除时丢弃并返回 None。"""
+        if vector is None or self.semantic is None:
+            return None
+        found = self.semantic.lookup(vector)
+        if found is None:
+            return None
+        slot, entry, sim = found
+        if await self.db.document_versions(entry.versions) != entry.versions:
+            self.semantic.discard(slot, entry)
+            return None
+        semantic_cache_requests.labels(result="hit").inc()
+        logger.info(
+            f"语义缓存命中（相似度 {sim:.3f}）：{entry.question}",
+            extra={"user": "anonymous", "question": question},
+        )
+        return entry
+
+    async def _wait_remote(self, cache_key: str, lease_key: str) -> Optional[dict]:
+        """其他副本持有租约时轮询结果 key；租约释放或过期仍无结果则返回 None，由本副本自行计算。"""
+        while True:
+            await asyncio.sleep(settings.ASK_LEASE_POLL)
+            cached = await self.cache.get(cache_key)
+            if cached or not await self.cache.exists(lease_key):
+                return cached
+
+    async def add_correction(self, question: str, answer: str, wrong_answer: str = "") -> int:
+        """提交人工修正（US-Alpha-03），并清除该问题的答案缓存，返回修正 id。
+
+        相近问题的已缓存答案不逐条清除：问答路径先查修正库（含相似匹配）再查答案缓存。
+        """
+        vector = await self._embed_question(question)
+        correction_id = await asyncio.to_thread(self.corrections.add, question, answer, wrong_answer, vector)
+        await self.cache.delete(f"q:{normalize_text(question)}")
+        logger.info(f"新增人工修正 #{correction_id}", extra={"user": "anonymous", "question": question})
+        return correction_id
+
+    @staticmethod
+    def _degraded(results: List[SearchResult]) -> tuple[str, list[str]]:
+        """排序最靠前的几段检索原文及其来源，作为大模型超时时的降级答案。"""
+        top = sorted(results, key=lambda r: r.rank_score, reverse=True)[: settings.ASK_DEGRADED_PASSAGES]
+        passages = "\n\n".join(f"[{i}] {r.source}\n{r.text}" for i, r in enumerate(top, 1))
+        return f"{DEGRADED_NOTICE}\n\n{passages}", [r.source for r in top]
+
+    def _corrected(self, correction: Correction, tier: str) -> tuple[str, list[str]]:
+        correction_hits.labels(tier=tier).inc()
+        llm_calls_avoided.labels(cache="correction").inc()
+        logger.info(
+            f"人工修正库命中 #{correction.id}（{tier}，相似度 {correction.similarity:.3f}）",
+            extra={"user": "anonymous", "question": correction.question},
+        )
+        return correction.answer, [CORRECTION_SOURCE]
+
+    async def _correction(self, question: str) -> tuple[Optional[tuple[str, list[str]]], Optional[np.ndarray]]:
+        """修正库先于各级答案缓存查询：规范化问题精确命中 → 问题向量相似命中，返回 (修正答案, 问题向量)。
+
+        其他进程新增的修正按 CORRECTIONS_REFRESH_INTERVAL 在线程中增量加载，查找本身只读内存。
+        库中有问题向量时才向量化问题，向量交给后续语义缓存与写缓存复用。
+        """
+        if self.corrections.refresh_due(settings.CORRECTIONS_REFRESH_INTERVAL):
+            await asyncio.to_thread(self.corrections.refresh)
+        correction = self.corrections.lookup(question)
+        if correction is not None:
+            return self._corrected(correction, "exact"), None
+        if not self.corrections.has_vectors:
+            return None, None
+        vector = await within("embed", self._embed_question(question))
+        if vector is not None:
+            correction = self.corrections.lookup_similar(vector)
+            if correction is not None:
+                return self._corrected(correction, "similar"), vector
+        return None, vector
 
     async def answer(self, question: str) -> tuple[str, list[str]]:
-        """检索 → 生成答案，无结果返回固定文案；缓存 5 min"""
+        """修正库 → 检索 → 生成答案，无结果返回固定文案；相似问题走语义缓存。
+
+        精确缓存保存 ANSWER_CACHE_TTL（默认 6 h），并登记来源文档：文档入库或删除时只失效引用它的答案。
+
+        修正库（精确或相近问题）命中时不经过缓存、向量库与大模型（US-Alpha-06）。
+        规范化后相同的并发问题在进程内合并为一次计算，跨副本由 Redis 租约保证只有一个副本计算。
+        各阶段受请求截止时间（core.deadline）约束：大模型来不及生成时抛出带检索原文的 DeadlineExceeded，
+        更早的阶段超时则不带降级结果；大模型熔断或重试耗尽时抛出带检索原文的 LLMUnavailableError。
+        """
+        corrected, vector = await self._correction(question)
+        if corrected is not None:
+            return corrected
+        result, _ = await self.flight.do(normalize_text(question), lambda: self._answer(question, vector))
+        return result
+
+    async def _cached(self, cache_key: str) -> Optional[dict]:
+        try:
+            return await within("cache", self.cache.get(cache_key))
+        except DeadlineExceeded:
+            return None  # 按未命中处理，后续阶段仍受截止时间约束
+
+    async def _answer(self, question: str, vector: Optional[np.ndarray] = None) -> tuple[str, list[str]]:
         t0 = time.time()
         logger.info(f"开始问答", extra={"user": "anonymous", "question": question})
         # 缓存 key
-        cache_key = f"q:{question.strip()}"
-        cached = self.cache.get(cache_key)
+        cache_key = f"q:{normalize_text(question)}"
+        cached = await self._cached(cache_key)
         if cached:
+            llm_calls_avoided.labels(cache="exact").inc()
             logger.info("缓存命中", extra={"user": "anonymous", "cost": time.time() - t0})
             return cached["answer"], cached["sources"]
 
-        results = await self.db.similarity_search(question, top_k=5)
-        if not results:
-            logger.info("无结果", extra={"user": "anonymous", "cost": time.time() - t0})
-            return "知识库中暂无相关记录", []
+        lease_key = f"lease:{cache_key}"
+        token = await self.cache.acquire(lease_key, settings.ASK_LEASE_TTL)
+        if token is None:
+            cached = await within("lease_wait", self._wait_remote(cache_key, lease_key))
+            if cached:
+                coalesced_requests.labels(scope="remote").inc()
+                llm_calls_avoided.labels(cache="exact").inc()
+                logger.info("复用其他副本的答案", extra={"user": "anonymous", "cost": time.time() - t0})
+                return cached["answer"], cached["sources"]
+        try:
+            return await self._generate(question, cache_key, t0, vector)
+        finally:
+            if token is not None:
+                await self.cache.release(lease_key, token)
 
-        context = "\n".join(r.text for r in results)
-        sources = [r.source for r in results]
+    async def _reuse(self, question: str, vector: Optional[np.ndarray]) -> Optional[tuple[str, list[str]]]:
+        """相近问题的语义缓存答案。"""
+        hit = await self._semantic_lookup(question, vector)
+        if hit is not None:
+            llm_calls_avoided.labels(cache="semantic").inc()
+            return hit.answer, hit.sources
+        return None
 
+    async def _retrieve(self, question: str) -> Optional[_Retrieval]:
+        """检索并组装上下文；无结果返回 None。"""
+        results = await within("retrieval", self.db.similarity_search(question, top_k=settings.CONTEXT_TOP_K))
+        if not results:
+            return None
+        # 去重、截断低分结果并按 token 预算装箱，来源与上下文编号一一对应
+        context, results = self.context.build(results)
+        # 生成答案前记录来源版本：生成期间文档若被更新，写缓存后的核对与语义缓存命中时都会判为过期
+        filenames = sorted({r.metadata["filename"] for r in results if r.metadata.get("filename")})
+        versions = await within("retrieval", self.db.document_versions(filenames))
         system = self.prompt.render({"context": context, "question": question})
-        answer = await self.llm.chat(system=system, user="请回答上述问题。")
-        # 写入缓存
-        self.cache.set(cache_key, {"answer": answer, "sources": sources})
+        return _Retrieval(system, results, [r.source for r in results], filenames, versions)
+
+    async def _store(
+        self, question: str, cache_key: str, vector: Optional[np.ndarray], answer: str, retrieval: _Retrieval
+    ) -> None:
+        """写入精确缓存与语义缓存。"""
+        filenames, versions = retrieval.filenames, retrieval.versions
+        # 登记来源文档，文档入库/删除时只失效受影响的答案，因此有效期可设为数小时
+        cached = {
+            "answer": answer,
+            "sources": retrieval.sources,
+            "chunks": [r.id for r in retrieval.results if r.id],
+            "versions": {name: v[1] if v else None for name, v in versions.items()},
+        }
+        await self.cache.set(cache_key, cached, ttl=settings.ANSWER_CACHE_TTL if filenames else None, documents=filenames)
+        if filenames and await self.db.document_versions(filenames) != versions:
+            # 来源在生成期间被更新，且其失效发生在登记依赖之前：答案作废
+            await self.cache.delete(cache_key)
+        elif self.semantic is not None and vector is not None:
+            self.semantic.put(vector, CachedAnswer(question, answer, retrieval.sources, versions))
+
+    async def _generate(
+        self, question: str, cache_key: str, t0: float, vector: Optional[np.ndarray] = None
+    ) -> tuple[str, list[str]]:
+        """语义缓存 → 检索 → 大模型生成，结果写入精确缓存与语义缓存。"""
+        if vector is None:
+            vector = await within("embed", self._embed_question(question))
+        reused = await self._reuse(question, vector)
+        if reused is not None:
+            return reused
+        retrieval = await self._retrieve(question)
+        if retrieval is None:
+            logger.info("无结果", extra={"user": "anonymous", "cost": time.time() - t0})
+            return NO_RESULT, []
+
+        try:
+            answer = await within(
+                "llm",
+                self.llm.chat(system=retrieval.system, user=LLM_USER_PROMPT),
+                min_left=settings.ASK_LLM_MIN_SECONDS,
+            )
+        except DeadlineExceeded:
+            # 降级答案不写缓存，下次提问重新生成
+            degraded_answers.labels(reason="deadline").inc()
+            logger.warning("大模型超出截止时间，返回检索原文", extra={"user": "anonymous", "cost": time.time() - t0})
+            raise DeadlineExceeded("llm", partial=self._degraded(retrieval.results)) from None
+        except LLMUnavailableError as e:
+            # 熔断或重试耗尽：同样以检索原文降级，不等待上游恢复
+            degraded_answers.labels(reason="unavailable").inc()
+            logger.warning(f"大模型不可用，返回检索原文: {e}", extra={"user": "anonymous", "cost": time.time() - t0})
+            e.partial = self._degraded(retrieval.results)
+            raise
+        await self._store(question, cache_key, vector, answer, retrieval)
         logger.info("完成问答", extra={"user": "anonymous", "cost": time.time() - t0})
-        return answer, sources
\ No newline at end of file
+        return answer, retrieval.sources
+
+    async def open_stream(self, question: str) -> tuple[list[str], AsyncIterator[str]]:
+        """流式问答：返回 (来源, 答案片段迭代器)。
+
+        来源在调用大模型前即确定；修正库、缓存命中时迭代器一次产出完整答案。
+        检索等前置阶段受请求截止时间约束，生成阶段不受（用户已能看到进度）。
+        流式请求不做请求合并；迭代器正常结束后写入答案缓存，中途关闭（客户端断开）则取消上游请求、不写缓存。
+        """
+        t0 = time.time()
+        logger.info(f"开始流式问答", extra={"user": "anonymous", "question": question})
+        corrected, vector = await self._correction(question)
+        if corrected is not None:
+            return corrected[1], _once(corrected[0])
+        cache_key = f"q:{normalize_text(question)}"
+        cached = await self._cached(cache_key)
+        if cached:
+            llm_calls_avoided.labels(cache="exact").inc()
+            return cached["sources"], _once(cached["answer"])
+        if vector is None:
+            vector = await within("embed", self._embed_question(question))
+        reused = await self._reuse(question, vector)
+        if reused is not None:
+            return reused[1], _once(reused[0])
+        retrieval = await self._retrieve(question)
+        if retrieval is None:
+            return [], _once(NO_RESULT)
+        return retrieval.sources, self._stream(question, cache_key, vector, retrieval, t0)
+
+    async def _stream(
+        self, question: str, cache_key: str, vector: Optional[np.ndarray], retrieval: _Retrieval, t0: float
+    ) -> AsyncIterator[str]:
+        pieces: List[str] = []
+        first = None
+        # 显式关闭上游流：本迭代器被提前关闭时立即断开大模型请求，不等垃圾回收
+        async with aclosing(self.llm.chat_stream(system=retrieval.system, user=LLM_USER_PROMPT)) as stream:
+            async for piece in stream:
+                if first is None:
+                    first = time.time()
+                    llm_ttft.observe(first - t0)
+                pieces.append(piece)
+                yield piece
+        answer = "".join(pieces)
+        if first is not None:
+            elapsed = time.time() - first
+            if elapsed > 0:
+                llm_tokens_per_second.observe(count_tokens(answer) / elapsed)
+        await self._store(question, cache_key, vector, answer, retrieval)
+        logger.info("完成流式问答", extra={"user": "anonymous", "cost": time.time() - t0})
+
+
+async def _once(text: str) -> AsyncIterator[str]:
+    yield text
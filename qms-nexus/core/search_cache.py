@@ -0,0 +1,111 @@
+"""
+检索结果缓存：键为（collection, 索引代数, 检索参数, 规范化查询），条目存在进程内 LRU。
+索引代数是每个 collection 在 Redis 中的计数器，写入/删除/改标签/清空后 INCR，
+API 与 worker 进程共享；代数变化后旧条目不再命中，随 LRU 淘汰。
+Redis 不可用时不读也不写缓存（直接检索），退避一段时间后再重试，保证不返回过期结果。
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from core.config import settings
+from core.embedding_cache import normalize_text
+from core.logger import get_logger
+from core.metrics import search_cache_requests, search_cache_saved_seconds
+
+logger = get_logger(__name__)
+
+_GEN_KEY = "qms:search_gen:{}"
+_RETRY_AFTER = 5.0  # Redis 失败后的退避秒数
+normalize_query = normalize_text  # 全半角/空白差异的查询共用缓存条目
+
+
+class SearchCache:
+    """进程内检索结果 LRU，按 Redis 中的索引代数失效。"""
+
+    def __init__(self, max_entries: int = 2048, redis_client: Optional[Any] = None):
+        self.max_entries = max_entries
+        self._redis = redis_client
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+
+    def _client(self):
+        if self._redis is None:
+            self._redis = aioredis.from_url(settings.REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return self._redis
+
+    def _failed(self, op: str, e: Exception) -> None:
+        if time.monotonic() >= self._down_until:
+            logger.warning(f"检索缓存 Redis {op} 失败，{_RETRY_AFTER:.0f}s 内跳过缓存: {e}")
+        self._down_until = time.monotonic() + _RETRY_AFTER
+
+    async def generation(self, collection: str) -> Optional[int]:
+        """当前索引代数；Redis 不可用时返回 None，调用方应绕过缓存。"""
+        if time.monotonic() < self._down_until:
+            return None
+        try:
+            value = await self._client().get(_GEN_KEY.format(collection))
+        except Exception as e:
+            self._failed("读取", e)
+            return None
+        return int(value or 0)
+
+    async def bump(self, collection: str) -> None:
+        """索引变更后递增代数，所有进程中该 collection 的旧条目随之失效。"""
+        # 本进程的旧条目直接丢弃，不必等 LRU 淘汰
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == collection]:
+                del self._entries[key]
+        try:
+            await self._client().incr(_GEN_KEY.format(collection))
+        except Exception as e:
+            # 失败时其他进程可能读到旧代数：退避期内本进程不用缓存，其他进程的条目至多存活到其 LRU 淘汰
+            self._failed("递增", e)
+
+    def get_many(self, keys: List[Hashable]) -> List[Optional[Any]]:
+        found = []
+        saved = 0.0
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    saved += entry[1]
+                    found.append(entry[0])
+                else:
+                    found.append(None)
+        hits = sum(v is not None for v in found)
+        search_cache_requests.labels(result="hit").inc(hits)
+        search_cache_requests.labels(result="miss").inc(len(keys) - hits)
+        search_cache_saved_seconds.inc(saved)
+        return found
+
+    def put_many(self, keys: List[Hashable], values: List[Any], cost: float) -> None:
+        """cost 为这批检索的总耗时，均摊到每条作为命中时节省的时间。"""
+        each = cost / max(len(keys), 1)
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._entries[key] = (value, each)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_default: Optional[SearchCache] = None
+_default_lock = threading.Lock()
+
+
+def get_search_cache() -> Optional[SearchCache]:
+    """进程级共享检索缓存；SEARCH_CACHE_MAX_ENTRIES 为 0 时禁用。"""
+    global _default
+    if settings.SEARCH_CACHE_MAX_ENTRIES <= 0:
+        return None
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = SearchCache(settings.SEARCH_CACHE_MAX_ENTRIES)
+    return _default
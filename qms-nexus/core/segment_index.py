@@ -0,0 +1,185 @@
+"""
+追加式段文件持久化基类：增删先进内存，commit() 写一个 zlib 压缩段；
+启动与 refresh() 时按序回放未应用的段，段过多时合并为一个基准段。
+多个进程（API / worker）可共用同一目录，各自增量加载对方写入的段；
+写段与合并在目录下 writer.lock 跨进程文件锁内进行，合并删除旧段时不会删掉其他进程刚写入、尚未并入基准段的段。
+"""
+import json
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from core.file_lock import FileLock
+
+
+class SegmentedIndex:
+    """子类实现 _reset / _apply_add / _apply_del / _live_items 即可获得持久化能力。"""
+
+    SEGMENT_SUFFIX = ".seg"
+
+    def __init__(self, path: Optional[str] = None, max_segments: int = 32):
+        self.path = Path(path) if path else None
+        self.max_segments = max_segments
+        self._pending_add: Dict[str, Any] = {}
+        self._pending_del: Set[str] = set()
+        self._applied: Set[int] = set()
+        self._refreshed_at = float("-inf")
+        self._lock = threading.RLock()
+        self._writer_lock = FileLock(self.path / "writer.lock") if self.path else None
+
+    def _open(self) -> None:
+        """子类完成内存结构初始化后调用，加载已有段。"""
+        if self.path:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self.refresh()
+
+    # -------- 子类实现 --------
+    def _reset(self) -> None:
+        raise NotImplementedError
+
+    def _apply_add(self, doc_id: str, value: Any) -> None:
+        raise NotImplementedError
+
+    def _apply_del(self, doc_id: str) -> None:
+        raise NotImplementedError
+
+    def _live_items(self) -> Iterable[Tuple[str, Any]]:
+        raise NotImplementedError
+
+    def _on_clear(self) -> None:
+        """索引被清空（本进程 clear() 或回放到其他进程的清空段）时调用；合并段不触发。"""
+
+    def _apply_batch(self, adds: List[Tuple[str, Any]], dels: List[str]) -> None:
+        """回放一个段；子类可覆盖为批量实现。"""
+        for doc_id in dels:
+            self._apply_del(doc_id)
+        for doc_id, value in adds:
+            self._apply_add(doc_id, value)
+
+    # -------- 记录变更 --------
+    def _record_add(self, doc_id: str, value: Any) -> None:
+        self._pending_add[doc_id] = value
+        self._pending_del.discard(doc_id)
+
+    def _record_del(self, doc_id: str) -> None:
+        self._pending_add.pop(doc_id, None)
+        self._pending_del.add(doc_id)
+
+    def clear(self) -> None:
+        """清空索引；落盘时写一个空基准段，其他进程 refresh 时据此重置。"""
+        with self._lock:
+            self._reset()
+            self._on_clear()
+            self._pending_add.clear()
+            self._pending_del.clear()
+            if self.path:
+                with self._writing():
+                    self._write_segment({"base": True, "clear": True, "add": [], "del": []})
+                    self._drop_older_segments()
+
+    # -------- 段文件 --------
+    def _segments(self) -> List[Tuple[int, Path]]:
+        segs = []
+        for p in self.path.glob(f"*{self.SEGMENT_SUFFIX}"):
+            try:
+                segs.append((int(p.stem), p))
+            except ValueError:
+                continue
+        return sorted(segs)
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """写段期间持有进程内锁与跨进程写锁；不可重入，嵌套调用只在最外层获取。"""
+        with self._lock, self._writer_lock or nullcontext():
+            yield
+
+    def _write_segment(self, payload: dict) -> int:
+        """调用方需持有 _writing()。"""
+        data = zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        segs = self._segments()
+        seq = (segs[-1][0] + 1) if segs else 1
+        tmp = self.path / f".{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp.write_bytes(data)
+        while True:
+            target = self.path / f"{seq:010d}{self.SEGMENT_SUFFIX}"
+            try:
+                # 多进程并发写段时用硬链接原子占位，序号冲突则顺延
+                os.link(tmp, target)
+                break
+            except FileExistsError:
+                seq += 1
+        tmp.unlink()
+        self._applied.add(seq)
+        return seq
+
+    def commit(self) -> None:
+        """把自上次 commit 以来的增删写为一个新段。"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._pending_add and not self._pending_del:
+                return
+            payload = {
+                "add": [[doc_id, value] for doc_id, value in self._pending_add.items()],
+                "del": sorted(self._pending_del),
+            }
+            self._pending_add = {}
+            self._pending_del = set()
+            with self._writing():
+                self._write_segment(payload)
+                if len(self._segments()) > self.max_segments:
+                    self._compact()
+
+    def compact(self) -> None:
+        """把全部存活条目写为一个基准段并删除旧段。"""
+        if not self.path:
+            return
+        with self._writing():
+            self._compact()
+
+    def _compact(self) -> None:
+        # 持锁期间其他进程无法写段：refresh 读到的即全部已提交的段，删除的旧段都已并入基准段
+        self.refresh()
+        payload = {"base": True, "add": [[d, v] for d, v in self._live_items()], "del": []}
+        self._write_segment(payload)
+        self._drop_older_segments()
+
+    def _drop_older_segments(self) -> None:
+        latest = max(self._applied) if self._applied else 0
+        for seq, p in self._segments():
+            if seq < latest:
+                p.unlink(missing_ok=True)
+                self._applied.discard(seq)
+
+    def maybe_refresh(self, interval: float) -> int:
+        """距上次 refresh 不足 interval 秒时直接返回 0，供热路径使用，避免每次都扫描段目录。"""
+        if time.monotonic() - self._refreshed_at < interval:
+            return 0
+        return self.refresh()
+
+    def refresh(self) -> int:
+        """加载尚未应用的段（含其他进程写入的），返回新应用的段数。"""
+        if not self.path:
+            return 0
+        with self._lock:
+            self._refreshed_at = time.monotonic()
+            applied = 0
+            for seq, p in self._segments():
+                if seq in self._applied:
+                    continue
+                try:
+                    payload = json.loads(zlib.decompress(p.read_bytes()))
+                except FileNotFoundError:
+                    continue  # 已被其他进程合并删除，其基准段会在后面出现
+                if payload.get("base"):
+                    self._reset()
+                if payload.get("clear"):
+                    self._on_clear()
+                self._apply_batch([(d, v) for d, v in payload.get("add", [])], payload.get("del", []))
+                self._applied.add(seq)
+                applied += 1
+            return applied
@@ -0,0 +1,95 @@
+"""
+语义答案缓存：已回答问题的向量存于进程内小矩阵，新问题与某条缓存问题的余弦相似度
+不低于阈值、且该答案引用的文档版本未变化时，直接返回缓存答案，省去检索与大模型调用。
+容量满后按最近命中时间淘汰，条目超过 TTL 失效。
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.metrics import semantic_cache_requests, semantic_cache_similarity
+
+Versions = Dict[str, Optional[tuple]]  # filename -> 文档版本，None 为已删除
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    sources: List[str]
+    versions: Versions
+    created: float = field(default_factory=time.monotonic)
+
+
+class SemanticAnswerCache:
+    """按问题向量相似度查找缓存答案；线程安全。"""
+
+    def __init__(self, dim: int, max_entries: int = 1000, threshold: float = 0.92, ttl: float = 86400):
+        self.dim = dim
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self._vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self._entries: List[Optional[CachedAnswer]] = [None] * max_entries
+        self._last_used = np.zeros(max_entries, dtype=np.float64)  # 0 为空槽位
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return int((self._last_used > 0).sum())
+
+    @staticmethod
+    def _unit(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        return vector / (np.linalg.norm(vector) + 1e-12)
+
+    def lookup(self, vector: np.ndarray) -> Optional[Tuple[int, CachedAnswer, float]]:
+        """最相似的未过期条目 (槽位, 条目, 相似度)；低于阈值返回 None。来源版本由调用方校验。"""
+        q = self._unit(vector)
+        with self._lock:
+            live = self._last_used > 0
+            if not live.any():
+                semantic_cache_requests.labels(result="miss").inc()
+                return None
+            sims = np.where(live, self._vectors @ q, -np.inf)
+            slot = int(sims.argmax())
+            entry, sim = self._entries[slot], float(sims[slot])
+            semantic_cache_similarity.observe(sim)
+            if time.monotonic() - entry.created > self.ttl:
+                self._drop(slot)
+                semantic_cache_requests.labels(result="expired").inc()
+                return None
+            if sim < self.threshold:
+                semantic_cache_requests.labels(result="miss").inc()
+                return None
+            self._last_used[slot] = time.monotonic()
+            return slot, entry, sim
+
+    def discard(self, slot: int, entry: CachedAnswer) -> None:
+        """来源文档已更新或删除：丢弃该条目（槽位已被复用时不动）。"""
+        with self._lock:
+            if self._entries[slot] is entry:
+                self._drop(slot)
+        semantic_cache_requests.labels(result="stale").inc()
+
+    def put(self, vector: np.ndarray, entry: CachedAnswer) -> None:
+        q = self._unit(vector)
+        with self._lock:
+            live = self._last_used > 0
+            # 与已有条目几乎相同的问题覆盖原槽位，否则占空槽位或淘汰最久未命中的
+            if live.any():
+                sims = np.where(live, self._vectors @ q, -np.inf)
+                slot = int(sims.argmax())
+                if sims[slot] < 0.999:
+                    slot = int(self._last_used.argmin())
+            else:
+                slot = 0
+            self._vectors[slot] = q
+            self._entries[slot] = entry
+            self._last_used[slot] = time.monotonic()
+
+    def _drop(self, slot: int) -> None:
+        self._entries[slot] = None
+        self._last_used[slot] = 0
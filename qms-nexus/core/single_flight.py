@@ -0,0 +1,29 @@
+"""
+请求合并（single-flight）：同一 key 的并发调用只执行一次，其余调用等待同一结果。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from core.deadline import within
+from core.metrics import coalesced_requests
+
+
+class SingleFlight:
+    """进程内请求合并；执行体在独立任务中运行，首个调用方被取消不影响其他等待者。"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """返回 (结果, 是否复用了进行中的调用)；执行体的异常同样传给所有等待者。"""
+        task = self._inflight.get(key)
+        if task is not None:
+            coalesced_requests.labels(scope="local").inc()
+            # 执行体受首个调用方的截止时间约束，等待者另按自己的截止时间等待
+            return await within("coalesce", asyncio.shield(task)), True
+        task = self._inflight[key] = asyncio.ensure_future(fn())
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task), False
@@ -0,0 +1,219 @@
+"""
+标签位图索引：tag → chunk 序号的 Roaring 位图，随写入/删除/改标签增量维护。
+支持 AND / OR / NOT 与括号组成的标签表达式，结果作为向量检索的预过滤集合。
+chunk id ↔ 序号映射仅在进程内有效，持久化的是各 chunk 的标签（段文件）。
+"""
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from core.bitmap import RoaringBitmap
+from core.segment_index import SegmentedIndex
+
+_EXPR_TOKEN = re.compile(r'\(|\)|"[^"]*"|[^\s()"]+')
+_KEYWORDS = {"AND", "OR", "NOT"}
+
+
+# -------- 表达式解析 --------
+def parse_tag_expr(expr: str) -> tuple:
+    """解析标签表达式为语法树；优先级 NOT > AND > OR，含空格的标签用双引号。
+
+    例：'设计文档 AND (风险分析 OR CAPA) AND NOT 作废'
+    """
+    tokens = _EXPR_TOKEN.findall(expr)
+    pos = 0
+
+    def peek() -> Optional[str]:
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take() -> str:
+        nonlocal pos
+        tok = peek()
+        if tok is None:
+            raise ValueError(f"标签表达式不完整: {expr}")
+        pos += 1
+        return tok
+
+    def parse_or():
+        node = parse_and()
+        while (peek() or "").upper() == "OR":
+            take()
+            node = ("or", node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_not()
+        while (peek() or "").upper() == "AND":
+            take()
+            node = ("and", node, parse_not())
+        return node
+
+    def parse_not():
+        if (peek() or "").upper() == "NOT":
+            take()
+            return ("not", parse_not())
+        return parse_atom()
+
+    def parse_atom():
+        tok = take()
+        if tok == "(":
+            node = parse_or()
+            if take() != ")":
+                raise ValueError(f"标签表达式括号不匹配: {expr}")
+            return node
+        if tok == ")" or tok.upper() in _KEYWORDS:
+            raise ValueError(f"标签表达式语法错误: {expr}")
+        return ("tag", tok[1:-1] if tok.startswith('"') else tok)
+
+    if not tokens:
+        raise ValueError("标签表达式为空")
+    tree = parse_or()
+    if peek() is not None:
+        raise ValueError(f"标签表达式语法错误: {expr}")
+    return tree
+
+
+def tags_to_expr(tags: Sequence[str]) -> tuple:
+    """filter_tags 列表语义为“任一命中”，转为 OR 语法树。"""
+    node = ("tag", tags[0])
+    for tag in tags[1:]:
+        node = ("or", node, ("tag", tag))
+    return node
+
+
+class TagSelection:
+    """表达式求值结果：支持按 chunk id 判断成员与导出 id 列表。"""
+
+    def __init__(self, index: "TagIndex", bitmap: RoaringBitmap):
+        self._index = index
+        self.bitmap = bitmap
+
+    def __len__(self) -> int:
+        return len(self.bitmap)
+
+    def __contains__(self, doc_id: str) -> bool:
+        ordinal = self._index._ord.get(doc_id)
+        return ordinal is not None and ordinal in self.bitmap
+
+    def ids(self) -> List[str]:
+        names = self._index._ids
+        return [names[o] for o in self.bitmap.to_array().tolist()]
+
+
+class TagIndex(SegmentedIndex):
+    """标签倒排位图；set_tags/remove 先进内存，commit() 落一个段文件。"""
+
+    def __init__(self, path: Optional[str] = None, max_segments: int = 32):
+        super().__init__(path, max_segments)
+        self._ord: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._doc_tags: Dict[str, Tuple[str, ...]] = {}
+        self._bitmaps: Dict[str, RoaringBitmap] = {}
+        self._alive = RoaringBitmap()
+        self._open()
+
+    def __len__(self) -> int:
+        return len(self._doc_tags)
+
+    # -------- 内存结构 --------
+    def _reset(self) -> None:
+        self._ord.clear()
+        self._ids.clear()
+        self._doc_tags.clear()
+        self._bitmaps.clear()
+        self._alive = RoaringBitmap()
+
+    def _apply_add(self, doc_id: str, tags: List[str]) -> None:
+        self._apply_batch([(doc_id, tags)], [])
+
+    def _apply_del(self, doc_id: str) -> None:
+        self._apply_batch([], [doc_id])
+
+    def _live_items(self):
+        return ((doc_id, list(tags)) for doc_id, tags in self._doc_tags.items())
+
+    def _apply_batch(self, adds: List[Tuple[str, List[str]]], dels: List[str]) -> None:
+        """批量更新：按标签聚合序号后整体并入/移出位图，避免逐条操作。"""
+        removed: Dict[str, List[int]] = defaultdict(list)
+        dead: List[int] = []
+        for doc_id in list(dels) + [doc_id for doc_id, _ in adds]:
+            old = self._doc_tags.pop(doc_id, None)
+            if old is None:
+                continue
+            ordinal = self._ord[doc_id]
+            for tag in old:
+                removed[tag].append(ordinal)
+        for doc_id in dels:
+            ordinal = self._ord.pop(doc_id, None)
+            if ordinal is not None:
+                self._ids[ordinal] = None
+                dead.append(ordinal)
+        for tag, ords in removed.items():
+            bm = self._bitmaps.get(tag)
+            if bm is not None:
+                bm.discard_many(ords)
+                if not bm:
+                    del self._bitmaps[tag]
+        if dead:
+            self._alive.discard_many(dead)
+
+        added: Dict[str, List[int]] = defaultdict(list)
+        born: List[int] = []
+        for doc_id, tags in adds:
+            ordinal = self._ord.get(doc_id)
+            if ordinal is None:
+                ordinal = self._ord[doc_id] = len(self._ids)
+                self._ids.append(doc_id)
+                born.append(ordinal)
+            self._doc_tags[doc_id] = tuple(dict.fromkeys(tags))
+            for tag in self._doc_tags[doc_id]:
+                added[tag].append(ordinal)
+        for tag, ords in added.items():
+            self._bitmaps.setdefault(tag, RoaringBitmap()).add_many(ords)
+        if born:
+            self._alive.add_many(born)
+
+    # -------- 写入 --------
+    def set_tags(self, ids: Iterable[str], tags: Iterable[Sequence[str]]) -> None:
+        """新增 chunk 或覆盖其标签（改标签同样走这里）。"""
+        adds = [(doc_id, list(t or [])) for doc_id, t in zip(ids, tags)]
+        with self._lock:
+            self._apply_batch(adds, [])
+            for doc_id, t in adds:
+                self._record_add(doc_id, t)
+
+    def remove(self, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        with self._lock:
+            self._apply_batch([], ids)
+            for doc_id in ids:
+                self._record_del(doc_id)
+
+    # -------- 查询 --------
+    def tags_of(self, doc_id: str) -> List[str]:
+        return list(self._doc_tags.get(doc_id, ()))
+
+    def counts(self) -> Dict[str, int]:
+        """各标签命中的 chunk 数。"""
+        with self._lock:
+            return {tag: len(bm) for tag, bm in self._bitmaps.items()}
+
+    def _eval(self, node: tuple) -> RoaringBitmap:
+        op = node[0]
+        if op == "tag":
+            # 与空位图求并得到副本，后续写入不会改变已返回的结果
+            return RoaringBitmap() | self._bitmaps.get(node[1], RoaringBitmap())
+        if op == "and":
+            return self._eval(node[1]) & self._eval(node[2])
+        if op == "or":
+            return self._eval(node[1]) | self._eval(node[2])
+        return self._alive - self._eval(node[1])
+
+    def select(self, expr: Union[str, tuple, Sequence[str]]) -> TagSelection:
+        """按表达式字符串、语法树或标签列表（任一命中）求值。"""
+        if isinstance(expr, str):
+            expr = parse_tag_expr(expr)
+        elif not isinstance(expr, tuple):
+            expr = tags_to_expr(list(expr))
+        with self._lock:
+            return TagSelection(self, self._eval(expr))
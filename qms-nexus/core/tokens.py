@@ -0,0 +1,12 @@
+"""
+token 数估算：不依赖具体大模型的分词器，入库时写入 chunk 元数据，组装问答上下文时按预算装箱
+"""
+import re
+
+# 中日韩字符约 1 token/字，其余按约 4 字符/token 估算
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+def count_tokens(text: str) -> int:
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
@@ -1,64 +1,430 @@
 """
 ChromaDB 异步连接池封装，支持持久化与元数据过滤。
+同步的 Chroma 调用全部经 DBExecutor 派发到线程池，不阻塞事件循环。
+配置了本地向量模型时由 EmbeddingEngine 预先批量向量化，Chroma 只接收向量。
+BM25 倒排索引随写入/删除同步维护，mode="hybrid" 时与向量结果做 RRF 融合。
+标签过滤走标签位图索引：先求出命中的 chunk 集合，再在集合内做向量检索。
+文档注册表记录 filename → chunk id，按文件删除不扫描元数据；清空知识库为删除并重建 collection。
+各 collection 的侧索引按进程共享缓存（LRU，同一 persist_dir 的所有实例共用一份），search_collections 可并发检索多个 collection。
+VECTOR_STORE=int8/pq 时向量改存量化存储，Chroma 只保存正文与元数据。
+检索结果按索引代数缓存，写入/删除/改标签/清空后代数递增，旧结果不再返回；
+入库/删除/清空还会删除引用了相关文档的缓存答案。
 """
+import asyncio
+import math
 import os
+import re
+import threading
+import time
 import uuid
-from typing import List, Optional, Dict, Any
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
 import chromadb
 from chromadb.config import Settings
 from chromadb.api.models.Collection import Collection
 
+from core.bm25 import BM25Index, reciprocal_rank_fusion
+from core.cache import CacheClient, get_cache_client
 from core.models import Chunk, SearchResult, EmbeddingConfig
+from core.config import get_embedding_config, settings
+from core.db_executor import DBExecutor, get_executor
+from core.doc_registry import DocumentRegistry
+from core.embedding import EmbeddingEngine, get_embedding_engine
+from core.embedding_cache import CachedEmbeddingEngine, get_embedding_cache
+from core.logger import get_logger
+from core.metrics import answer_cache_invalidated, search_cache_requests, tag_prefilter_counter, upsert_batch_duration, upserted_chunks_counter
+from core.quantized_store import QuantizedVectorStore
+from core.search_cache import SearchCache, get_search_cache, normalize_query
+from core.tag_index import TagIndex, TagSelection, parse_tag_expr, tags_to_expr
+from core.tokens import count_tokens
+
+logger = get_logger(__name__)
+
+# Chroma 元数据不支持 list，标签以分隔符拼接为字符串存储
+TAG_SEP = ","
+# collection 名同时用作侧索引目录名：取 Chroma 命名规则的子集（不含点号），防止路径穿越
+_COLLECTION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{1,61}[A-Za-z0-9]$")
+# 启用量化存储时写入 Chroma 的 1 维占位向量，HNSW 几乎不占内存
+_PLACEHOLDER_EMBEDDING = [1.0]
+
+
+class _CollectionHandle:
+    """单个 collection 的侧索引（BM25 / 标签 / 文档注册表 / 量化向量）；pins > 0 时正在写入，不可淘汰。"""
+
+    def __init__(self, name: str, persist_dir: str, quant_dim: int = 0):
+        self.name = name
+        self.pins = 0
+        self.bm25 = BM25Index(os.path.join(persist_dir, "bm25", name)) if settings.BM25_ENABLED else None
+        self.tags = TagIndex(os.path.join(persist_dir, "tags", name))
+        self.registry = DocumentRegistry(os.path.join(persist_dir, "registry", name))
+        self.quant: Optional[QuantizedVectorStore] = None
+        if quant_dim:
+            self.quant = QuantizedVectorStore(
+                os.path.join(persist_dir, "quant", name),
+                quant_dim,
+                method=settings.VECTOR_STORE,
+                truncate_dim=settings.VECTOR_TRUNCATE_DIM,
+                pq_subspaces=settings.PQ_SUBSPACES,
+                train_size=settings.QUANT_TRAIN_SIZE,
+                rerank=settings.QUANT_RERANK,
+                nlist=settings.QUANT_NLIST,
+                nprobe=settings.QUANT_NPROBE,
+                vacuum_ratio=settings.QUANT_VACUUM_RATIO,
+            )
+
+
+class _HandleRegistry:
+    """进程级句柄表：API 各路由、RAG 服务等多个 VectorDBClient 实例共用同一份侧索引。
+
+    超出 VECTORDB_MAX_COLLECTIONS 时淘汰最久未用且未被占用的句柄（侧索引已落盘，再次打开时回放）；
+    写入中的句柄被占用，其未 commit 的变更不会随淘汰丢失。
+    """
+
+    def __init__(self):
+        self._handles: "OrderedDict[tuple, _CollectionHandle]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, persist_dir: str, name: str, quant_dim: int, pin: bool = False) -> _CollectionHandle:
+        key = (os.path.abspath(persist_dir), name, quant_dim)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                handle = self._handles[key] = _CollectionHandle(name, persist_dir, quant_dim)
+            else:
+                self._handles.move_to_end(key)
+            if pin:
+                handle.pins += 1
+            self._evict()
+            return handle
+
+    def unpin(self, handle: _CollectionHandle) -> None:
+        with self._lock:
+            handle.pins -= 1
+            self._evict()
+
+    def _evict(self) -> None:
+        excess = len(self._handles) - settings.VECTORDB_MAX_COLLECTIONS
+        if excess <= 0:
+            return
+        for key in [key for key, h in self._handles.items() if not h.pins][:excess]:
+            del self._handles[key]
+            logger.info(f"collection 句柄淘汰：{key[1]}")
+
+
+_handles = _HandleRegistry()
+
 
 class VectorDBClient:
     """线程安全的 ChromaDB 客户端，支持异步上下文。"""
 
-    def __init__(self, persist_dir: str = "./chroma_data", embedding_config: EmbeddingConfig = None):
+    def __init__(
+        self,
+        persist_dir: str = "./chroma_data",
+        embedding_config: EmbeddingConfig = None,
+        executor: DBExecutor = None,
+        embedder: Optional[EmbeddingEngine] = None,
+        search_cache: Optional[SearchCache] = None,
+        answer_cache: Optional[CacheClient] = None,
+    ):
         self.persist_dir = persist_dir
-        self.embedding_config = embedding_config or EmbeddingConfig()
+        self.embedding_config = embedding_config or get_embedding_config()
+        self.executor = executor or get_executor()
+        self.search_cache = search_cache or get_search_cache()
+        self.answer_cache = answer_cache or get_cache_client()
+        self.embedder = embedder
+        self._ingest_embedder = embedder
+        if self.embedder is None:
+            self.embedder = self._ingest_embedder = get_embedding_engine(self.embedding_config)
+            cache = get_embedding_cache(self.embedding_config.dim) if self.embedder else None
+            if cache is not None:
+                # 向量缓存只用于入库：查询文本几乎不重复，进缓存只会挤掉 chunk 向量
+                self._ingest_embedder = CachedEmbeddingEngine(self.embedder, cache)
+        # 量化存储依赖预计算向量，未配置本地模型时退回 Chroma
+        self._quant_dim = 0
+        if settings.VECTOR_STORE != "chroma":
+            if self.embedder is None:
+                logger.warning(f"VECTOR_STORE={settings.VECTOR_STORE} 需要本地向量模型，退回 Chroma 存储向量")
+            else:
+                self._quant_dim = self.embedding_config.dim
         self._client: Optional[chromadb.Client] = None
-        self._collection: Optional[Collection] = None
+        # Chroma collection 对象按实例缓存：{name: (注册表 epoch, collection)}
+        self._collections: Dict[str, Tuple[int, Collection]] = {}
+        self._collection_lock = threading.Lock()
+        self._backend_max_batch: Optional[int] = None
+        # 懒加载在线程池中发生，需加锁防止重复初始化
+        self._init_lock = threading.Lock()
 
     def _get_client(self) -> chromadb.Client:
         if self._client is None:
-            self._client = chromadb.Client(
-                Settings(
-                    persist_directory=self.persist_dir,
-                    anonymized_telemetry=False,
-                )
-            )
+            with self._init_lock:
+                if self._client is None:
+                    self._client = chromadb.Client(
+                        Settings(
+                            persist_directory=self.persist_dir,
+                            anonymized_telemetry=False,
+                        )
+                    )
         return self._client
 
-    def _get_collection(self, collection_name: str = "qms_docs") -> Collection:
-        if self._collection is None:
+    def _handle(self, collection_name: str, pin: bool = False) -> _CollectionHandle:
+        """按名从进程级句柄表取侧索引。"""
+        if not _COLLECTION_NAME.match(collection_name):
+            raise ValueError(f"非法的 collection 名: {collection_name}")
+        return _handles.get(self.persist_dir, collection_name, self._quant_dim, pin=pin)
+
+    @contextmanager
+    def _pinned(self, collection_name: str):
+        """写入期间占用句柄：从写批次到 commit 侧索引之间不会被 LRU 淘汰。"""
+        handle = self._handle(collection_name, pin=True)
+        try:
+            yield handle
+        finally:
+            _handles.unpin(handle)
+
+    def _get_collection(self, collection_name: str = "qms_docs", fresh: bool = False) -> Collection:
+        """fresh=True（写路径）时先完整加载注册表新段；检索路径按 VECTORDB_REFRESH_INTERVAL 限频。"""
+        handle = self._handle(collection_name)
+        # 其他实例/进程清空知识库后注册表 epoch 递增，旧句柄指向已删除的 collection，需重新获取
+        if fresh:
+            handle.registry.refresh()
+        else:
+            handle.registry.maybe_refresh(settings.VECTORDB_REFRESH_INTERVAL)
+        entry = self._collections.get(collection_name)
+        if entry is None or entry[0] != handle.registry.epoch:
             client = self._get_client()
-            self._collection = client.get_or_create_collection(
-                name=collection_name,
-                metadata={"hnsw:space": "cosine"},
+            with self._collection_lock:
+                entry = self._collections.get(collection_name)
+                if entry is None or entry[0] != handle.registry.epoch:
+                    epoch = handle.registry.epoch
+                    entry = (epoch, self._open_collection(client, collection_name, handle.quant is not None))
+                    self._collections[collection_name] = entry
+        return entry[1]
+
+    def _open_collection(self, client, collection_name: str, quantized: bool) -> Collection:
+        # get_or_create 会覆盖已有 collection 的 metadata，需分开取与建，才能保留建库时记录的向量维度
+        dim = self.embedding_config.dim if self.embedder is not None else None
+        try:
+            coll = client.get_collection(name=collection_name)
+        except ValueError:
+            metadata = {"hnsw:space": "cosine"}
+            if dim:
+                metadata["embedding_dim"] = dim
+            try:
+                return client.create_collection(name=collection_name, metadata=metadata)
+            except Exception:
+                # 并发创建：另一实例/进程已建好
+                coll = client.get_collection(name=collection_name)
+        if dim:
+            stored = (coll.metadata or {}).get("embedding_dim")
+            if stored is None and not quantized and coll.count():
+                # 旧 collection 未记录维度，抽一条向量确认（量化存储下 Chroma 中只有占位向量，无从判断）
+                stored = len(coll.peek(1)["embeddings"][0])
+            if stored is not None and int(stored) != dim:
+                raise ValueError(
+                    f"collection {collection_name} 的向量维度为 {stored}，与 embedding.dim={dim} 不一致；"
+                    f"切换向量模型后需清空并重建知识库，或将 embedding.dim 改回 {stored}"
+                )
+        return coll
+
+    def _get_bm25(self, collection_name: str = "qms_docs") -> Optional[BM25Index]:
+        return self._handle(collection_name).bm25
+
+    def _get_tag_index(self, collection_name: str = "qms_docs") -> TagIndex:
+        return self._handle(collection_name).tags
+
+    def _get_registry(self, collection_name: str = "qms_docs") -> DocumentRegistry:
+        return self._handle(collection_name).registry
+
+    @staticmethod
+    def _build_meta(c: Chunk) -> dict:
+        meta = {
+            "filename": c.metadata.get("filename"),
+            "page": c.page,
+            "table": c.table,
+            "n_tokens": count_tokens(c.text),  # 问答组装上下文时按 token 预算装箱
+            **c.metadata,
+        }
+        # 仅在有标签时写入，多个标签拼接为字符串
+        tags = meta.pop("tags", None)
+        if tags:
+            meta["tags"] = TAG_SEP.join(tags) if isinstance(tags, (list, tuple)) else tags
+        # Chroma 元数据值不允许为 None
+        return {k: v for k, v in meta.items() if v is not None}
+
+    @staticmethod
+    def _split_tags(value: Any) -> List[str]:
+        if not value:
+            return []
+        if isinstance(value, (list, tuple)):
+            return list(value)
+        return [t for t in str(value).split(TAG_SEP) if t]
+
+    async def _max_batch_size(self) -> int:
+        if self._backend_max_batch is None:
+            limit = await self.executor.read(
+                "max_batch_size", lambda: getattr(self._get_client(), "max_batch_size", 0)
             )
-        return self._collection
+            self._backend_max_batch = limit or settings.VECTORDB_UPSERT_BATCH
+        return self._backend_max_batch
 
-    async def upsert_chunks(self, chunks: List[Chunk], collection: str = "qms_docs") -> List[str]:
-        """批量写入或更新 chunks，返回 ids。"""
-        coll = self._get_collection(collection)
-        ids = [c.id or str(uuid.uuid4()) for c in chunks]
-        texts = [c.text for c in chunks]
-        def _build_meta(c: Chunk) -> dict:
-            meta = {
-                "filename": c.metadata.get("filename"),
-                "page": c.page,
-                "table": c.table,
-                **c.metadata,
-            }
-            # ChromaDB 不允许空 list，仅在有标签时写入
-            tags = c.metadata.get("tags")
-            if tags:
-                meta["tags"] = tags
-            return meta
+    @staticmethod
+    async def _iter_batches(
+        chunks: Union[Iterable[Chunk], AsyncIterable[Chunk]], size: int
+    ) -> AsyncIterator[List[Chunk]]:
+        batch: List[Chunk] = []
+        if hasattr(chunks, "__aiter__"):
+            async for c in chunks:
+                batch.append(c)
+                if len(batch) >= size:
+                    yield batch
+                    batch = []
+        else:
+            for c in chunks:
+                batch.append(c)
+                if len(batch) >= size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    async def upsert_chunks(
+        self,
+        chunks: Union[Iterable[Chunk], AsyncIterable[Chunk]],
+        collection: str = "qms_docs",
+        batch_size: Optional[int] = None,
+    ) -> List[str]:
+        """流式分批写入或更新 chunks，返回 ids。
+
+        接受列表、生成器或异步迭代器；第 N 批落库的同时向量化第 N+1 批，
+        批大小不超过后端 max_batch_size。
+        """
+        size = min(batch_size or settings.VECTORDB_UPSERT_BATCH, await self._max_batch_size())
+        all_ids: List[str] = []
+        filenames = set()
+        total = 0
+        t0 = time.perf_counter()
+        pending_write: Optional[asyncio.Future] = None
+        # 句柄从第一批写入到侧索引 commit 期间保持占用，不被 LRU 淘汰
+        with self._pinned(collection):
+            try:
+                async for batch in self._iter_batches(chunks, size):
+                    ids = [c.id or str(uuid.uuid4()) for c in batch]
+                    texts = [c.text for c in batch]
+                    metas = [self._build_meta(c) for c in batch]
+                    tag_lists = [self._split_tags(c.metadata.get("tags")) for c in batch]
+                    embeddings = None
+                    if self.embedder is not None:
+                        # 向量化是 CPU 密集操作，放在读线程池，与上一批的写入并行
+                        t_embed = time.perf_counter()
+                        embeddings = (await self.executor.read("embed", self._ingest_embedder.embed, texts)).tolist()
+                        upsert_batch_duration.labels(stage="embed").observe(time.perf_counter() - t_embed)
+                    if pending_write is not None:
+                        await pending_write
+                    pending_write = asyncio.ensure_future(
+                        self._write_batch(collection, ids, embeddings, texts, metas, tag_lists)
+                    )
+                    all_ids.extend(ids)
+                    filenames.update(m["filename"] for m in metas if "filename" in m)
+                    total += len(batch)
+                if pending_write is not None:
+                    await pending_write
+                    pending_write = None
+                if total and isinstance(self._ingest_embedder, CachedEmbeddingEngine):
+                    # 每次入库结束落盘一次，不在每个未命中批次上 msync 整个缓存文件
+                    await self.executor.read("embed", self._ingest_embedder.flush)
+                if total:
+                    await self.executor.write("index_commit", self._commit_indexes, collection, filenames)
+                    await self._invalidate(collection, filenames)
+            finally:
+                if pending_write is not None and not pending_write.done():
+                    pending_write.cancel()
+        if total:
+            cost = time.perf_counter() - t0
+            logger.info(f"写入 {total} 条 chunk，{total / cost:.1f} chunks/s", extra={"cost": cost})
+        return all_ids
 
-        metas = [_build_meta(c) for c in chunks]
-        coll.upsert(ids=ids, documents=texts, metadatas=metas)
-        return ids
+    async def _write_batch(
+        self,
+        collection: str,
+        ids: List[str],
+        embeddings: Optional[List[List[float]]],
+        texts: List[str],
+        metas: List[dict],
+        tag_lists: List[List[str]],
+    ) -> None:
+        def _upsert():
+            vectors = embeddings
+            quant = self._handle(collection).quant
+            if quant is not None:
+                quant.add(ids, np.asarray(embeddings, dtype=np.float32))
+                vectors = [_PLACEHOLDER_EMBEDDING] * len(ids)
+            self._get_collection(collection, fresh=True).upsert(
+                ids=ids, embeddings=vectors, documents=texts, metadatas=metas
+            )
+            bm25 = self._get_bm25(collection)
+            if bm25 is not None:
+                bm25.add(ids, texts)
+            self._get_tag_index(collection).set_tags(ids, tag_lists)
+            registry = self._get_registry(collection)
+            by_file: Dict[str, List[str]] = {}
+            for chunk_id, meta in zip(ids, metas):
+                if "filename" in meta:
+                    by_file.setdefault(meta["filename"], []).append(chunk_id)
+            for filename, file_ids in by_file.items():
+                registry.add_chunks(filename, file_ids)
+
+        t0 = time.perf_counter()
+        await self.executor.write("upsert", _upsert)
+        upsert_batch_duration.labels(stage="write").observe(time.perf_counter() - t0)
+        upserted_chunks_counter.inc(len(ids))
+
+    def _commit_indexes(self, collection: str, ingested: Iterable[str] = ()) -> None:
+        """侧索引落盘；ingested 为本次入库涉及的文件，递增其版本号。"""
+        bm25 = self._get_bm25(collection)
+        if bm25 is not None:
+            bm25.commit()
+        self._get_tag_index(collection).commit()
+        quant = self._handle(collection).quant
+        if quant is not None:
+            quant.commit()
+        registry = self._get_registry(collection)
+        registry.bump(ingested)
+        registry.commit()
+
+    async def _invalidate(self, collection: str, documents: Iterable[str] = ()) -> None:
+        """索引已变更：递增索引代数，各进程缓存的检索结果随之失效；documents 有变更时删除引用它们的缓存答案。"""
+        if self.search_cache is not None:
+            await self.search_cache.bump(collection)
+        documents = list(documents)
+        if not documents:
+            return
+        try:
+            n = await self.answer_cache.invalidate_documents(documents)
+        except Exception as e:
+            # 答案缓存不可用不影响入库；RAGService 写缓存后会再核对来源版本
+            logger.warning(f"答案缓存失效失败: {e}")
+            return
+        answer_cache_invalidated.inc(n)
+        if n:
+            logger.info(f"{len(documents)} 个文档变更，删除 {n} 条缓存答案")
+
+    @classmethod
+    def _to_results(
+        cls, ids: List[str], docs: List[str], metas: List[dict], distances: List[float]
+    ) -> List[SearchResult]:
+        return [
+            SearchResult(
+                id=chunk_id,
+                text=doc,
+                score=1 - score,  # cosine → 相似度
+                source=f"[来源：{meta.get('filename')}, 第{meta.get('page')}页]",
+                tags=cls._split_tags(meta.get("tags")),
+                metadata=meta,
+            )
+            for chunk_id, doc, meta, score in zip(ids, docs, metas, distances)
+        ]
 
     async def similarity_search(
         self,
@@ -66,49 +432,402 @@ class VectorDBClient:
         top_k: int = 5,
         filter_tags: Optional[List[str]] = None,
         collection: str = "qms_docs",
+        mode: str = "vector",
+        tag_expr: Optional[str] = None,
     ) -> List[SearchResult]:
-        """异步语义检索，支持标签过滤。"""
-        coll = self._get_collection(collection)
-        where = None
-        if filter_tags:
-            # 单标签直接字段过滤；多标签用 $or
-            if len(filter_tags) == 1:
-                where = {"tags": {"$contains": filter_tags[0]}}
-            else:
-                where = {"$or": [{"tags": {"$contains": tag}} for tag in filter_tags]}
-
-        res = coll.query(
-            query_texts=[query],
-            n_results=top_k,
-            where=where,
+        """异步语义检索，支持标签过滤；mode="hybrid" 时融合 BM25 词法检索。"""
+        results = await self.similarity_search_many(
+            [query], top_k=top_k, filter_tags=filter_tags, collection=collection, mode=mode, tag_expr=tag_expr
         )
-        results = []
-        for doc, meta, score in zip(
-            res["documents"][0], res["metadatas"][0], res["distances"][0]
-        ):
-            results.append(
-                SearchResult(
-                    text=doc,
-                    score=1 - score,  # cosine → 相似度
-                    source=f"[来源：{meta.get('filename')}, 第{meta.get('page')}页]",
-                    tags=meta.get("tags", []),
-                    metadata=meta,
+        return results[0]
+
+    async def search_collections(
+        self,
+        query: str,
+        collections: List[str],
+        top_k: int = 5,
+        filter_tags: Optional[List[str]] = None,
+        mode: str = "vector",
+        tag_expr: Optional[str] = None,
+    ) -> List[SearchResult]:
+        """并发检索多个 collection，按排序分（混合检索为 RRF 分）合并取全局 top_k；结果 metadata 带 collection 名。"""
+        names = list(dict.fromkeys(collections))
+        per_collection = await asyncio.gather(
+            *(
+                self.similarity_search(
+                    query, top_k=top_k, filter_tags=filter_tags, collection=name, mode=mode, tag_expr=tag_expr
                 )
+                for name in names
+            )
+        )
+        merged = [
+            r.model_copy(update={"metadata": {**r.metadata, "collection": name}})
+            for name, results in zip(names, per_collection)
+            for r in results
+        ]
+        merged.sort(key=lambda r: r.rank_score, reverse=True)
+        return merged[:top_k]
+
+    async def similarity_search_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filter_tags: Optional[List[str]] = None,
+        collection: str = "qms_docs",
+        mode: str = "vector",
+        tag_expr: Optional[str] = None,
+    ) -> List[List[SearchResult]]:
+        """批量语义检索：一次 coll.query 完成全部查询，按输入顺序返回各自结果。
+
+        filter_tags 为“任一命中”，tag_expr 支持 AND / OR / NOT，两者同时给出时取交集。
+        命中检索缓存的查询直接返回，其余查询仍合并为一次检索。
+        """
+        if not queries:
+            return []
+        if mode not in ("vector", "hybrid"):
+            raise ValueError(f"不支持的检索模式: {mode}")
+        cache = self.search_cache
+        generation = await cache.generation(collection) if cache is not None else None
+        if generation is None:
+            if cache is not None:
+                search_cache_requests.labels(result="bypass").inc(len(queries))
+            return await self._search_many(queries, top_k, filter_tags, collection, mode, tag_expr)
+
+        scope = (collection, self.persist_dir, generation, mode, top_k, tuple(sorted(filter_tags or ())), tag_expr or "")
+        keys = [scope + (normalize_query(q),) for q in queries]
+        results = cache.get_many(keys)
+        missed = [i for i, r in enumerate(results) if r is None]
+        if missed:
+            t0 = time.perf_counter()
+            fresh = await self._search_many(
+                [queries[i] for i in missed], top_k, filter_tags, collection, mode, tag_expr
             )
-        return results
+            cache.put_many([keys[i] for i in missed], fresh, time.perf_counter() - t0)
+            for i, r in zip(missed, fresh):
+                results[i] = r
+        # 缓存中的列表为共享对象，返回副本
+        return [list(r) for r in results]
+
+    async def _search_many(
+        self,
+        queries: List[str],
+        top_k: int,
+        filter_tags: Optional[List[str]],
+        collection: str,
+        mode: str,
+        tag_expr: Optional[str],
+    ) -> List[List[SearchResult]]:
+        hybrid = mode == "hybrid" and settings.BM25_ENABLED
+        n_results = max(top_k, settings.HYBRID_CANDIDATES) if hybrid else top_k
+
+        selection = await self._select_tags(collection, filter_tags, tag_expr)
+        if selection is not None and not len(selection):
+            tag_prefilter_counter.labels(strategy="empty").inc()
+            return [[] for _ in queries]
+        # 查询向量只算一次，向量检索与混合检索中词法命中的相似度计算共用
+        q = None
+        if self.embedder is not None:
+            q = await self.executor.read("embed", self.embedder.embed, list(queries))
+        if selection is not None and q is not None and len(selection) <= settings.TAG_PREFILTER_EXACT_MAX:
+            tag_prefilter_counter.labels(strategy="exact").inc()
+            res = await self.executor.read("query_exact", self._query_exact, collection, queries, q, selection, n_results)
+        else:
+            if selection is not None:
+                tag_prefilter_counter.labels(strategy="oversample").inc()
+            if self._handle(collection).quant is not None:
+                res = await self.executor.read("query_quant", self._query_quant, collection, queries, q, selection, n_results)
+            else:
+                res = await self.executor.read("query", self._query_ann, collection, queries, q, selection, n_results)
+        vector = [
+            self._to_results(ids, docs, metas, dists)
+            for ids, docs, metas, dists in zip(res["ids"], res["documents"], res["metadatas"], res["distances"])
+        ]
+        if not hybrid:
+            return vector
+        return await self._fuse_lexical(queries, q, vector, top_k, selection, collection)
+
+    async def _select_tags(
+        self, collection: str, filter_tags: Optional[List[str]], tag_expr: Optional[str]
+    ) -> Optional[TagSelection]:
+        """用标签位图索引求出命中的 chunk 集合；无标签条件时返回 None。"""
+        expr = None
+        if filter_tags:
+            expr = tags_to_expr(filter_tags)
+        if tag_expr:
+            parsed = parse_tag_expr(tag_expr)
+            expr = ("and", expr, parsed) if expr else parsed
+        if expr is None:
+            return None
+
+        def _select() -> TagSelection:
+            index = self._get_tag_index(collection)
+            index.refresh()  # 加载 worker 等其他进程新写入的段
+            return index.select(expr)
+
+        return await self.executor.read("tag_select", _select)
+
+    @staticmethod
+    def _fetch(coll: Collection, ids: List[str]) -> Dict[str, tuple]:
+        """回表取正文与元数据：{id: (document, metadata)}。"""
+        if not ids:
+            return {}
+        got = coll.get(ids=ids, include=["documents", "metadatas"])
+        return {doc_id: (doc, meta) for doc_id, doc, meta in zip(got["ids"], got["documents"], got["metadatas"])}
+
+    @staticmethod
+    def _ranked(queries: List[str], hits: List[List[tuple]], found: Dict[str, tuple]) -> Dict[str, List[list]]:
+        """[(id, 相似度)] 排序结果转为 coll.query 的返回结构；回表缺失的 id 跳过。"""
+        out: Dict[str, List[list]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for row in hits:
+            kept = [(doc_id, score) for doc_id, score in row if doc_id in found]
+            out["ids"].append([doc_id for doc_id, _ in kept])
+            out["documents"].append([found[doc_id][0] for doc_id, _ in kept])
+            out["metadatas"].append([found[doc_id][1] for doc_id, _ in kept])
+            out["distances"].append([1 - score for _, score in kept])
+        return out
+
+    def _fetch_with_vectors(self, collection: str, ids: List[str]) -> Tuple[List[str], np.ndarray, Dict[str, tuple]]:
+        """回表取向量（量化存储取全精度向量）、正文与元数据，返回 (ids, 向量矩阵, {id: (document, metadata)})。"""
+        coll = self._get_collection(collection)
+        quant = self._handle(collection).quant
+        if quant is not None:
+            quant.refresh()
+            found_ids, matrix = quant.get_vectors(ids)
+            return found_ids, matrix, self._fetch(coll, found_ids)
+        got = coll.get(ids=ids, include=["embeddings", "documents", "metadatas"])
+        found_ids = got["ids"]
+        matrix = np.asarray(got["embeddings"], dtype=np.float32).reshape(len(found_ids), -1)
+        return found_ids, matrix, {i: (doc, meta) for i, doc, meta in zip(found_ids, got["documents"], got["metadatas"])}
+
+    @staticmethod
+    def _cosine(q: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+        """查询 × 文档的余弦相似度矩阵。"""
+        q = np.asarray(q, dtype=np.float32)
+        q = q / (np.linalg.norm(q, axis=1, keepdims=True) + 1e-12)
+        matrix = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+        return q @ matrix.T
+
+    def _query_exact(
+        self, collection: str, queries: List[str], q: np.ndarray, selection: TagSelection, n_results: int
+    ) -> Dict[str, List[list]]:
+        """命中集合较小时取出其向量做精确余弦排序，不经过 HNSW。"""
+        ids, matrix, found = self._fetch_with_vectors(collection, selection.ids())
+        if not ids:
+            return self._ranked(queries, [[] for _ in queries], found)
+        sims = self._cosine(q, matrix)
+        k = min(n_results, len(ids))
+        hits = []
+        for row in sims:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            hits.append([(ids[i], float(row[i])) for i in top])
+        return self._ranked(queries, hits, found)
+
+    def _query_quant(
+        self, collection: str, queries: List[str], q: np.ndarray, selection: Optional[TagSelection], n_results: int
+    ) -> Dict[str, List[list]]:
+        """量化存储检索：压缩码近似召回、全精度重排，正文与元数据回表 Chroma。"""
+        quant = self._handle(collection).quant
+        quant.refresh()
+        hits = quant.search(q, n_results, accept=selection)
+        found = self._fetch(self._get_collection(collection), list({doc_id for row in hits for doc_id, _ in row}))
+        return self._ranked(queries, hits, found)
+
+    def _query_ann(
+        self, collection: str, queries: List[str], q: Optional[np.ndarray], selection: Optional[TagSelection], n_results: int
+    ) -> Dict[str, List[list]]:
+        """HNSW 检索；有标签集合时按其占比放大召回数后过滤，不足 n_results 再逐轮放大。"""
+        coll = self._get_collection(collection)
+        if q is not None:
+            kwargs = {"query_embeddings": np.asarray(q).tolist()}
+        else:
+            kwargs = {"query_texts": list(queries)}
+        if selection is None:
+            return coll.query(n_results=n_results, **kwargs)
+
+        total = coll.count()
+        if total == 0:
+            return {key: [[] for _ in queries] for key in ("ids", "documents", "metadatas", "distances")}
+        factor = settings.TAG_POSTFILTER_OVERSAMPLE
+        n = min(total, math.ceil(n_results * factor * total / max(len(selection), 1)))
+        while True:
+            res = coll.query(n_results=n, **kwargs)
+            out: Dict[str, List[list]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+            for row in zip(res["ids"], res["documents"], res["metadatas"], res["distances"]):
+                kept = [hit for hit in zip(*row) if hit[0] in selection][:n_results]
+                for key, values in zip(out, zip(*kept) if kept else ([], [], [], [])):
+                    out[key].append(list(values))
+            if n >= total or all(len(ids) >= n_results for ids in out["ids"]):
+                return out
+            n = min(total, n * factor)
+
+    async def _fuse_lexical(
+        self,
+        queries: List[str],
+        q: Optional[np.ndarray],
+        vector: List[List[SearchResult]],
+        top_k: int,
+        selection: Optional[TagSelection],
+        collection: str,
+    ) -> List[List[SearchResult]]:
+        """BM25 召回与向量召回做 RRF 融合，按融合分排序并记入 rrf_score；score 保持余弦相似度。
+
+        仅词法命中的 chunk 回表取正文与元数据，有查询向量时一并取向量算出真实相似度。
+        """
+        n_lexical = max(top_k, settings.HYBRID_CANDIDATES)
+
+        def _lexical():
+            bm25 = self._get_bm25(collection)
+            bm25.refresh()  # 加载 worker 等其他进程新写入的段
+            return [bm25.search(text, n_lexical, candidates=selection) for text in queries]
+
+        lexical = await self.executor.read("bm25", _lexical)
+        known = {r.id: r for hits in vector for r in hits}
+        cosine = [{r.id: r.score for r in hits} for hits in vector]
+        need = list({doc_id for sims, lex in zip(cosine, lexical) for doc_id, _ in lex if doc_id not in sims})
+        lexical_sims: Dict[str, np.ndarray] = {}
+        if need and q is not None:
+            ids, matrix, found = await self.executor.read("get", self._fetch_with_vectors, collection, need)
+            if ids:
+                sims = self._cosine(q, matrix)
+                lexical_sims = {doc_id: sims[:, j] for j, doc_id in enumerate(ids)}
+        elif need:
+            missing = [doc_id for doc_id in need if doc_id not in known]
+            found = await self.executor.read("get", lambda: self._fetch(self._get_collection(collection), missing))
+        else:
+            found = {}
+        for doc_id, (doc, meta) in found.items():
+            if doc_id not in known:
+                known[doc_id] = self._to_results([doc_id], [doc], [meta], [1.0])[0]
+
+        fused_results = []
+        for i, (hits, lex) in enumerate(zip(vector, lexical)):
+            rankings = [[r.id for r in hits], [doc_id for doc_id, _ in lex if doc_id in known]]
+            fused = []
+            for doc_id, rrf in reciprocal_rank_fusion(rankings)[:top_k]:
+                if doc_id in cosine[i]:
+                    score = cosine[i][doc_id]
+                else:
+                    # 无查询向量（Chroma 默认向量化）时相似度未知，记 0
+                    score = float(lexical_sims[doc_id][i]) if doc_id in lexical_sims else 0.0
+                fused.append(known[doc_id].model_copy(update={"score": score, "rrf_score": rrf}))
+            fused_results.append(fused)
+        return fused_results
+
+    async def update_tags(self, ids: List[str], tags: List[str], collection: str = "qms_docs") -> int:
+        """改标签：覆盖指定 chunk 的标签，同步 Chroma 元数据与标签索引，返回更新条数。"""
+        def _update() -> int:
+            with self._pinned(collection):
+                coll = self._get_collection(collection, fresh=True)
+                existing = coll.get(ids=list(ids), include=[])["ids"]
+                if not existing:
+                    return 0
+                # Chroma update 按键合并元数据，值为 None 表示删除该键
+                value = TAG_SEP.join(tags) if tags else None
+                coll.update(ids=existing, metadatas=[{"tags": value} for _ in existing])
+                index = self._get_tag_index(collection)
+                index.set_tags(existing, [tags] * len(existing))
+                index.commit()
+                return len(existing)
+
+        updated = await self.executor.write("update_tags", _update)
+        if updated:
+            await self._invalidate(collection)
+        return updated
 
     async def delete_by_filename(self, filename: str, collection: str = "qms_docs") -> int:
         """按文件名删除，返回删除条数。"""
-        coll = self._get_collection(collection)
-        existing = coll.get(where={"filename": filename})
-        if existing["ids"]:
-            coll.delete(ids=existing["ids"])
-        return len(existing["ids"])
+        deleted = await self.delete_by_filenames([filename], collection)
+        return deleted[filename]
+
+    async def delete_by_filenames(self, filenames: List[str], collection: str = "qms_docs") -> Dict[str, int]:
+        """批量按文件名删除，chunk id 取自文档注册表；返回 {filename: 删除条数}。"""
+        def _delete() -> Dict[str, int]:
+            with self._pinned(collection):
+                coll = self._get_collection(collection, fresh=True)
+                registry = self._get_registry(collection)
+                deleted: Dict[str, int] = {}
+                all_ids: List[str] = []
+                for filename in dict.fromkeys(filenames):
+                    ids = registry.ids(filename)
+                    if ids is None:
+                        # 注册表建立之前入库的文档退回元数据扫描
+                        ids = coll.get(where={"filename": filename}, include=[])["ids"]
+                    deleted[filename] = len(ids)
+                    all_ids.extend(ids)
+                if all_ids:
+                    coll.delete(ids=all_ids)
+                    bm25 = self._get_bm25(collection)
+                    if bm25 is not None:
+                        bm25.remove(all_ids)
+                    self._get_tag_index(collection).remove(all_ids)
+                    quant = self._handle(collection).quant
+                    if quant is not None:
+                        quant.remove(all_ids)
+                registry.remove(deleted)
+                self._commit_indexes(collection)
+                return deleted
+
+        # 查询与删除放在同一写任务内，避免中间被其他写入插队
+        deleted = await self.executor.write("delete", _delete)
+        if any(deleted.values()):
+            await self._invalidate(collection, [name for name, n in deleted.items() if n])
+        return deleted
+
+    async def clear_collection(self, collection: str = "qms_docs") -> None:
+        """清空知识库：删除并重建 collection，侧索引整体重置，耗时与数据量无关。"""
+        def _clear() -> List[str]:
+            with self._pinned(collection):
+                registry = self._get_registry(collection)
+                registry.refresh()
+                cleared = [name for name, _, _ in registry.documents()]
+                client = self._get_client()
+                try:
+                    client.delete_collection(collection)
+                except ValueError:
+                    pass  # collection 不存在
+                bm25 = self._get_bm25(collection)
+                if bm25 is not None:
+                    bm25.clear()
+                self._get_tag_index(collection).clear()
+                quant = self._handle(collection).quant
+                if quant is not None:
+                    quant.clear()
+                # 注册表重置后 epoch 变化，本实例与其他实例都会在下次访问时重建句柄
+                registry.clear()
+                self._get_collection(collection)
+                return cleared
+
+        t0 = time.perf_counter()
+        cleared = await self.executor.write("clear", _clear)
+        await self._invalidate(collection, cleared)
+        logger.info(f"已清空知识库 {collection}", extra={"cost": time.perf_counter() - t0})
+
+    async def documents(self, collection: str = "qms_docs") -> List[tuple]:
+        """已入库文档列表：[(filename, chunk 数, 版本号)]。"""
+        def _list() -> List[tuple]:
+            registry = self._get_registry(collection)
+            registry.refresh()
+            return registry.documents()
+
+        return await self.executor.read("documents", _list)
+
+    async def document_versions(self, filenames: Iterable[str], collection: str = "qms_docs") -> Dict[str, Optional[tuple]]:
+        """文档当前版本 {filename: (注册表代次, 版本号)}，未入库的为 None；用于判断缓存答案是否过期。"""
+        def _versions() -> Dict[str, Optional[tuple]]:
+            registry = self._get_registry(collection)
+            registry.maybe_refresh(settings.VECTORDB_REFRESH_INTERVAL)
+            return {
+                name: (registry.epoch, registry.version(name)) if registry.ids(name) is not None else None
+                for name in filenames
+            }
+
+        return await self.executor.read("documents", _versions)
 
     async def ping(self) -> bool:
         """健康检查。"""
         try:
-            self._get_client().heartbeat()
+            await self.executor.read("heartbeat", lambda: self._get_client().heartbeat())
             return True
         except Exception:
             return False
\ No newline at end of file
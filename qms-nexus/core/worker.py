@@ -4,7 +4,7 @@ arq Worker 任务定义
 import asyncio
 import logging
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from arq import create_pool, cron
 from arq.connections import RedisSettings
@@ -15,6 +15,16 @@ from .config import settings
 
 log = logging.getLogger(__name__)
 
+_db: Optional[VectorDBClient] = None
+
+
+def get_db() -> VectorDBClient:
+    """worker 进程内复用一个向量库客户端，不为每个任务重新构建。"""
+    global _db
+    if _db is None:
+        _db = VectorDBClient()
+    return _db
+
 
 async def parse_doc_task(ctx: Dict[str, Any], file_path: str, task_id: str, mime: str = None) -> str:
     """
@@ -28,22 +38,13 @@ async def parse_doc_task(ctx: Dict[str, Any], file_path: str, task_id: str, mime
 
         log.info(f"[task {task_id}] 开始解析 {path.name}")
         parser = get_parser(mime or "application/pdf")
-        chunks = await asyncio.to_thread(parser.parse, str(path))
+        chunks = await parser.parse(str(path))
         if not chunks:
             log.warning(f"[task {task_id}] 未提取到任何文本")
             return "completed"  # 空文件也算完成
 
-        db = VectorDBClient()
-        await db.add_texts(
-            texts=[c.text for c in chunks],
-            metadatas=[
-                {
-                    "source": f"{path.name}, 第{c.page}",
-                    "tags": [],
-                }
-                for c in chunks
-            ],
-        )
+        # upsert_chunks 内部先查向量缓存，重复段落不再向量化
+        await get_db().upsert_chunks(chunks)
         log.info(f"[task {task_id}] 写入 {len(chunks)} 条向量，完成")
         return "completed"
     except Exception as e:
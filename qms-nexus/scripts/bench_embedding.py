@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+向量化微基准：不同批大小下的 chunks/s
+用法：python scripts/bench_embedding.py --model-path ./models/bge-small-zh-v1.5 --batch-sizes 1,8,16,32,64
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.config import get_embedding_config
+from core.embedding import OnnxEmbeddingEngine
+
+SAMPLES = [
+    "质量风险管理流程",
+    "客户投诉处理规范：收到投诉后 24 小时内登记并启动调查，必要时发起 CAPA。",
+    "设计和开发输入应包括预期用途、功能、性能、可用性和安全要求，以及适用的法规要求和风险管理的输出。",
+    "| 项目 | 要求 |\n| ---- | ---- |\n| 外观 | 无瑕疵 |\n| 尺寸 | ±0.1mm |",
+]
+
+
+def make_chunks(n: int, seed: int = 0) -> list[str]:
+    """长短混合的伪 chunk，模拟真实文档长度分布。"""
+    rnd = random.Random(seed)
+    return ["\n".join(rnd.choice(SAMPLES) for _ in range(rnd.randint(1, 12))) for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default=None, help="默认取 config.yaml 中 embedding.model_path")
+    parser.add_argument("--batch-sizes", default="1,8,16,32,64")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--n", type=int, default=512, help="chunk 数量")
+    parser.add_argument("--fp32", action="store_true", help="禁用 int8 量化模型")
+    args = parser.parse_args()
+
+    cfg = get_embedding_config().model_copy()
+    if args.model_path:
+        cfg.model_path = args.model_path
+    if args.threads:
+        cfg.num_threads = args.threads
+    if args.fp32:
+        cfg.quantized = False
+    engine = OnnxEmbeddingEngine(cfg)
+    chunks = make_chunks(args.n)
+    engine.embed(chunks[:8])  # 预热
+
+    print(f"模型：{cfg.model}（{'int8' if cfg.quantized else 'fp32'}，{cfg.num_threads} 线程），chunks={args.n}")
+    for bs in [int(x) for x in args.batch_sizes.split(",")]:
+        t0 = time.perf_counter()
+        engine.embed(chunks, batch_size=bs)
+        cost = time.perf_counter() - t0
+        print(f"batch={bs:<4} {args.n / cost:8.1f} chunks/s  ({cost:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
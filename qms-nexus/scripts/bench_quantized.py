@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""
+量化向量存储基准：与 Chroma 默认 HNSW（hnswlib，M=16 / ef_construction=100 / ef=10）对比
+每百万 chunk 常驻内存、recall@k 与单查询 p95 延迟。
+用法：python scripts/bench_quantized.py --n 100000 --dim 512 --configs int8,int8:256,pq:0:64,pq:256:32
+  config 格式：method[:truncate_dim[:pq_subspaces]]
+"""
+import argparse
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.quantized_store import QuantizedVectorStore
+
+
+def make_data(n: int, dim: int, n_queries: int, seed: int = 0):
+    """带簇结构的归一化向量，查询与语料同分布。"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 100, 10), dim)).astype(np.float32)
+    total = n + n_queries
+    x = np.empty((total, dim), dtype=np.float32)
+    for i in range(0, total, 100000):
+        m = min(100000, total - i)
+        x[i:i + m] = centers[rng.integers(0, len(centers), m)] + rng.normal(scale=0.6, size=(m, dim))
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x[:n], x[n:]
+
+
+def ground_truth(x: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    truth = []
+    for q in queries:
+        scores = x @ q
+        top = np.argpartition(-scores, k - 1)[:k]
+        truth.append(set(top.tolist()))
+    return truth
+
+
+def report(name: str, mem_bytes: float, n: int, hits, truth, latencies, k: int) -> None:
+    recall = np.mean([len(set(h) & t) / k for h, t in zip(hits, truth)])
+    p95 = np.percentile(latencies, 95) * 1000
+    print(f"{name:<22}{mem_bytes / n * 1e6 / 2**20:>12.0f}{recall:>12.3f}{p95:>12.2f}")
+
+
+def bench_hnsw(x, queries, truth, k):
+    import hnswlib
+
+    index = hnswlib.Index(space="cosine", dim=x.shape[1])
+    index.init_index(max_elements=len(x), ef_construction=100, M=16)
+    t0 = time.perf_counter()
+    index.add_items(x, np.arange(len(x)))
+    print(f"(HNSW 建索引 {time.perf_counter() - t0:.1f}s)")
+    index.set_ef(max(10, k))
+    hits, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        labels, _ = index.knn_query(q, k=k)
+        lat.append(time.perf_counter() - t0)
+        hits.append(labels[0].tolist())
+    # 全精度向量 + level0 邻接表（2M 条边）+ label，估算值
+    mem = len(x) * (x.shape[1] * 4 + 16 * 2 * 4 + 4 + 8)
+    report("chroma-hnsw(float32)", mem, len(x), hits, truth, lat, k)
+
+
+def bench_quant(config, x, queries, truth, k, args):
+    parts = config.split(":")
+    method = parts[0]
+    truncate = int(parts[1]) if len(parts) > 1 else 0
+    subspaces = int(parts[2]) if len(parts) > 2 else 32
+    with tempfile.TemporaryDirectory() as tmp:
+        store = QuantizedVectorStore(
+            tmp, x.shape[1], method=method, truncate_dim=truncate, pq_subspaces=subspaces,
+            rerank=args.rerank, train_size=args.train_size, nprobe=args.nprobe,
+        )
+        # 与线上一致用 36 字符 uuid 作 chunk id，常驻内存计入 id 映射
+        ids = [str(uuid.UUID(int=i)) for i in range(len(x))]
+        t0 = time.perf_counter()
+        for i in range(0, len(x), 50000):
+            store.add(ids[i:i + 50000], x[i:i + 50000])
+        build = time.perf_counter() - t0
+        hits, lat = [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            res = store.search(q[None, :], k)[0]
+            lat.append(time.perf_counter() - t0)
+            hits.append([uuid.UUID(doc_id).int for doc_id, _ in res])
+        print(f"({config} 写入+训练 {build:.1f}s)")
+        report(config, store.stats()["resident_bytes"], len(x), hits, truth, lat, k)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=100)
+    parser.add_argument("--configs", default="int8,int8:256,pq:0:64,pq:256:32")
+    parser.add_argument("--train-size", type=int, default=4096)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--skip-hnsw", action="store_true")
+    args = parser.parse_args()
+
+    x, queries = make_data(args.n, args.dim, args.queries)
+    truth = ground_truth(x, queries, args.k)
+    print(f"n={args.n} dim={args.dim} k={args.k} rerank={args.rerank} nprobe={args.nprobe}")
+    print(f"{'存储':<22}{'MB/百万':>12}{'recall@k':>12}{'p95 ms':>12}")
+    if not args.skip_hnsw:
+        bench_hnsw(x, queries, truth, args.k)
+    for config in args.configs.split(","):
+        bench_quant(config, x, queries, truth, args.k, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+标签位图索引基准：不同语料规模下的建索引耗时、位图内存与表达式求值延迟，
+并与逐行判断（等价于 Chroma 对 $or/$contains 的逐行过滤）对比。
+用法：python scripts/bench_tag_index.py --sizes 1000,100000,1000000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.tag_index import TagIndex, parse_tag_expr
+
+TAGS = [f"标签{i:02d}" for i in range(30)]
+EXPRS = [
+    "标签00",
+    "标签03 OR 标签07 OR 标签11",
+    "标签00 AND 标签01",
+    "标签00 AND NOT 标签02",
+    "(标签05 OR 标签06) AND NOT 标签00",
+]
+
+
+def make_tags(n: int, seed: int = 0) -> list:
+    """每个 chunk 1~3 个标签，标签频率近似 Zipf 分布。"""
+    rnd = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(len(TAGS))]
+    return [list(set(rnd.choices(TAGS, weights, k=rnd.randint(1, 3)))) for _ in range(n)]
+
+
+def scan(rows: list, node: tuple) -> int:
+    """逐行求值的基线。"""
+    def match(tags, node):
+        op = node[0]
+        if op == "tag":
+            return node[1] in tags
+        if op == "and":
+            return match(tags, node[1]) and match(tags, node[2])
+        if op == "or":
+            return match(tags, node[1]) or match(tags, node[2])
+        return not match(tags, node[1])
+
+    return sum(1 for tags in rows if match(tags, node))
+
+
+def timed(fn, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for n in [int(x) for x in args.sizes.split(",")]:
+        tag_lists = make_tags(n)
+        rows = [set(t) for t in tag_lists]
+        ids = [f"c{i}" for i in range(n)]
+        idx = TagIndex()
+        t0 = time.perf_counter()
+        idx.set_tags(ids, tag_lists)
+        build = time.perf_counter() - t0
+        mem = sum(bm.nbytes() for bm in idx._bitmaps.values()) / 1024
+        print(f"\n== {n} chunks：建索引 {build:.2f}s，位图 {mem:.0f} KB ==")
+        print(f"{'表达式':<36}{'命中':>10}{'位图 ms':>10}{'逐行 ms':>10}")
+        for expr in EXPRS:
+            node = parse_tag_expr(expr)
+            hits = len(idx.select(node))
+            assert hits == scan(rows, node)
+            t_index = timed(lambda: len(idx.select(node)), args.repeat)
+            t_scan = timed(lambda: scan(rows, node), max(1, args.repeat // 10))
+            print(f"{expr:<36}{hits:>10}{t_index:>10.2f}{t_scan:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,27 @@
 #!/usr/bin/env python
 """
-并发压测脚本：上传 + 检索
-输出：QPS、延迟 P95、成功率
+并发压测脚本：上传 + 检索 + 批量检索
+输出：QPS、延迟 P95、成功率、逐条/批量检索吞吐（queries/s）
 用法：python scripts/benchmark.py
+      python scripts/benchmark.py --llm --streams 2000   # LLMClient 对替身大模型服务的客户端开销，无需网络
 """
+import argparse
 import asyncio
+import sys
 import time
+from pathlib import Path
 import aiohttp
 import aiofiles
 from statistics import quantiles
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
 BASE_URL = "http://localhost:8000"
 CONCURRENCY = 20
 TOTAL = 200
+BATCH_SIZE = 32
+BATCH_ROUNDS = 10
+BATCH_QUERIES = ["质量风险", "CAPA 流程", "设计评审", "客户投诉处理", "检验规范", "质量方针", "纠正预防措施", "供应商审核"]
 
 
 async def upload_one(session: aiohttp.ClientSession, content: bytes) -> float:
@@ -33,6 +42,26 @@ async def search_one(session: aiohttp.ClientSession) -> float:
         return time.time() - t0
 
 
+async def search_throughput(session: aiohttp.ClientSession) -> tuple[float, float]:
+    """同一批查询分别走逐条 GET /search 与 POST /search/batch，返回两者 queries/s"""
+    queries = [BATCH_QUERIES[i % len(BATCH_QUERIES)] for i in range(BATCH_SIZE)]
+
+    t0 = time.time()
+    for _ in range(BATCH_ROUNDS):
+        for q in queries:
+            async with session.get(f"{BASE_URL}/search", params={"q": q}) as resp:
+                assert resp.status == 200
+    single_qps = BATCH_ROUNDS * len(queries) / (time.time() - t0)
+
+    t0 = time.time()
+    for _ in range(BATCH_ROUNDS):
+        async with session.post(f"{BASE_URL}/search/batch", json={"queries": queries}) as resp:
+            assert resp.status == 200
+            assert len(await resp.json()) == len(queries)
+    batch_qps = BATCH_ROUNDS * len(queries) / (time.time() - t0)
+    return single_qps, batch_qps
+
+
 async def worker(name: str, session: aiohttp.ClientSession, queue: asyncio.Queue, latencies: list):
     """消费者：上传 or 检索"""
     while True:
@@ -80,6 +109,73 @@ async def main():
     print(f"P95 延迟：{p95:.3f}s")
     print(f"成功率：100%")
 
+    async with aiohttp.ClientSession() as session:
+        single_qps, batch_qps = await search_throughput(session)
+    print(f"逐条检索吞吐：{single_qps:.1f} queries/s")
+    print(f"批量检索吞吐（batch={BATCH_SIZE}）：{batch_qps:.1f} queries/s")
+
+
+async def llm_overhead(args):
+    """并发流式请求经真实 HTTP 路径（连接池、SSE 解析、重试）访问替身服务；
+    实测首字延迟与总耗时减去替身的配置值，即客户端侧开销。"""
+    from core.config import settings
+    from core.llm import LLMClient
+    from scripts.llm_stub_server import StubConfig, start
+
+    stub = StubConfig(ttft=args.ttft, tps=args.tps, tokens=args.tokens, error_rate=args.error_rate, rate_429=args.rate_429)
+    runner = None
+    if args.llm_url:
+        base_url = args.llm_url.rstrip("/")
+    else:
+        runner, base_url = await start(stub)
+    settings.LLM_MAX_CONNECTIONS = settings.LLM_MAX_KEEPALIVE = args.connections or args.streams
+    client = LLMClient(base_url=base_url, api_key="stub")
+    ttfts, totals, failures = [], [], 0
+
+    async def one():
+        nonlocal failures
+        t0 = time.perf_counter()
+        first = None
+        try:
+            async for _ in client.chat_stream(system="QMS", user="质量方针", max_tokens=args.tokens):
+                first = first or time.perf_counter() - t0
+        except Exception:
+            failures += 1
+            return
+        ttfts.append(first)
+        totals.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.streams)))
+    elapsed = time.perf_counter() - t0
+    await client.close()
+    if runner:
+        await runner.cleanup()
+
+    expected = stub.ttft + (stub.tokens - 1) / stub.tps if stub.tps > 0 else stub.ttft
+    print(f"并发流：{args.streams}（连接池 {settings.LLM_MAX_CONNECTIONS}），失败：{failures}")
+    if len(ttfts) >= 2:
+        p50, p95 = quantiles(ttfts, n=20)[9], quantiles(ttfts, n=20)[18]
+        print(f"首字延迟 P50/P95：{p50:.3f}s / {p95:.3f}s（开销 P95 {p95 - stub.ttft:.3f}s）")
+        p95 = quantiles(totals, n=20)[18]
+        print(f"总耗时 P95：{p95:.3f}s（开销 {p95 - expected:.3f}s）")
+    print(f"聚合吞吐：{len(totals) * stub.tokens / elapsed:.0f} tokens/s，墙钟 {elapsed:.2f}s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", action="store_true", help="只压测 LLMClient 对替身大模型服务的开销")
+    parser.add_argument("--llm-url", default="", help="已启动的替身服务地址（如 http://localhost:8900/v1），为空则进程内启动")
+    parser.add_argument("--streams", type=int, default=1000)
+    parser.add_argument("--connections", type=int, default=0, help="LLMClient 连接池上限，0 为与并发数相同")
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tps", type=float, default=50.0)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    args = parse_args()
+    asyncio.run(llm_overhead(args) if args.llm else main())
\ No newline at end of file
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+OpenAI 兼容大模型替身服务（aiohttp）：离线压测 LLMClient 的真实 HTTP 路径与连接池，测出我方开销。
+实现 /chat/completions（流式 SSE 与非流式）与 /models（同时挂在 /v1 下）；
+首字延迟、生成速度、输出 token 数、5xx 比例、429 比例可按次配置，故障由种子与请求序号决定，同参数多次运行结果一致。
+用法：python scripts/llm_stub_server.py --port 8900 --ttft 0.3 --tps 50 --error-rate 0.01 --rate-429 0.05
+      OPENAI_BASE_URL=http://localhost:8900/v1 uvicorn api.main:app
+运行中 POST /config 修改参数并清零计数，GET /stats 查看请求数、并发峰值等。
+"""
+import argparse
+import asyncio
+import json
+import random
+from functools import lru_cache
+from dataclasses import asdict, dataclass, fields
+from typing import Optional, Tuple
+
+from aiohttp import web
+
+VOCAB = ["质量", "管理", "体系", "应", "建立", "形成", "文件", "并", "保持", "其", "有效性", "。"]
+
+
+@dataclass
+class StubConfig:
+    ttft: float = 0.3  # 首个 token 前的延迟（秒）
+    tps: float = 50.0  # 每秒 token 数，<= 0 为不限速
+    tokens: int = 64  # 每次输出的 token 数（不超过请求的 max_tokens）
+    error_rate: float = 0.0  # 返回 500 的比例
+    rate_429: float = 0.0  # 返回 429 的比例
+    retry_after: float = 1.0  # 429 响应的 Retry-After（秒）
+    seed: int = 0
+    model: str = "stub"
+
+
+@dataclass
+class StubStats:
+    requests: int = 0
+    completed: int = 0
+    errors: int = 0
+    throttled: int = 0
+    active: int = 0
+    peak: int = 0
+    tokens: int = 0
+
+
+CONFIG = web.AppKey("config", StubConfig)
+STATS = web.AppKey("stats", StubStats)
+
+
+def fault(config: StubConfig, n: int) -> Optional[int]:
+    """第 n 个请求应返回的错误码；按 (seed, n) 取随机数，与请求交错顺序无关。"""
+    x = random.Random(f"{config.seed}:{n}").random()
+    if x < config.rate_429:
+        return 429
+    if x < config.rate_429 + config.error_rate:
+        return 500
+    return None
+
+
+@lru_cache(maxsize=256)
+def _chunk(model: str, content: str) -> bytes:
+    # 词表固定，预编码后每个 token 只是一次字节拼接，替身本身不成为数千并发流的瓶颈
+    data = {"object": "chat.completion.chunk", "model": model, "choices": [{"index": 0, "delta": {"content": content}}]}
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+
+async def chat_completions(request: web.Request) -> web.StreamResponse:
+    config, stats = request.app[CONFIG], request.app[STATS]
+    stats.requests += 1
+    status = fault(config, stats.requests)
+    body = await request.json()
+    if status == 429:
+        stats.throttled += 1
+        return web.json_response(
+            {"error": {"message": "rate limited", "type": "rate_limit"}},
+            status=429,
+            headers={"Retry-After": str(config.retry_after)},
+        )
+    if status:
+        stats.errors += 1
+        return web.json_response({"error": {"message": "stub failure", "type": "server_error"}}, status=status)
+
+    count = min(config.tokens, body.get("max_tokens") or config.tokens)
+    tokens = [VOCAB[i % len(VOCAB)] for i in range(count)]
+    stats.active += 1
+    stats.peak = max(stats.peak, stats.active)
+    try:
+        if not body.get("stream"):
+            await asyncio.sleep(config.ttft + (count / config.tps if config.tps > 0 else 0))
+            stats.completed += 1
+            stats.tokens += count
+            return web.json_response({
+                "object": "chat.completion",
+                "model": config.model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": {"completion_tokens": count},
+            })
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await resp.prepare(request)
+        loop = asyncio.get_running_loop()
+        start = loop.time() + config.ttft
+        sent = 0
+        while sent < count:
+            delay = start + sent / config.tps - loop.time() if config.tps > 0 else start - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # 已到期的 token 合并写出：数千并发流时每流每轮只占一个定时器
+            due = count if config.tps <= 0 else min(count, max(sent + 1, int((loop.time() - start) * config.tps) + 1))
+            await resp.write(b"".join(_chunk(config.model, t) for t in tokens[sent:due]))
+            sent = due
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        stats.completed += 1
+        stats.tokens += count
+        return resp
+    finally:
+        stats.active -= 1
+
+
+async def models(request: web.Request) -> web.Response:
+    return web.json_response({"object": "list", "data": [{"id": request.app[CONFIG].model, "object": "model"}]})
+
+
+async def get_stats(request: web.Request) -> web.Response:
+    return web.json_response(asdict(request.app[STATS]))
+
+
+async def update_config(request: web.Request) -> web.Response:
+    """按次修改参数（未给出的保持不变）并清零计数。"""
+    config = request.app[CONFIG]
+    changes = await request.json()
+    for f in fields(StubConfig):
+        if f.name in changes:
+            setattr(config, f.name, type(getattr(config, f.name))(changes[f.name]))
+    stats = request.app[STATS]
+    stats.__init__(active=stats.active, peak=stats.active)  # 进行中的流仍计入并发
+    return web.json_response(asdict(config))
+
+
+def create_app(config: Optional[StubConfig] = None) -> web.Application:
+    app = web.Application()
+    app[CONFIG] = config or StubConfig()
+    app[STATS] = StubStats()
+    for prefix in ("", "/v1"):
+        app.router.add_post(f"{prefix}/chat/completions", chat_completions)
+        app.router.add_get(f"{prefix}/models", models)
+    app.router.add_get("/stats", get_stats)
+    app.router.add_post("/config", update_config)
+    return app
+
+
+async def start(config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0) -> Tuple[web.AppRunner, str]:
+    """在当前事件循环内启动（压测脚本与性能测试用），返回 runner 与 base_url；port=0 为随机端口。"""
+    runner = web.AppRunner(create_app(config), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port, backlog=4096)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8900)
+    for f in fields(StubConfig):
+        parser.add_argument(f"--{f.name.replace('_', '-')}", type=f.type, default=f.default)
+    args = parser.parse_args()
+    config = StubConfig(**{f.name: getattr(args, f.name) for f in fields(StubConfig)})
+    print(f"stub LLM on http://{args.host}:{args.port}/v1 {asdict(config)}", flush=True)
+    web.run_app(create_app(config), host=args.host, port=args.port, backlog=4096, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+向量模型 int8 动态量化（构建步骤）：读取 model.onnx，在同目录生成 model_quantized.onnx。
+服务加载模型时不再现场量化（模型目录可能只读或被多进程共享），需在镜像构建或部署前执行本脚本。
+用法：python scripts/quantize_embedding.py [--model-dir ./models/bge-small-zh] [--force]
+  未给出 --model-dir 时读取 config.yaml 的 embedding.model_path
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.config import get_embedding_config
+
+
+def quantize(root: Path, force: bool = False) -> Path:
+    fp32 = next((p for p in [root / "model.onnx", root / "onnx" / "model.onnx"] if p.exists()), None)
+    if fp32 is None:
+        raise FileNotFoundError(f"{root} 下未找到 model.onnx")
+    target = fp32.with_name("model_quantized.onnx")
+    if target.exists() and not force:
+        print(f"已存在 {target}，跳过（--force 重新生成）")
+        return target
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    # 先写临时文件再原子替换，避免并发加载读到写了一半的模型
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+    try:
+        quantize_dynamic(str(fp32), str(tmp), weight_type=QuantType.QInt8)
+        os.replace(tmp, target)
+    finally:
+        tmp.unlink(missing_ok=True)
+    print(f"已生成 {target}（{fp32.stat().st_size / 2**20:.1f} MB -> {target.stat().st_size / 2**20:.1f} MB）")
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-dir", default=None, help="模型目录，默认取 config.yaml 的 embedding.model_path")
+    parser.add_argument("--force", action="store_true", help="已存在时也重新量化")
+    args = parser.parse_args()
+    model_dir = args.model_dir or get_embedding_config().model_path
+    if not model_dir:
+        parser.error("未配置 embedding.model_path，请用 --model-dir 指定")
+    quantize(Path(model_dir), force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+问答上下文组装：按 token 预算挑选检索结果
+去重（近似重复段落只留分数最高的）→ 分数断崖截断 → 按预算装箱 → 按文档与页码排序编号
+"""
+import re
+from typing import List, Optional, Set, Tuple
+
+from core.config import settings
+from core.logger import get_logger
+from core.metrics import context_tokens
+from core.models import SearchResult
+from core.tokens import count_tokens
+
+logger = get_logger(__name__)
+
+
+def _shingles(text: str, n: int = 3) -> Set[str]:
+    text = re.sub(r"\s+", "", text)
+    return {text[i:i + n] for i in range(max(len(text) - n + 1, 1))}
+
+
+def _tokens_of(r: SearchResult) -> int:
+    # 入库时已写入 n_tokens 元数据，旧数据现场估算
+    n = r.metadata.get("n_tokens")
+    return int(n) if n is not None else count_tokens(r.text)
+
+
+class ContextBuilder:
+    """将检索结果组装为受 token 预算约束的上下文。"""
+
+    def __init__(
+        self,
+        token_budget: Optional[int] = None,
+        min_score_ratio: Optional[float] = None,
+        dedup_threshold: Optional[float] = None,
+    ):
+        self.token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+        self.min_score_ratio = settings.CONTEXT_MIN_SCORE_RATIO if min_score_ratio is None else min_score_ratio
+        self.dedup_threshold = settings.CONTEXT_DEDUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+
+    def dedup(self, results: List[SearchResult]) -> List[SearchResult]:
+        """字符 3-gram Jaccard 相似度不低于阈值视为重复，保留排序靠前者（混合检索按 RRF 分）。"""
+        kept: List[Tuple[SearchResult, Set[str]]] = []
+        for r in sorted(results, key=lambda r: r.rank_score, reverse=True):
+            grams = _shingles(r.text)
+            if all(len(grams & g) / len(grams | g) < self.dedup_threshold for _, g in kept):
+                kept.append((r, grams))
+        return [r for r, _ in kept]
+
+    def cut_off(self, results: List[SearchResult]) -> List[SearchResult]:
+        """丢弃相似度低于最高相似度 min_score_ratio 倍的结果，保持输入顺序。
+
+        只比较余弦相似度 score：RRF 融合分只反映名次，不能作为相关度阈值。
+        """
+        top = max((r.score for r in results), default=0.0)
+        if top <= 0:
+            return results
+        floor = top * self.min_score_ratio
+        return [r for r in results if r.score >= floor]
+
+    def pack(self, results: List[SearchResult]) -> List[SearchResult]:
+        """按分数依次装入预算，放不下的跳过；最高分结果单条超预算时按比例截断。"""
+        packed: List[SearchResult] = []
+        used = 0
+        for r in results:
+            n = _tokens_of(r)
+            if used + n <= self.token_budget:
+                packed.append(r)
+                used += n
+            elif not packed:
+                keep = len(r.text) * self.token_budget // n
+                packed.append(
+                    r.model_copy(update={"text": r.text[:keep], "metadata": {**r.metadata, "n_tokens": self.token_budget}})
+                )
+                used = self.token_budget
+        # 按文档与页码排序，便于引用编号与阅读
+        packed.sort(key=lambda r: (str(r.metadata.get("filename") or ""), r.metadata.get("page") or 0))
+        return packed
+
+    def build(self, results: List[SearchResult]) -> Tuple[str, List[SearchResult]]:
+        """返回 (上下文文本, 入选结果)；上下文中每段以 [序号] 来源 开头。"""
+        before = sum(_tokens_of(r) for r in results)
+        selected = self.pack(self.cut_off(self.dedup(results)))
+        after = sum(_tokens_of(r) for r in selected)
+        context_tokens.labels(stage="raw").observe(before)
+        context_tokens.labels(stage="packed").observe(after)
+        logger.info(f"上下文组装：{len(results)} 段 {before} tokens → {len(selected)} 段 {after} tokens")
+        context = "\n\n".join(f"[{i}] {r.source}\n{r.text}" for i, r in enumerate(selected, 1))
+        return context, selected
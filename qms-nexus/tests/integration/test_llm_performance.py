@@ -0,0 +1,59 @@
+"""
+大模型客户端性能测试
+真实 LLMClient 经 HTTP 访问替身服务（scripts/llm_stub_server.py），测出连接池、SSE 解析与重试等我方开销，无需网络
+"""
+import asyncio
+import statistics
+import time
+
+import pytest
+pytest.importorskip("aiohttp")  # 替身服务基于 aiohttp，未安装时跳过整文件
+
+from core.config import settings
+from core.llm import LLMClient
+from scripts.llm_stub_server import StubConfig, start
+
+
+class TestLLMClientOverhead:
+    """大模型客户端开销测试类"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_stream_overhead(self, monkeypatch):
+        """PF-LLM-01: 500 路并发流式请求的客户端开销"""
+        streams = 500
+        stub = StubConfig(ttft=0.3, tps=50, tokens=32, rate_429=0.02, retry_after=0)
+        monkeypatch.setattr(settings, "LLM_MAX_CONNECTIONS", streams)
+        monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.05)
+        runner, base_url = await start(stub)
+        client = LLMClient(base_url=base_url, api_key="stub")
+        ttfts = []
+
+        async def one():
+            t0 = time.perf_counter()
+            first = None
+            async for _ in client.chat_stream(system="QMS", user="质量方针"):
+                first = first or time.perf_counter() - t0
+            ttfts.append(first)
+
+        try:
+            start_time = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(streams)))
+            total_time = time.perf_counter() - start_time
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+        # 429 经重试后全部成功
+        assert len(ttfts) == streams, f"期望{streams}路成功，实际{len(ttfts)}路"
+
+        # 性能要求：首字延迟 P95 的客户端开销（扣除替身配置的 0.3 秒）低于 2 秒
+        p95 = statistics.quantiles(ttfts, n=20)[18]
+        assert p95 - stub.ttft < 2, f"首字延迟P95开销{p95 - stub.ttft:.2f}秒，超过2秒限制"
+
+        print(f"✅ PF-LLM-01通过: {streams}路并发流式请求")
+        print(f"   首字延迟P95: {p95:.3f}秒（开销{p95 - stub.ttft:.3f}秒）")
+        print(f"   总耗时: {total_time:.2f}秒")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "-s"])
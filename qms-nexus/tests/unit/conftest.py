@@ -0,0 +1,96 @@
+"""
+单元测试公共 Fixtures
+内存版 Chroma 客户端替身，以及注入内存缓存、不连接 Redis 的 VectorDBClient 工厂
+"""
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import pytest
+from core.db_executor import DBExecutor
+from core.search_cache import SearchCache
+from core.vectordb import VectorDBClient
+
+
+class FakeChromaClient:
+    """按名字保存 collection：传入 coll 时所有名字共用它，否则由 factory(name) 新建。"""
+
+    def __init__(self, coll: Any = None, factory: Optional[Callable[[str], Any]] = None, max_batch_size: int = 100):
+        self.coll = coll
+        self.factory = factory
+        self.max_batch_size = max_batch_size
+        self.collections = {}
+        self.dropped = []
+
+    def get_collection(self, name):
+        if name not in self.collections:
+            raise ValueError(name)
+        return self.collections[name]
+
+    def create_collection(self, name, metadata):
+        if name not in self.collections:
+            self.collections[name] = self.coll if self.factory is None else self.factory(name)
+        return self.collections[name]
+
+    def delete_collection(self, name):
+        self.dropped.append(name)
+        self.collections.pop(name, None)
+
+
+class FakeRedis:
+    """只实现 SearchCache 用到的 get / incr；down=True 模拟 Redis 不可用。"""
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    async def get(self, key):
+        if self.down:
+            raise ConnectionError("redis down")
+        return self.data.get(key)
+
+    async def incr(self, key):
+        if self.down:
+            raise ConnectionError("redis down")
+        self.data[key] = self.data.get(key, 0) + 1
+        return self.data[key]
+
+
+class FakeAnswerCache:
+    """答案缓存替身，记录每次按文档失效的文档列表。"""
+
+    def __init__(self):
+        self.invalidated = []
+
+    async def invalidate_documents(self, documents):
+        self.invalidated.append(sorted(documents))
+        return 0
+
+
+@pytest.fixture
+def fake_redis() -> FakeRedis:
+    """同一用例内的多个 VectorDBClient 共用，模拟 API 与 worker 进程共用一个 Redis。"""
+    return FakeRedis()
+
+
+@pytest.fixture
+def answer_cache() -> FakeAnswerCache:
+    return FakeAnswerCache()
+
+
+@pytest.fixture
+def make_vectordb(tmp_path: Path, fake_redis: FakeRedis, answer_cache: FakeAnswerCache):
+    """VectorDBClient 工厂：检索缓存与答案缓存默认用内存替身；传入 coll 或 factory 时替换 Chroma 客户端。
+
+    make_vectordb(coll, path=None, factory=None, max_batch_size=100, **VectorDBClient 参数)
+    """
+
+    def make(coll: Any = None, path: Optional[Path] = None, factory=None, max_batch_size: int = 100, **kwargs) -> VectorDBClient:
+        kwargs.setdefault("executor", DBExecutor())
+        kwargs.setdefault("search_cache", SearchCache(redis_client=fake_redis))
+        kwargs.setdefault("answer_cache", answer_cache)
+        client = VectorDBClient(persist_dir=str(path or tmp_path), **kwargs)
+        if coll is not None or factory is not None:
+            client._client = FakeChromaClient(coll, factory, max_batch_size)
+        return client
+
+    return make
@@ -0,0 +1,101 @@
+"""
+单元测试：答案缓存按来源文档失效（VectorDBClient 写路径 + RAGService 写缓存核对）
+"""
+import pytest
+from core.corrections import CorrectionStore
+from core.models import Chunk, SearchResult
+from core.rag_service import RAGService
+from core.single_flight import SingleFlight
+from services.context_builder import ContextBuilder
+
+
+class _FakeAnswerCache:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ttl=None, documents=()):
+        self.data[key] = (value, ttl, list(documents))
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def acquire(self, key, ttl):
+        return "token"
+
+    async def release(self, key, token):
+        pass
+
+
+class _FakeCollection:
+    def upsert(self, ids, embeddings, documents, metadatas):
+        pass
+
+    def delete(self, ids):
+        pass
+
+    def get(self, **kwargs):
+        return {"ids": []}
+
+
+@pytest.mark.asyncio
+async def test_write_paths_invalidate_touched_documents(make_vectordb, answer_cache):
+    client = make_vectordb(_FakeCollection())
+    chunks = [Chunk(id=f"{fn}-0", text="段落", metadata={"filename": fn}) for fn in ("a.pdf", "b.pdf")]
+    await client.upsert_chunks(chunks)
+    await client.delete_by_filename("a.pdf")
+    await client.delete_by_filename("missing.pdf")  # 无删除不触发失效
+    await client.clear_collection()
+    assert answer_cache.invalidated == [["a.pdf", "b.pdf"], ["a.pdf"], ["b.pdf"]]
+
+
+class _ChangingDB:
+    """第二次读取版本时模拟文档在大模型生成期间被重新入库。"""
+
+    embedder = None
+
+    def __init__(self, changes: bool):
+        self.changes = changes
+        self.reads = 0
+
+    async def similarity_search(self, question, top_k):
+        meta = {"filename": "a.pdf", "page": 1}
+        return [SearchResult(id="c1", text="段落", score=0.9, source="[来源：a.pdf, 第1页]", tags=[], metadata=meta)]
+
+    async def document_versions(self, filenames):
+        self.reads += 1
+        version = 2 if self.changes and self.reads > 1 else 1
+        return {name: (1, version) for name in filenames}
+
+
+class _FakeLLM:
+    async def chat(self, system, user):
+        return "答案"
+
+
+class _FakePrompt:
+    def render(self, variables):
+        return variables["question"]
+
+
+def _service(db, cache) -> RAGService:
+    service = RAGService.__new__(RAGService)
+    service.db, service.llm, service.prompt, service.cache = db, _FakeLLM(), _FakePrompt(), cache
+    service.semantic, service.flight, service.context = None, SingleFlight(), ContextBuilder()
+    service.corrections = CorrectionStore(":memory:")
+    return service
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("changes", [False, True])
+async def test_answer_records_dependencies(changes):
+    cache = _FakeAnswerCache()
+    await _service(_ChangingDB(changes), cache).answer("质量方针")
+    if changes:
+        assert cache.data == {}  # 生成期间来源已更新，答案不留缓存
+    else:
+        value, ttl, documents = cache.data["q:质量方针"]
+        assert value["chunks"] == ["c1"] and value["versions"] == {"a.pdf": 1}
+        assert documents == ["a.pdf"] and ttl >= 3600
@@ -0,0 +1,103 @@
+"""
+单元测试：POST /ask/stream 流式问答（SSE 事件顺序、写缓存、断开时取消上游）
+"""
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.main
+from core.corrections import CorrectionStore
+from core.models import SearchResult
+from core.rag_service import RAGService
+from core.single_flight import SingleFlight
+from services.context_builder import ContextBuilder
+
+
+class _FakeDB:
+    embedder = None
+
+    async def similarity_search(self, question, top_k):
+        return [
+            SearchResult(id="c1", text="段落", score=0.9, source="[来源：a.pdf, 第1页]", tags=[], metadata={"filename": "a.pdf"})
+        ]
+
+    async def document_versions(self, filenames):
+        return {f: (1, 1) for f in filenames}
+
+
+class _FakeCache:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key, (None,))[0]
+
+    async def set(self, key, value, ttl=None, documents=()):
+        self.data[key] = (value, list(documents))
+
+
+class _StreamingLLM:
+    def __init__(self):
+        self.closed = False
+        self.sent = 0
+
+    async def chat_stream(self, system, user):
+        try:
+            for piece in ["设计", "输入", "应形成文件。"]:
+                self.sent += 1
+                yield piece
+        finally:
+            self.closed = True
+
+
+class _FakePrompt:
+    def render(self, variables):
+        return variables["context"]
+
+
+def _service() -> RAGService:
+    service = RAGService.__new__(RAGService)
+    service.db, service.llm, service.prompt, service.cache = _FakeDB(), _StreamingLLM(), _FakePrompt(), _FakeCache()
+    service.flight = SingleFlight()
+    service.context = ContextBuilder()
+    service.corrections = CorrectionStore(":memory:")
+    service.semantic = None
+    return service
+
+
+def _events(text: str) -> list:
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_events_and_cache(monkeypatch):
+    service = _service()
+    monkeypatch.setattr(api.main, "rag", service)
+    client = TestClient(api.main.app)
+    resp = client.post("/ask/stream", json={"question": "设计输入的要求"})
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/event-stream")
+    events = _events(resp.text)
+    assert events[0] == ("sources", {"sources": ["[来源：a.pdf, 第1页]"]})
+    assert [data["text"] for name, data in events if name == "token"] == ["设计", "输入", "应形成文件。"]
+    assert events[-1] == ("done", {"answer": "设计输入应形成文件。", "sources": ["[来源：a.pdf, 第1页]"]})
+    value, documents = service.cache.data["q:设计输入的要求"]
+    assert value["answer"] == "设计输入应形成文件。" and documents == ["a.pdf"]
+    # 再次提问命中缓存，一次产出完整答案
+    events = _events(client.post("/ask/stream", json={"question": "设计输入的要求"}).text)
+    assert [name for name, _ in events] == ["sources", "token", "done"]
+    assert service.llm.sent == 3
+
+
+@pytest.mark.asyncio
+async def test_closing_stream_cancels_upstream_without_caching():
+    service = _service()
+    sources, pieces = await service.open_stream("设计输入的要求")
+    assert sources == ["[来源：a.pdf, 第1页]"]
+    assert await pieces.__anext__() == "设计"
+    await pieces.aclose()  # 客户端断开
+    assert service.llm.closed and service.llm.sent == 1
+    assert service.cache.data == {}
@@ -0,0 +1,82 @@
+"""
+单元测试：core/bm25.py 中文 BM25 索引与 RRF 融合
+"""
+import threading
+
+from core.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_cjk_bigrams_and_codes():
+    """中文二元切分，条款号/型号整词保留。"""
+    tokens = tokenize("ISO13485 7.3 设计开发")
+    assert "iso13485" in tokens and "13485" in tokens
+    assert "7.3" in tokens
+    assert tokens[-3:] == ["设计", "计开", "开发"]
+
+
+def test_search_ranks_exact_code_first():
+    idx = BM25Index()
+    idx.add(["a", "b", "c"], ["设计开发的输入要求", "ISO13485 7.3 设计和开发", "客户投诉处理"])
+    hits = idx.search("ISO13485 7.3", top_k=2)
+    assert hits[0][0] == "b"
+    assert all(doc_id != "c" for doc_id, _ in hits)
+
+
+def test_remove_and_overwrite():
+    idx = BM25Index()
+    idx.add(["a"], ["质量方针"])
+    idx.add(["a"], ["客户投诉"])  # 覆盖
+    assert idx.search("质量方针") == []
+    idx.remove(["a"])
+    assert len(idx) == 0 and idx.search("客户投诉") == []
+
+
+def test_segments_persist_and_refresh(tmp_path):
+    """段文件持久化：重启回放，其他实例写入的段可增量加载。"""
+    writer = BM25Index(str(tmp_path))
+    writer.add(["a", "b"], ["质量方针", "纠正预防措施 CAPA"])
+    writer.commit()
+    reader = BM25Index(str(tmp_path))
+    assert reader.search("CAPA")[0][0] == "b"
+
+    writer.remove(["b"])
+    writer.commit()
+    assert reader.refresh() == 1
+    assert reader.search("CAPA") == []
+
+
+def test_compact_keeps_live_docs(tmp_path):
+    idx = BM25Index(str(tmp_path), max_segments=2)
+    for i in range(4):
+        idx.add([f"d{i}"], [f"文件{i} 设计评审"])
+        idx.commit()
+    assert len(list(tmp_path.glob("*.seg"))) <= 2
+    assert len(BM25Index(str(tmp_path))) == 4
+
+
+def test_compact_keeps_segment_committed_during_compaction(tmp_path, monkeypatch):
+    """合并时另一实例（模拟其他进程）提交的段不会在删除旧段时丢失。"""
+    compactor, other = BM25Index(str(tmp_path)), BM25Index(str(tmp_path))
+    compactor.add(["d1"], ["设计评审"])
+    compactor.commit()
+    other.refresh()
+    other.add(["d2"], ["纠正预防措施 CAPA"])
+    refresh = compactor.refresh
+    writer = threading.Thread(target=other.commit)
+
+    def refresh_then_commit():
+        n = refresh()
+        writer.start()
+        writer.join(0.2)  # 持有写锁时另一实例的提交等待合并完成
+        return n
+
+    monkeypatch.setattr(compactor, "refresh", refresh_then_commit)
+    compactor.compact()
+    writer.join()
+    fresh = BM25Index(str(tmp_path))
+    assert len(fresh) == 2 and fresh.search("CAPA")
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]])
+    assert [doc_id for doc_id, _ in fused] == ["a", "c", "b"]
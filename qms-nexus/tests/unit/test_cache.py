@@ -1,30 +1,120 @@
 """
 缓存单元测试
 """
+import asyncio
+import json
 import time
+
 import pytest
+import pytest_asyncio
 redis = pytest.importorskip("redis")  # 无 Redis 时跳过整文件
-from core.cache import CacheClient
+import redis.asyncio as aioredis
+from core.cache import CacheClient, LocalCache, get_cache_client
+
+
+@pytest_asyncio.fixture
+async def cache():
+    # 每个测试独立的连接：进程共享连接池绑定在首个事件循环上
+    r = aioredis.from_url("redis://localhost:6379/1")
+    client = CacheClient(redis_client=r)
+    yield client
+    await client.close()
+    await r.aclose()
+
+
+@pytest.mark.asyncio
+async def test_set_get(cache: CacheClient):
+    await cache.set("k", "v")
+    assert await cache.get("k") == "v"
+
+
+@pytest.mark.asyncio
+async def test_ttl_expire(cache: CacheClient):
+    await cache.set("k", "v", ttl=1)
+    assert await cache.get("k") == "v"
+    await asyncio.sleep(1.1)
+    assert await cache.get("k") is None
+
+
+@pytest.mark.asyncio
+async def test_delete(cache: CacheClient):
+    await cache.set("k", "v")
+    await cache.delete("k")
+    assert await cache.get("k") is None
+
+
+@pytest.mark.asyncio
+async def test_mget_mset(cache: CacheClient):
+    await cache.mset({"m1": {"answer": "一"}, "m2": [2]})
+    await cache.delete("m3")
+    assert await cache.mget(["m1", "m3", "m2"]) == [{"answer": "一"}, None, [2]]
+
+
+@pytest.mark.asyncio
+async def test_invalidate_documents(cache: CacheClient):
+    await cache.set("q:a", "答案A", documents=["a.pdf"])
+    await cache.set("q:ab", "答案AB", documents=["a.pdf", "b.pdf"])
+    await cache.set("q:c", "答案C", documents=["c.pdf"])
+    assert await cache.invalidate_documents(["a.pdf"]) == 2
+    assert await cache.get("q:a") is None and await cache.get("q:ab") is None
+    assert await cache.get("q:c") == "答案C"
+
+
+def test_local_cache_byte_bound_lru():
+    l1 = LocalCache(max_bytes=1000)  # 每条另计 key 长度与约 200 字节开销
+    l1.set("a", "A", 200, ttl=60)
+    l1.set("b", "B", 200, ttl=60)
+    assert l1.get("a") == "A"  # a 变为最近使用
+    l1.set("c", "C", 200, ttl=60)  # 超出字节上限，淘汰最久未用的 b
+    assert l1.get("b") is None and l1.get("a") == "A" and l1.get("c") == "C"
+    assert l1.nbytes <= 1000
+    l1.set("big", "X", 2000, ttl=60)  # 单条超过上限不缓存
+    assert l1.get("big") is None and len(l1) == 2
+
+
+def test_local_cache_ttl():
+    l1 = LocalCache(max_bytes=10_000)
+    l1.set("k", "v", 10, ttl=0.05)
+    assert l1.get("k") == "v"
+    time.sleep(0.06)
+    assert l1.get("k") is None and l1.nbytes == 0
+
 
+def test_invalidate_message_drops_l1_entry():
+    # 不连接 Redis，直接投递广播消息
+    client = CacheClient(l1_max_bytes=10_000, l1_ttl=60)
+    client.l1.set("q:a", "答案A", 10, ttl=60)
+    client.l1.set("q:b", "答案B", 10, ttl=60)
+    client._on_invalidate(json.dumps({"from": client._channel.id, "keys": ["q:a"]}))  # 自己发出的消息忽略
+    assert client.l1.get("q:a") == "答案A"
+    client._on_invalidate(json.dumps({"from": "other", "keys": ["q:a"]}))
+    assert client.l1.get("q:a") is None and client.l1.get("q:b") == "答案B"
 
-@pytest.fixture
-def cache():
-    return CacheClient(url="redis://localhost:6379/1")
 
+def test_l1_shared_per_process():
+    """共享连接池的客户端共用一份 L1 与订阅；自带 redis_client 的客户端独占。"""
+    a, b = CacheClient(l1_max_bytes=20_000), CacheClient(l1_max_bytes=20_000)
+    assert a.l1 is b.l1 and a._channel is b._channel
+    assert get_cache_client() is get_cache_client()
+    own = CacheClient(l1_max_bytes=20_000, redis_client=aioredis.Redis())
+    assert own.l1 is not a.l1
 
-def test_set_get(cache: CacheClient):
-    cache.set("k", "v")
-    assert cache.get("k") == "v"
 
+class _Pipe:
+    def __init__(self):
+        self.published = []
 
-def test_ttl_expire(cache: CacheClient):
-    cache.set("k", "v", ttl=1)
-    assert cache.get("k") == "v"
-    time.sleep(1.1)
-    assert cache.get("k") is None
+    def publish(self, channel, message):
+        self.published.append(json.loads(message))
 
 
-def test_delete(cache: CacheClient):
-    cache.set("k", "v")
-    cache.delete("k")
-    assert cache.get("k") is None
\ No newline at end of file
+def test_broadcast_without_l1():
+    """未启用 L1 的进程（如 worker）写入/删除时同样广播失效，其他副本的 L1 才会丢弃旧值。"""
+    client = CacheClient(l1_max_bytes=0, redis_client=aioredis.Redis())
+    pipe = _Pipe()
+    client._broadcast(pipe, ["q:a"])
+    assert client.l1 is None and pipe.published[0]["keys"] == ["q:a"]
+    other = CacheClient(l1_max_bytes=10_000)
+    other.l1.set("q:a", "旧答案", 10, ttl=60)
+    other._on_invalidate(json.dumps(pipe.published[0]))
+    assert other.l1.get("q:a") is None
@@ -0,0 +1,61 @@
+"""
+单元测试：core/codec.py 缓存值编解码
+"""
+import json
+
+import pytest
+from core import codec as codec_module
+from core.codec import CacheCodec
+
+_ANSWER = {
+    "answer": "设计和开发输出应满足输入的要求。" * 40,
+    "sources": ["[来源：ISO13485.pdf, 第12页]", "[来源：程序文件.docx, 第3页]"],
+    "chunks": ["c1", "c2"],
+    "versions": {"ISO13485.pdf": 3, "程序文件.docx": None},
+}
+
+
+def test_json_zlib_roundtrip_and_threshold():
+    c = CacheCodec("json", "zlib", threshold=256)
+    big = c.encode(_ANSWER)
+    assert c.decode(big) == _ANSWER
+    assert len(big) < len(json.dumps(_ANSWER, ensure_ascii=False).encode("utf-8")) / 2
+    small = c.encode({"answer": "短", "sources": []})
+    assert small[0] == 1  # json 未压缩
+    assert c.decode(small) == {"answer": "短", "sources": []}
+
+
+def test_reads_legacy_json_and_other_formats():
+    reader = CacheCodec("json", "none")
+    # 升级前写入的 JSON 文本
+    assert reader.decode(json.dumps(_ANSWER, ensure_ascii=False).encode("utf-8")) == _ANSWER
+    # 解码不受自身配置影响
+    assert reader.decode(CacheCodec("json", "zlib", threshold=0).encode(_ANSWER)) == _ANSWER
+
+
+def test_incompressible_payload_stored_raw():
+    c = CacheCodec("json", "zlib", threshold=0)
+    # 短文本压缩后反而更长
+    data = c.encode("质量方针")
+    assert data[0] == 1 and c.decode(data) == "质量方针"
+
+
+def test_unknown_codec_rejected():
+    with pytest.raises(ValueError):
+        CacheCodec("pickle")
+
+
+@pytest.mark.skipif(codec_module.msgpack is not None, reason="已安装 msgpack")
+def test_missing_optional_dependency_falls_back():
+    c = CacheCodec("msgpack", "auto")
+    assert c.serializer == "json"
+    assert c.decode(c.encode(_ANSWER)) == _ANSWER
+
+
+@pytest.mark.skipif(codec_module.msgpack is None or codec_module.zstandard is None, reason="需要 msgpack 与 zstandard")
+def test_msgpack_zstd_roundtrip():
+    c = CacheCodec("msgpack", "zstd", threshold=256)
+    data = c.encode(_ANSWER)
+    assert data[0] == 6
+    assert c.decode(data) == _ANSWER
+    assert CacheCodec("json", "none").decode(data) == _ANSWER
@@ -0,0 +1,57 @@
+"""
+单元测试：services/context_builder.py 上下文组装
+"""
+from core.models import SearchResult
+from core.tokens import count_tokens
+from services.context_builder import ContextBuilder
+
+
+def _r(text, score, filename="a.pdf", page=1, n_tokens=None):
+    meta = {"filename": filename, "page": page}
+    if n_tokens is not None:
+        meta["n_tokens"] = n_tokens
+    return SearchResult(text=text, score=score, source=f"[来源：{filename}, 第{page}页]", tags=[], metadata=meta)
+
+
+def test_count_tokens():
+    assert count_tokens("质量方针") == 4
+    assert count_tokens("CAPA flow") == 3
+
+
+def test_dedup_cutoff_and_citation_order():
+    results = [
+        _r("设计开发输入应形成文件并评审", 0.9, "b.pdf", 3),
+        _r("设计开发输入应形成文件并评审。", 0.85, "b.pdf", 9),  # 近似重复
+        _r("纠正措施应在规定时间内关闭", 0.8, "a.pdf", 2),
+        _r("无关段落", 0.3),  # 分数断崖
+    ]
+    context, selected = ContextBuilder(token_budget=1000, min_score_ratio=0.7, dedup_threshold=0.8).build(results)
+    assert [r.metadata["page"] for r in selected] == [2, 3]  # 按文档、页码排序
+    assert context.startswith("[1] [来源：a.pdf, 第2页]\n纠正措施")
+    assert "[2] [来源：b.pdf, 第3页]" in context
+
+
+def test_pack_respects_budget():
+    """按分数装箱，放不下的跳过；最高分单条超预算时截断。"""
+    builder = ContextBuilder(token_budget=100, min_score_ratio=0, dedup_threshold=1.1)
+    results = [
+        _r("甲" * 80, 0.9, page=1, n_tokens=80),
+        _r("乙" * 40, 0.8, page=2, n_tokens=40),
+        _r("丙" * 20, 0.7, page=3, n_tokens=20),
+    ]
+    selected = builder.pack(results)
+    assert [r.text[0] for r in selected] == ["甲", "丙"]
+    big = builder.pack([_r("丁" * 400, 0.9, n_tokens=400)])
+    assert len(big[0].text) == 100
+
+
+def test_hybrid_orders_by_rrf_and_cuts_by_cosine():
+    """混合检索结果按 RRF 分去重排序，截断阈值只看余弦相似度。"""
+    results = [
+        _r("仅词法命中的条款原文", 0.3, page=1).model_copy(update={"rrf_score": 0.032}),
+        _r("向量与词法都命中", 0.9, page=2).model_copy(update={"rrf_score": 0.033}),
+        _r("向量命中的相关段落", 0.8, page=3).model_copy(update={"rrf_score": 0.016}),
+    ]
+    builder = ContextBuilder(token_budget=1000, min_score_ratio=0.7, dedup_threshold=0.8)
+    assert [r.metadata["page"] for r in builder.dedup(results)] == [2, 1, 3]
+    assert [r.metadata["page"] for r in builder.cut_off(builder.dedup(results))] == [2, 3]
@@ -0,0 +1,101 @@
+"""
+单元测试：core/corrections.py 人工修正库及 RAGService 优先查询
+"""
+import threading
+
+import numpy as np
+import pytest
+from core.corrections import CorrectionStore
+from core.rag_service import CORRECTION_SOURCE, RAGService
+
+
+def test_exact_tier_latest_wins_and_other_process_visible(tmp_path):
+    db = str(tmp_path / "corrections.db")
+    writer, reader = CorrectionStore(db), CorrectionStore(db)
+    writer.add("质量方针是什么？", "旧答案", "错误回答")
+    writer.add("质量方针是什么?", "新答案")  # 全半角差异视为同一问题
+    assert reader.lookup("质量方针是什么?") is None  # 查找只读内存，refresh 后才可见
+    assert reader.refresh() == 2
+    assert reader.lookup(" 质量方针是什么？").answer == "新答案"
+    assert reader.lookup("CAPA 流程") is None
+    assert CorrectionStore(db).lookup("质量方针是什么?").answer == "新答案"  # 重启后从 SQLite 加载
+
+
+def test_vector_tier_threshold(tmp_path):
+    store = CorrectionStore(str(tmp_path / "c.db"), dim=2, threshold=0.95)
+    store.add("设计开发的要求是什么", "答案A", vector=np.array([1.0, 0.0]))
+    assert store.lookup_similar(np.array([1.0, 0.1])).answer == "答案A"
+    assert store.lookup_similar(np.array([1.0, 1.0])) is None
+
+
+class _FailingDB:
+    embedder = None
+
+    async def similarity_search(self, *a, **k):
+        raise AssertionError("修正库命中时不应检索")
+
+
+class _FakeCache:
+    def __init__(self):
+        self.deleted = []
+
+    async def delete(self, key):
+        self.deleted.append(key)
+
+    async def get(self, key):
+        raise AssertionError("修正库命中时不应查缓存")
+
+
+@pytest.mark.asyncio
+async def test_answer_prefers_correction(tmp_path):
+    service = RAGService.__new__(RAGService)
+    service.db, service.cache = _FailingDB(), _FakeCache()
+    service.corrections = CorrectionStore(str(tmp_path / "c.db"))
+    await service.add_correction("质量方针是什么", "以顾客为关注焦点……", "错误回答")
+    assert service.cache.deleted == ["q:质量方针是什么"]
+    assert await service.answer("质量方针是什么") == ("以顾客为关注焦点……", [CORRECTION_SOURCE])
+
+
+class _Embedder:
+    def embed(self, texts):
+        return np.array([[1.0, 0.05] if "方针" in t else [0.0, 1.0] for t in texts], dtype=np.float32)
+
+
+class _Executor:
+    async def read(self, stage, fn, *args):
+        return fn(*args)
+
+
+class _VectorDB(_FailingDB):
+    embedder = _Embedder()
+    executor = _Executor()
+
+
+@pytest.mark.asyncio
+async def test_similar_correction_beats_cached_paraphrase(tmp_path):
+    """相近问题的修正先于答案缓存：改述问题的旧缓存答案不再返回。"""
+    service = RAGService.__new__(RAGService)
+    service.db, service.cache = _VectorDB(), _FakeCache()
+    service.corrections = CorrectionStore(str(tmp_path / "c.db"), dim=2)
+    await service.add_correction("质量方针是什么", "以顾客为关注焦点……")
+    assert await service.answer("公司的质量方针是?") == ("以顾客为关注焦点……", [CORRECTION_SOURCE])
+    sources, stream = await service.open_stream("请问质量方针")
+    assert sources == [CORRECTION_SOURCE]
+    assert [p async for p in stream] == ["以顾客为关注焦点……"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_is_rate_limited_and_off_loop(tmp_path, monkeypatch):
+    """问答路径按间隔在线程中加载其他进程的修正，不在事件循环上访问 SQLite。"""
+    db = str(tmp_path / "c.db")
+    service = RAGService.__new__(RAGService)
+    service.db, service.cache = _FailingDB(), _FakeCache()
+    service.corrections = CorrectionStore(db)
+    CorrectionStore(db).add("质量方针是什么", "其他进程的答案")
+    threads = []
+    refresh = service.corrections.refresh
+    monkeypatch.setattr(service.corrections, "refresh", lambda: threads.append(threading.get_ident()) or refresh())
+    service.corrections._refreshed_at = 0.0
+    assert await service.answer("质量方针是什么") == ("其他进程的答案", [CORRECTION_SOURCE])
+    assert await service.answer("质量方针是什么") == ("其他进程的答案", [CORRECTION_SOURCE])
+    assert len(threads) == 1 and threads[0] != threading.get_ident()
@@ -0,0 +1,108 @@
+"""
+单元测试：core/db_executor.py 向量库异步执行层
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from core.db_executor import DBExecutor, VectorDBBusyError
+
+
+@pytest.mark.asyncio
+async def test_read_runs_off_event_loop():
+    """读操作在线程池中执行，不占用事件循环线程。"""
+    ex = DBExecutor(read_workers=2)
+    loop_thread = threading.get_ident()
+    tid = await ex.read("query", threading.get_ident)
+    assert tid != loop_thread
+
+
+@pytest.mark.asyncio
+async def test_slow_read_does_not_block_loop():
+    """慢查询期间事件循环仍可调度其他协程。"""
+    ex = DBExecutor(read_workers=2)
+    slow = asyncio.create_task(ex.read("query", time.sleep, 0.3))
+    t0 = time.perf_counter()
+    await asyncio.sleep(0.01)
+    assert time.perf_counter() - t0 < 0.1
+    await slow
+
+
+@pytest.mark.asyncio
+async def test_writes_are_serialized():
+    """写通道单线程串行执行。"""
+    ex = DBExecutor()
+    names = await asyncio.gather(*[ex.write("upsert", lambda: threading.current_thread().name) for _ in range(5)])
+    assert len(set(names)) == 1
+
+
+@pytest.mark.asyncio
+async def test_backpressure_rejects_when_saturated():
+    """排队超过上限立即抛 VectorDBBusyError。"""
+    ex = DBExecutor(read_workers=1, max_pending_reads=2)
+    running = [asyncio.create_task(ex.read("query", time.sleep, 0.2)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    with pytest.raises(VectorDBBusyError):
+        await ex.read("query", time.sleep, 0)
+    await asyncio.gather(*running)
+    # 排队释放后恢复可用
+    assert await ex.read("query", lambda: 1) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_keeps_slot_until_thread_finishes():
+    """调用方被取消后线程仍在执行，名额在线程结束时才释放。"""
+    ex = DBExecutor(read_workers=1, max_pending_reads=1)
+    task = asyncio.create_task(ex.read("query", time.sleep, 0.2))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert ex.reader.pending == 1
+    with pytest.raises(VectorDBBusyError):
+        await ex.read("query", lambda: 1)
+    await asyncio.sleep(0.3)
+    assert ex.reader.pending == 0
+    assert await ex.read("query", lambda: 1) == 1
+
+
+class _SlowCollection:
+    def query(self, **kwargs):
+        time.sleep(0.2)
+        return {"ids": [["c1"]], "documents": [["文本"]], "metadatas": [[{"filename": "a.pdf", "page": 1}]], "distances": [[0.1]]}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_similarity_search(make_vectordb):
+    """并发检索在读线程池中并行执行。"""
+    client = make_vectordb(_SlowCollection(), executor=DBExecutor(read_workers=4))
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*[client.similarity_search("质量") for _ in range(4)])
+    assert time.perf_counter() - t0 < 0.6
+    assert all(r[0].source == "[来源：a.pdf, 第1页]" for r in results)
+
+
+class _BatchCollection:
+    def __init__(self):
+        self.calls = []
+
+    def query(self, query_texts, n_results, where=None):
+        self.calls.append(query_texts)
+        return {
+            "ids": [[f"{q}-id"] for q in query_texts],
+            "documents": [[f"{q}-结果"] for q in query_texts],
+            "metadatas": [[{"filename": f"{q}.pdf", "page": 1}] for q in query_texts],
+            "distances": [[0.2] for _ in query_texts],
+        }
+
+
+@pytest.mark.asyncio
+async def test_similarity_search_many_single_roundtrip(make_vectordb):
+    """批量检索只调用一次 coll.query，结果顺序与输入一致。"""
+    coll = _BatchCollection()
+    client = make_vectordb(coll)
+    results = await client.similarity_search_many(["质量方针", "CAPA", "设计评审"], top_k=3)
+    assert len(coll.calls) == 1
+    assert [r[0].text for r in results] == ["质量方针-结果", "CAPA-结果", "设计评审-结果"]
+    assert await client.similarity_search_many([]) == []
@@ -0,0 +1,140 @@
+"""
+单元测试：core/deadline.py 请求截止时间及 /ask 降级答案
+"""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.main
+from core.config import settings
+from core.corrections import CorrectionStore
+from core.deadline import DeadlineExceeded, deadline_scope, remaining, within
+from core.llm import LLMUnavailableError
+from core.models import SearchResult
+from core.rag_service import DEGRADED_NOTICE, RAGService
+from core.single_flight import SingleFlight
+from services.context_builder import ContextBuilder
+
+
+@pytest.mark.asyncio
+async def test_within_bounds_stages():
+    assert remaining() is None
+    assert await within("x", asyncio.sleep(0, "ok")) == "ok"  # 未设置截止时间时不限时
+    with deadline_scope(0.05):
+        with pytest.raises(DeadlineExceeded) as exc:
+            await within("retrieval", asyncio.sleep(1))
+        assert exc.value.stage == "retrieval"
+        # 剩余时间不足 min_left 时不再执行
+        with pytest.raises(DeadlineExceeded):
+            await within("llm", asyncio.sleep(0), min_left=1.0)
+    assert remaining() is None
+
+
+def test_nested_scope_keeps_earlier_deadline():
+    with deadline_scope(1):
+        with deadline_scope(60):
+            assert remaining() <= 1
+        with deadline_scope(0.5):
+            assert remaining() <= 0.5
+
+
+class _FakeDB:
+    embedder = None
+
+    async def similarity_search(self, question, top_k):
+        return [
+            SearchResult(id=f"c{i}", text=f"段落{i}", score=1 - i / 10, source=f"[来源：a.pdf, 第{i}页]", tags=[],
+                         metadata={"filename": "a.pdf", "page": i})
+            for i in range(1, 6)
+        ]
+
+    async def document_versions(self, filenames):
+        return {f: (1, 1) for f in filenames}
+
+
+class _FakeCache:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ttl=None, documents=()):
+        self.data[key] = value
+
+    async def acquire(self, key, ttl):
+        return "token"
+
+    async def release(self, key, token):
+        pass
+
+
+class _SlowLLM:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def chat(self, system, user):
+        await asyncio.sleep(self.delay)
+        return "完整答案"
+
+
+class _DownLLM:
+    async def chat(self, system, user):
+        raise LLMUnavailableError("大模型端点熔断中", retry_after=3)
+
+
+class _FakePrompt:
+    def render(self, variables):
+        return variables["context"]
+
+
+def _service(llm_delay: float) -> RAGService:
+    service = RAGService.__new__(RAGService)
+    service.db, service.llm, service.prompt, service.cache = _FakeDB(), _SlowLLM(llm_delay), _FakePrompt(), _FakeCache()
+    service.flight = SingleFlight()
+    service.context = ContextBuilder(min_score_ratio=0)
+    service.corrections = CorrectionStore(":memory:")
+    service.semantic = None
+    return service
+
+
+@pytest.mark.asyncio
+async def test_llm_timeout_returns_top_passages(monkeypatch):
+    monkeypatch.setattr(settings, "ASK_LLM_MIN_SECONDS", 0)
+    monkeypatch.setattr(settings, "ASK_DEGRADED_PASSAGES", 2)
+    service = _service(llm_delay=1)
+    with deadline_scope(0.1):
+        with pytest.raises(DeadlineExceeded) as exc:
+            await service.answer("设计开发的要求")
+    assert exc.value.stage == "llm"
+    answer, sources = exc.value.partial
+    assert answer.startswith(DEGRADED_NOTICE) and "段落1" in answer and "段落3" not in answer
+    assert sources == ["[来源：a.pdf, 第1页]", "[来源：a.pdf, 第2页]"]
+    assert service.cache.data == {}  # 降级答案不写缓存
+    # 截止时间充足时正常生成
+    with deadline_scope(5):
+        assert (await service.answer("设计开发的要求"))[0] == "完整答案"
+
+
+def test_ask_endpoint_degrades_per_api_key(monkeypatch):
+    monkeypatch.setattr(settings, "ASK_LLM_MIN_SECONDS", 0)
+    monkeypatch.setattr(settings, "ASK_DEADLINE_SECONDS", 0.1)
+    monkeypatch.setattr(settings, "ASK_DEADLINE_BY_KEY", {"batch": 5})
+    monkeypatch.setattr(api.main, "rag", _service(llm_delay=0.3))
+    client = TestClient(api.main.app)
+    resp = client.post("/ask", json={"question": "设计开发的要求"})
+    assert resp.status_code == 200 and resp.json()["degraded"] is True
+    resp = client.post("/ask", json={"question": "设计开发的要求"}, headers={"X-API-Key": "batch"})
+    assert resp.json() == {"answer": "完整答案", "sources": [f"[来源：a.pdf, 第{i}页]" for i in range(1, 6)], "degraded": False}
+
+
+def test_ask_degrades_when_llm_unavailable(monkeypatch):
+    service = _service(llm_delay=0)
+    service.llm = _DownLLM()
+    monkeypatch.setattr(api.main, "rag", service)
+    resp = TestClient(api.main.app).post("/ask", json={"question": "设计开发的要求"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["degraded"] is True and body["answer"].startswith(DEGRADED_NOTICE)
+    assert service.cache.data == {}
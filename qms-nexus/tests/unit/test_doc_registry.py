@@ -0,0 +1,91 @@
+"""
+单元测试：core/doc_registry.py 文档注册表与按文件删除、清空知识库
+"""
+import pytest
+from core.doc_registry import DocumentRegistry
+from core.models import Chunk
+
+
+def test_registry_versions_and_persist(tmp_path):
+    """多次入库累积 chunk id 并递增版本；重启后回放。"""
+    reg = DocumentRegistry(str(tmp_path))
+    reg.add_chunks("a.pdf", ["c1", "c2"])
+    reg.bump(["a.pdf"])
+    reg.add_chunks("a.pdf", ["c2", "c3"])
+    reg.bump(["a.pdf"])
+    reg.commit()
+    reopened = DocumentRegistry(str(tmp_path))
+    assert reopened.ids("a.pdf") == ["c1", "c2", "c3"]
+    assert reopened.version("a.pdf") == 2
+    assert reopened.ids("b.pdf") is None
+
+
+def test_clear_bumps_epoch_for_other_instances(tmp_path):
+    writer = DocumentRegistry(str(tmp_path))
+    reader = DocumentRegistry(str(tmp_path))
+    writer.add_chunks("a.pdf", ["c1"])
+    writer.commit()
+    reader.refresh()
+    epoch = reader.epoch
+    writer.clear()
+    reader.refresh()
+    assert reader.epoch > epoch and len(reader) == 0
+
+
+def test_compaction_keeps_epoch(tmp_path):
+    """其他实例合并段不改变注册表内容，epoch 保持不变。"""
+    writer = DocumentRegistry(str(tmp_path), max_segments=2)
+    reader = DocumentRegistry(str(tmp_path))
+    epoch = reader.epoch
+    for i in range(4):
+        writer.add_chunks(f"{i}.pdf", [f"c{i}"])
+        writer.commit()
+    assert len(list(tmp_path.glob("*.seg"))) <= 2
+    reader.refresh()
+    assert reader.epoch == epoch and len(reader) == 4
+
+
+def test_maybe_refresh_is_rate_limited(tmp_path):
+    writer = DocumentRegistry(str(tmp_path))
+    reader = DocumentRegistry(str(tmp_path))
+    writer.add_chunks("a.pdf", ["c1"])
+    writer.commit()
+    assert reader.maybe_refresh(60) == 0 and reader.ids("a.pdf") is None
+    assert reader.maybe_refresh(0) == 1 and reader.ids("a.pdf") == ["c1"]
+
+
+class _FakeCollection:
+    def __init__(self):
+        self.deleted = []
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        pass
+
+    def get(self, **kwargs):
+        raise AssertionError("已登记的文档不应扫描元数据")
+
+    def delete(self, ids):
+        self.deleted.extend(ids)
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_uses_registry(make_vectordb):
+    client = make_vectordb(factory=lambda name: _FakeCollection())
+    chunks = [Chunk(id=f"{fn}-{i}", text="段落", metadata={"filename": fn}) for fn in ("a", "b", "c") for i in range(2)]
+    await client.upsert_chunks(chunks)
+    deleted = await client.delete_by_filenames(["a", "b"])
+    assert deleted == {"a": 2, "b": 2}
+    assert client._client.collections["qms_docs"].deleted == ["a-0", "a-1", "b-0", "b-1"]
+    assert [name for name, _, _ in await client.documents()] == ["c"]
+
+
+@pytest.mark.asyncio
+async def test_clear_recreates_collection(make_vectordb):
+    """清空知识库：删除并重建 collection，注册表清零。"""
+    client = make_vectordb(factory=lambda name: _FakeCollection())
+    await client.upsert_chunks([Chunk(id="x", text="段落", metadata={"filename": "a"})])
+    old = client._get_collection()
+    await client.clear_collection()
+    assert client._client.dropped == ["qms_docs"]
+    assert client._get_collection() is not old
+    assert await client.documents() == []
@@ -0,0 +1,151 @@
+"""
+单元测试：core/embedding.py 批量向量化
+"""
+import numpy as np
+import pytest
+from chromadb.api.client import SharedSystemClient
+from core.embedding import EmbeddingEngine, OnnxEmbeddingEngine, _pad
+from core.models import Chunk, EmbeddingConfig
+
+
+class FakeEngine(EmbeddingEngine):
+    """以文本长度作为向量首维，记录每批的文本。"""
+
+    def __init__(self, dim: int = 4, batch_size: int = 2):
+        super().__init__(EmbeddingConfig(dim=dim, batch_size=batch_size))
+        self.out_dim = dim
+        self.batches = []
+
+    def _embed_batch(self, texts):
+        self.batches.append(texts)
+        out = np.zeros((len(texts), self.out_dim), dtype=np.float32)
+        out[:, 0] = [len(t) for t in texts]
+        return out
+
+
+def test_embed_sorted_batches_keep_order():
+    """按长度排序分批，输出顺序与输入一致。"""
+    engine = FakeEngine(batch_size=2)
+    texts = ["aaaa", "a", "aaa", "aa", "aaaaa"]
+    vecs = engine.embed(texts)
+    assert vecs[:, 0].tolist() == [4, 1, 3, 2, 5]
+    assert engine.batches == [["a", "aa"], ["aaa", "aaaa"], ["aaaaa"]]
+
+
+def test_embed_dim_mismatch():
+    """模型输出维度与配置不一致时报错。"""
+    engine = FakeEngine(dim=4)
+    engine.config.dim = 8
+    with pytest.raises(ValueError, match="不一致"):
+        engine.embed(["a"])
+
+
+def test_pad_to_batch_max():
+    arr = _pad([[1, 2, 3], [4]])
+    assert arr.tolist() == [[1, 2, 3], [4, 0, 0]]
+
+
+class _RecordingCollection:
+    def __init__(self):
+        self.upserts = []
+        self.queries = []
+
+    def upsert(self, **kwargs):
+        self.upserts.append(kwargs)
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        n = len(kwargs["query_embeddings"])
+        return {"ids": [[]] * n, "documents": [[]] * n, "metadatas": [[]] * n, "distances": [[]] * n}
+
+
+@pytest.mark.asyncio
+async def test_vectordb_passes_precomputed_vectors(make_vectordb):
+    """配置向量引擎后，Chroma 只接收预计算向量。"""
+    coll = _RecordingCollection()
+    client = make_vectordb(coll, embedder=FakeEngine())
+    await client.upsert_chunks([Chunk(text="质量", metadata={"filename": "a.pdf"})])
+    assert coll.upserts[0]["embeddings"][0][0] == 2
+    await client.similarity_search("质量方针")
+    assert "query_texts" not in coll.queries[0]
+    assert coll.queries[0]["query_embeddings"][0][0] == 4
+
+
+def test_resolve_model_does_not_quantize_at_load(tmp_path):
+    """缺少 int8 模型时直接使用 fp32，不在模型目录中现场生成文件。"""
+    (tmp_path / "model.onnx").write_bytes(b"fp32")
+    engine = OnnxEmbeddingEngine.__new__(OnnxEmbeddingEngine)
+    engine.config = EmbeddingConfig(model_path=str(tmp_path), quantized=True)
+    assert engine._resolve_model(tmp_path) == tmp_path / "model.onnx"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["model.onnx"]
+    (tmp_path / "model_quantized.onnx").write_bytes(b"int8")
+    assert engine._resolve_model(tmp_path) == tmp_path / "model_quantized.onnx"
+
+
+@pytest.fixture
+def fresh_chroma():
+    """进程内 Chroma 实例按 settings 共享，用例间 persist_dir 不同需清掉缓存的实例。"""
+    SharedSystemClient.clear_system_cache()
+    yield
+    SharedSystemClient.clear_system_cache()
+
+
+@pytest.mark.asyncio
+async def test_collection_dim_mismatch_rejected(make_vectordb, fresh_chroma):
+    """collection 记录建库时的向量维度，与 embedding.dim 不一致时明确报错。"""
+    client = make_vectordb(embedding_config=EmbeddingConfig(dim=4), embedder=FakeEngine())
+    await client.upsert_chunks([Chunk(text="质量", metadata={"filename": "a.pdf"})], collection="dim_check")
+    assert client._get_collection("dim_check").metadata["embedding_dim"] == 4
+
+    other = make_vectordb(embedding_config=EmbeddingConfig(dim=8), embedder=FakeEngine(dim=8))
+    other._client = client._get_client()
+    with pytest.raises(ValueError, match="embedding.dim=8"):
+        other._get_collection("dim_check")
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_only_on_ingest(tmp_path, monkeypatch, make_vectordb):
+    """入库走向量缓存并在结束时落盘一次，查询向量不进缓存。"""
+    from core import vectordb
+    from core.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(str(tmp_path / "cache"), dim=4, max_entries=16)
+    flushes = []
+    cache.flush = lambda: flushes.append(1)
+    monkeypatch.setattr(vectordb, "get_embedding_engine", lambda config: FakeEngine())
+    monkeypatch.setattr(vectordb, "get_embedding_cache", lambda dim: cache)
+    client = make_vectordb(_RecordingCollection())
+    await client.upsert_chunks([Chunk(text=t, metadata={"filename": "a.pdf"}) for t in ["质量", "方针", "目标"]])
+    assert cache.stats()["entries"] == 3 and flushes == [1]
+    await client.similarity_search("质量方针")
+    assert cache.stats()["entries"] == 3 and cache.stats()["hits"] + cache.stats()["misses"] == 3
+    cache.close()
+
+
+class TableEngine(EmbeddingEngine):
+    """按文本查表给出向量，便于构造确定的余弦相似度。"""
+
+    def __init__(self, table):
+        super().__init__(EmbeddingConfig(dim=2))
+        self.table = table
+
+    def _embed_batch(self, texts):
+        return np.asarray([self.table[t] for t in texts], dtype=np.float32)
+
+
+@pytest.mark.asyncio
+async def test_hybrid_keeps_cosine_score(make_vectordb, monkeypatch, fresh_chroma):
+    """混合检索按 RRF 排序并记入 rrf_score，score 仍为余弦相似度（仅词法命中的结果回表计算）。"""
+    from core.config import settings
+
+    monkeypatch.setattr(settings, "HYBRID_CANDIDATES", 2)
+    # 向量召回前两名为 质量方针、客户投诉；条款 7.3 只被 BM25 命中
+    engine = TableEngine({"质量方针": [1, 0], "客户投诉": [0.8, 0.6], "条款 7.3 设计开发": [0.6, 0.8], "质量 7.3": [1, 0]})
+    client = make_vectordb(embedding_config=EmbeddingConfig(dim=2), embedder=engine)
+    texts = ["质量方针", "客户投诉", "条款 7.3 设计开发"]
+    await client.upsert_chunks([Chunk(text=t, metadata={"filename": f"{i}.pdf"}) for i, t in enumerate(texts)], collection="hybrid")
+    results = await client.similarity_search("质量 7.3", top_k=2, collection="hybrid", mode="hybrid")
+    # 词法一路 7.3 条款排第一、质量方针第二
+    assert [r.text for r in results] == ["质量方针", "条款 7.3 设计开发"]
+    assert [r.rrf_score for r in results] == pytest.approx([1 / 61 + 1 / 62, 1 / 61])
+    assert [r.score for r in results] == pytest.approx([1.0, 0.6], abs=1e-5)
@@ -0,0 +1,86 @@
+"""
+单元测试：core/embedding_cache.py 内容寻址向量缓存
+"""
+import numpy as np
+from core.embedding import EmbeddingEngine
+from core.embedding_cache import CachedEmbeddingEngine, EmbeddingCache, content_key
+from core.models import EmbeddingConfig
+
+
+class CountingEngine(EmbeddingEngine):
+    def __init__(self):
+        super().__init__(EmbeddingConfig(dim=4))
+        self.embedded = []
+
+    def _embed_batch(self, texts):
+        self.embedded.extend(texts)
+        out = np.zeros((len(texts), 4), dtype=np.float32)
+        out[:, 0] = [len(t) for t in texts]
+        return out
+
+
+def test_content_key_normalizes_whitespace():
+    """仅空白/全半角差异的文本得到相同 key，不同模型 key 不同。"""
+    assert content_key("m", "质量  方针\n") == content_key("m", "质量 方针")
+    assert content_key("m", "ＡＢＣ") == content_key("m", "ABC")
+    assert content_key("m1", "质量") != content_key("m2", "质量")
+
+
+def test_cached_engine_skips_repeats(tmp_path):
+    """重复文本与已缓存文本不再调用底层引擎。"""
+    engine = CountingEngine()
+    cached = CachedEmbeddingEngine(engine, EmbeddingCache(str(tmp_path), dim=4, max_entries=16))
+    first = cached.embed(["页眉", "审批栏", "页眉"])
+    assert engine.embedded == ["页眉", "审批栏"]
+    second = cached.embed(["审批栏", "修订记录"])
+    assert engine.embedded == ["页眉", "审批栏", "修订记录"]
+    assert second[0][0] == first[1][0] == 3
+    assert cached.cache.stats()["hits"] == 1
+
+
+def test_cache_persists_across_reopen(tmp_path):
+    """重新打开后直接命中磁盘中的向量。"""
+    cache = EmbeddingCache(str(tmp_path), dim=4, max_entries=8)
+    key = content_key("m", "质量方针")
+    cache.put_many([key], np.array([[0.5, 0.25, 0, 0]], dtype=np.float32))
+    cache.close()
+    reopened = EmbeddingCache(str(tmp_path), dim=4, max_entries=8)
+    assert reopened.partition == 0
+    vec = reopened.get_many([key])[0]
+    assert vec.tolist() == [0.5, 0.25, 0, 0]
+
+
+def test_lru_eviction(tmp_path):
+    """容量满后淘汰最久未访问的条目。"""
+    cache = EmbeddingCache(str(tmp_path), dim=2, max_entries=2)
+    vec = np.ones((1, 2), dtype=np.float32)
+    cache.put_many([1], vec)
+    cache.put_many([2], vec)
+    cache.get_many([1])  # 1 变为最近访问
+    cache.put_many([3], vec)
+    assert set(cache.get_many([1, 2, 3]).keys()) == {0, 2}
+
+
+def test_concurrent_caches_use_separate_partitions(tmp_path):
+    """同时打开的缓存（如 API 与 worker 进程）各占一个分区，不互相覆盖槽位。"""
+    a = EmbeddingCache(str(tmp_path), dim=2, max_entries=4)
+    b = EmbeddingCache(str(tmp_path), dim=2, max_entries=4)
+    assert (a.partition, b.partition) == (0, 1)
+    a.put_many([1], np.ones((1, 2), dtype=np.float32))
+    b.put_many([2], np.zeros((1, 2), dtype=np.float32))
+    assert set(a.get_many([1, 2])) == {0}
+    a.close()
+    assert EmbeddingCache(str(tmp_path), dim=2, max_entries=4).partition == 0
+
+
+def test_cached_engine_does_not_flush_per_call(tmp_path):
+    """未命中时只回填内存映射，落盘由调用方按批触发。"""
+    cache = EmbeddingCache(str(tmp_path), dim=4, max_entries=8)
+    flushes = []
+    cache.flush = lambda: flushes.append(1)
+    cached = CachedEmbeddingEngine(CountingEngine(), cache)
+    cached.embed(["页眉"])
+    cached.embed(["审批栏"])
+    assert flushes == []
+    cached.flush()
+    assert flushes == [1]
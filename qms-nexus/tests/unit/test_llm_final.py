@@ -1,25 +1,34 @@
 """
 单元测试：core/llm.py 流式/非流式 + 热切换
 """
+import asyncio
+
+import httpx
 import pytest
 from unittest.mock import AsyncMock, patch
-from core.llm import LLMClient
+from core.config import settings
+from core.llm import CircuitBreaker, LLMClient, LLMUnavailableError
+
+
+def _client(handler, **kwargs) -> LLMClient:
+    """以 MockTransport 代替真实端点。"""
+    llm = LLMClient(base_url="http://fake", api_key="fake", **kwargs)
+    llm._client = httpx.AsyncClient(base_url="http://fake", transport=httpx.MockTransport(handler))
+    return llm
+
+
+@pytest.fixture(autouse=True)
+def _fast_retry(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_DELAY", 0.01)
 
 
 @pytest.mark.asyncio
 async def test_chat_non_stream():
     """非流式返回完整字符串。"""
-    llm = LLMClient(base_url="http://fake", api_key="fake", model="gpt-4")
-    # 模拟返回
-    async def mock_post(*a, **k):
-        resp = AsyncMock()
-        resp.status_code = 200
-        resp.json = AsyncMock(return_value={"choices": [{"message": {"content": "答案是 42。"}}]})
-        return resp
-
-    with patch.object(llm.client, "post", side_effect=mock_post):
-        answer = await llm.chat(system="QMS", user="ISO13485 核心？")
-        assert answer == "答案是 42。"
+    llm = _client(lambda request: httpx.Response(200, json={"choices": [{"message": {"content": "答案是 42。"}}]}))
+    answer = await llm.chat(system="QMS", user="ISO13485 核心？")
+    assert answer == "答案是 42。"
 
 
 @pytest.mark.asyncio
@@ -41,4 +50,106 @@ async def test_ping_fail():
     llm = LLMClient(base_url="http://fake", api_key="fake")
     with patch.object(llm.client, "get", side_effect=Exception("timeout")):
         ok = await llm.ping()
-        assert ok is False
\ No newline at end of file
+        assert ok is False
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_parses_sse_lines():
+    """流式逐行解析 SSE：跳过注释、仅含 role 的增量与空 choices，遇 [DONE] 结束。"""
+    body = (
+        ": keep-alive\n\n"
+        'data: {"choices": [{"delta": {"role": "assistant"}}]}\n\n'
+        'data: {"choices": [{"delta": {"content": "答案"}}]}\n\n'
+        'data: {"choices": []}\n\n'
+        'data:{"choices": [{"delta": {"content": "是 42。"}}]}\n\n'
+        "data: [DONE]\n\n"
+        'data: {"choices": [{"delta": {"content": "多余"}}]}\n\n'
+    )
+    llm = _client(lambda request: httpx.Response(200, text=body))
+    assert [piece async for piece in llm.chat_stream(system="QMS", user="ISO13485 核心？")] == ["答案", "是 42。"]
+
+
+@pytest.mark.asyncio
+async def test_retries_on_429_and_5xx_then_succeeds():
+    statuses = iter([429, 503])
+
+    def handler(request):
+        status = next(statuses, 200)
+        if status != 200:
+            return httpx.Response(status, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "好"}}]})
+
+    llm = _client(handler, max_retries=2)
+    assert await llm.chat(system="QMS", user="问") == "好"
+    assert llm.breaker.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_client_error_not_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, json={"error": "bad request"})
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await _client(handler, max_retries=3).chat(system="QMS", user="问")
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_fails_fast(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(settings, "LLM_BREAKER_RESET", 0.05)
+    healthy = False
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if healthy:
+            return httpx.Response(200, json={"choices": [{"message": {"content": "恢复"}}]})
+        return httpx.Response(502)
+
+    llm = _client(handler, max_retries=1)
+    with pytest.raises(LLMUnavailableError):
+        await llm.chat(system="QMS", user="问")
+    assert llm.breaker.state == CircuitBreaker.OPEN and len(calls) == 2
+    # 熔断期间不再访问上游
+    with pytest.raises(LLMUnavailableError) as exc:
+        await llm.chat(system="QMS", user="问")
+    assert len(calls) == 2 and 0 < exc.value.retry_after <= 0.05
+    # 熔断时长过后放行探测请求，成功即恢复
+    await asyncio.sleep(0.06)
+    healthy = True
+    assert await llm.chat(system="QMS", user="问") == "恢复"
+    assert llm.breaker.state == CircuitBreaker.CLOSED
+
+
+class _BrokenBody(httpx.AsyncByteStream):
+    """响应头正常，正文读到一半超时。"""
+
+    def __init__(self, first: bytes):
+        self.first = first
+
+    async def __aiter__(self):
+        yield self.first
+        raise httpx.ReadTimeout("正文读取超时")
+
+
+@pytest.mark.asyncio
+async def test_body_read_error_counts_against_breaker(monkeypatch):
+    """收到响应头后正文读取失败：计入熔断并抛 LLMUnavailableError，不泄漏 httpx 异常。"""
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURES", 2)
+    llm = _client(lambda request: httpx.Response(200, stream=_BrokenBody(b'{"choices": [')))
+    with pytest.raises(LLMUnavailableError):
+        await llm.chat(system="QMS", user="问")
+    assert llm.breaker.state == CircuitBreaker.CLOSED
+    llm = _client(lambda request: httpx.Response(200, stream=_BrokenBody('data: {"choices": [{"delta": {"content": "答"}}]}\n\n'.encode())))
+    pieces = []
+    with pytest.raises(LLMUnavailableError):
+        async for piece in llm.chat_stream(system="QMS", user="问"):
+            pieces.append(piece)
+    assert pieces == ["答"]
+    with pytest.raises(LLMUnavailableError):
+        await llm.chat(system="QMS", user="问")
+    assert llm.breaker.state == CircuitBreaker.OPEN
@@ -0,0 +1,161 @@
+"""
+单元测试：core/llm_router.py 多后端路由（按延迟择优、失败切换、费用上限、对冲）
+"""
+import asyncio
+
+import pytest
+
+from core.llm import CircuitBreaker, LLMClient, LLMUnavailableError
+from core.llm_router import Backend, LLMRouter, create_llm
+from core.models import LLMBackendConfig, LLMConfig
+
+
+class _FakeClient:
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+        self.stream_closed = 0
+        self.breaker = CircuitBreaker(name)
+
+    async def chat(self, system, user, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise LLMUnavailableError(f"{self.name} 不可用")
+        return f"{self.name} 的答案"
+
+    async def chat_stream(self, system, user, **kwargs):
+        if self.fail:
+            raise LLMUnavailableError(f"{self.name} 不可用")
+        try:
+            for piece in [self.name, "答案"]:
+                yield piece
+        finally:
+            self.stream_closed += 1
+
+    async def ping(self):
+        return not self.fail
+
+    async def close(self):
+        pass
+
+
+def _router(*clients, **config) -> LLMRouter:
+    backends = [Backend(LLMBackendConfig(name=c.name, base_url=f"http://{c.name}"), c) for c in clients]
+    return LLMRouter(backends, LLMConfig(**config))
+
+
+@pytest.mark.asyncio
+async def test_routes_to_lowest_latency():
+    fast, slow = _FakeClient("fast", 0.01), _FakeClient("slow", 0.05)
+    router = _router(slow, fast)
+    for _ in range(4):
+        await router.chat(system="s", user="u")
+    # 各试探一次后都走较快的后端
+    assert slow.calls == 1 and fast.calls == 3
+    assert router.ranked()[0].name == "fast"
+
+
+def test_weight_and_error_rate_affect_score():
+    a, b = Backend(LLMBackendConfig(name="a", base_url="http://a"), _FakeClient("a")), \
+        Backend(LLMBackendConfig(name="b", base_url="http://b", weight=4), _FakeClient("b"))
+    a.record(1.0)
+    b.record(2.0)
+    assert b.score(4.0) < a.score(4.0)  # 权重 4 抵消 2 倍延迟
+    b.record(None)
+    b.record(None)
+    assert b.error_rate == pytest.approx(0.36) and b.score(4.0) > a.score(4.0)
+
+
+@pytest.mark.asyncio
+async def test_failover_and_open_breaker_skipped():
+    down, up = _FakeClient("down", fail=True), _FakeClient("up", 0.01)
+    router = _router(down, up)
+    assert await router.chat(system="s", user="u") == "up 的答案"
+    down.breaker._opened_at, down.breaker.state = 1e18, CircuitBreaker.OPEN
+    assert [b.name for b in router.ranked()] == ["up"]
+    up.breaker._opened_at, up.breaker.state = 1e18, CircuitBreaker.OPEN
+    with pytest.raises(LLMUnavailableError):
+        await router.chat(system="s", user="u")
+
+
+@pytest.mark.asyncio
+async def test_hourly_cost_cap_excludes_backend():
+    client = _FakeClient("paid")
+    backend = Backend(
+        LLMBackendConfig(name="paid", base_url="http://paid", cost_per_1k_tokens=1000, hourly_cost_cap=1), client
+    )
+    router = LLMRouter([backend, Backend(LLMBackendConfig(name="free", base_url="http://free"), _FakeClient("free"))])
+    backend.record(0.0)  # 首次请求前确保排在前面
+    assert await router.chat(system="质量方针", user="请回答") == "paid 的答案"
+    assert backend.spent >= 1
+    assert [b.name for b in router.ranked()] == ["free"]
+
+
+@pytest.mark.asyncio
+async def test_hedge_after_p90_first_answer_wins():
+    primary, backup = _FakeClient("primary", 0.01), _FakeClient("backup", 0.01)
+    router = _router(primary, backup, hedge=True, hedge_min_delay=0)
+    p, b = router.backends
+    for _ in range(10):
+        p.record(0.01)
+    b.record(0.02)
+    primary.delay = 1.0  # 首选后端突然变慢：超过 p90 后对冲
+    assert await router.chat(system="s", user="u") == "backup 的答案"
+    await asyncio.sleep(0)
+    assert primary.cancelled == 1 and backup.calls == 1
+    assert p.latency > 0.01  # 落败被取消的耗时作为下界抬高延迟估计
+    # 首选后端在 p90 内返回时不发对冲请求
+    primary.delay = 0.0
+    router.backends[0].latency = 0.0
+    assert await router.chat(system="s", user="u") == "primary 的答案"
+    assert backup.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_fails_over_before_first_piece():
+    router = _router(_FakeClient("down", fail=True), _FakeClient("up"))
+    assert [piece async for piece in router.chat_stream(system="s", user="u")] == ["up", "答案"]
+
+
+def test_create_llm_without_backends_is_single_client():
+    assert isinstance(create_llm(LLMConfig()), LLMClient)
+    router = create_llm(LLMConfig(backends=[{"name": "local", "base_url": "http://ollama:11434/v1", "api_key_env": None}]))
+    assert isinstance(router, LLMRouter) and router.backends[0].client.base_url == "http://ollama:11434/v1"
+
+
+@pytest.mark.asyncio
+async def test_stream_closed_early_closes_backend_stream():
+    up = _FakeClient("up")
+    stream = _router(up).chat_stream(system="s", user="u")
+    assert await stream.__anext__() == "up"
+    await stream.aclose()
+    assert up.stream_closed == 1
+
+
+def test_censored_latency_only_raises_estimate():
+    backend = Backend(LLMBackendConfig(name="a", base_url="http://a"), _FakeClient("a"))
+    backend.record(1.0)
+    backend.record_censored(0.5)
+    assert backend.latency == 1.0 and len(backend.recent) == 1
+    backend.record_censored(2.0)
+    assert backend.latency == pytest.approx(1.2) and backend.error_rate == 0.0
+
+
+@pytest.mark.asyncio
+async def test_always_failing_backend_is_demoted():
+    """从未成功的后端只试探一次：失败后按 prior_latency 与错误率排到健康后端之后。"""
+    down, up = _FakeClient("down", fail=True), _FakeClient("up", 0.01)
+    router = _router(down, up)
+    for _ in range(5):
+        assert await router.chat(system="s", user="u") == "up 的答案"
+    assert down.calls == 1 and up.calls == 5
+    assert [b.name for b in router.ranked()] == ["up", "down"]
+    assert router.backends[0].latency == LLMConfig().prior_latency
@@ -0,0 +1,77 @@
+"""
+单元测试：scripts/llm_stub_server.py 替身大模型服务（真实 LLMClient 经 HTTP 访问）
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+import pytest_asyncio
+pytest.importorskip("aiohttp")  # 替身服务基于 aiohttp，未安装时跳过整文件
+
+from core.config import settings
+from core.llm import LLMClient, LLMUnavailableError
+from scripts.llm_stub_server import StubConfig, fault, start
+
+
+@pytest_asyncio.fixture
+async def stub():
+    config = StubConfig(ttft=0.05, tps=200, tokens=8)
+    runner, base_url = await start(config)
+    yield config, base_url
+    await runner.cleanup()
+
+
+@pytest.fixture(autouse=True)
+def _fast_retry(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_DELAY", 0.01)
+
+
+@pytest.mark.asyncio
+async def test_chat_stream_and_models(stub):
+    config, base_url = stub
+    llm = LLMClient(base_url=base_url, api_key="stub")
+    t0 = time.perf_counter()
+    pieces = [piece async for piece in llm.chat_stream(system="s", user="u")]
+    assert len(pieces) == 8 and "".join(pieces).startswith("质量管理体系")
+    # 首字延迟 + 7 个 token 间隔
+    assert time.perf_counter() - t0 >= config.ttft + 7 / config.tps
+    assert await llm.chat(system="s", user="u", max_tokens=3) == "质量管理体系"
+    assert await llm.ping() is True
+    await llm.close()
+
+
+@pytest.mark.asyncio
+async def test_faults_are_deterministic_and_configurable(stub):
+    config, base_url = stub
+    config.rate_429, config.error_rate = 0.2, 0.1
+    assert [fault(config, n) for n in range(1, 200)] == [fault(config, n) for n in range(1, 200)]
+    codes = [fault(config, n) for n in range(1, 2001)]
+    assert 300 < codes.count(429) < 500 and 100 < codes.count(500) < 300
+    # 按次修改参数：全部 429，LLMClient 重试耗尽后不可用
+    async with httpx.AsyncClient() as http:
+        await http.post(base_url.replace("/v1", "/config"), json={"rate_429": 1.0, "retry_after": 0})
+        llm = LLMClient(base_url=base_url, api_key="stub", max_retries=1)
+        with pytest.raises(LLMUnavailableError):
+            await llm.chat(system="s", user="u")
+        stats = (await http.get(base_url.replace("/v1", "/stats"))).json()
+    assert stats["requests"] == 2 and stats["throttled"] == 2
+    await llm.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_streams(stub, monkeypatch):
+    config, base_url = stub
+    monkeypatch.setattr(settings, "LLM_MAX_CONNECTIONS", 300)
+    llm = LLMClient(base_url=base_url, api_key="stub")
+
+    async def one():
+        return [piece async for piece in llm.chat_stream(system="s", user="u")]
+
+    results = await asyncio.gather(*(one() for _ in range(300)))
+    assert all(len(pieces) == 8 for pieces in results)
+    async with httpx.AsyncClient() as http:
+        stats = (await http.get(base_url.replace("/v1", "/stats"))).json()
+    assert stats["completed"] == 300 and stats["peak"] > 1
+    await llm.close()
@@ -0,0 +1,132 @@
+"""
+单元测试：core/ollama.py 本地 Ollama 适配（原生流式、keep_alive、预热、按模型限流）
+以 ASGITransport 挂载的本地替身代替真实 Ollama。
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from core.config import settings
+from core.llm import LLMUnavailableError
+from core.llm_router import LLMRouter, create_llm
+from core.models import LLMConfig
+from core.ollama import OllamaClient, _keep_alive
+
+
+def _stand_in(delay: float = 0.0):
+    """模拟 Ollama：记录请求体与同时进行的请求数。"""
+    app = FastAPI()
+    app.state.requests, app.state.active, app.state.peak = [], 0, 0
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        app.state.requests.append(body)
+        app.state.active += 1
+        app.state.peak = max(app.state.peak, app.state.active)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            app.state.active -= 1
+        pieces = ["设计", "输入"]
+        if not body["stream"]:
+            return {"message": {"role": "assistant", "content": "".join(pieces)}, "done": True, "load_duration": 5_000_000}
+
+        async def lines():
+            for piece in pieces:
+                yield json.dumps({"message": {"role": "assistant", "content": piece}, "done": False}) + "\n"
+            yield json.dumps({"message": {"role": "assistant", "content": ""}, "done": True, "load_duration": 0}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        app.state.requests.append(body)
+        return {"model": body["model"], "response": "", "done": True, "load_duration": 12_000_000_000}
+
+    @app.get("/api/tags")
+    async def tags():
+        return JSONResponse({"models": []})
+
+    return app
+
+
+def _client(app, model: str, **kwargs) -> OllamaClient:
+    llm = OllamaClient(base_url="http://ollama", model=model, **kwargs)
+    llm._client = httpx.AsyncClient(base_url="http://ollama", transport=httpx.ASGITransport(app=app))
+    return llm
+
+
+@pytest.mark.asyncio
+async def test_chat_and_stream_use_native_api_with_keep_alive():
+    app = _stand_in()
+    llm = _client(app, "qwen-a", keep_alive="-1")
+    assert await llm.chat(system="QMS", user="设计输入？") == "设计输入"
+    assert [piece async for piece in llm.chat_stream(system="QMS", user="设计输入？")] == ["设计", "输入"]
+    first, second = app.state.requests
+    assert first["stream"] is False and second["stream"] is True
+    assert first["keep_alive"] == -1 and first["model"] == "qwen-a"
+    assert first["messages"][0] == {"role": "system", "content": "QMS"}
+    assert await llm.ping() is True
+
+
+@pytest.mark.asyncio
+async def test_warm_up_loads_model_without_prompt():
+    app = _stand_in()
+    llm = _client(app, "qwen-b")
+    assert await llm.warm_up() is True
+    assert app.state.requests == [{"model": "qwen-b", "keep_alive": "30m"}]
+    # llm.backends 中 kind: ollama 的后端使用原生 API 客户端
+    router = create_llm(LLMConfig(backends=[{"name": "local", "kind": "ollama", "base_url": "http://ollama", "model": "qwen-b"}]))
+    assert isinstance(router, LLMRouter) and isinstance(router.backends[0].client, OllamaClient)
+
+
+@pytest.mark.asyncio
+async def test_stream_error_line_raises():
+    app = FastAPI()
+
+    @app.post("/api/chat")
+    async def chat():
+        return StreamingResponse(iter([json.dumps({"error": "model not found"}) + "\n"]))
+
+    with pytest.raises(LLMUnavailableError):
+        [piece async for piece in _client(app, "qwen-c").chat_stream(system="s", user="u")]
+
+
+@pytest.mark.asyncio
+async def test_per_model_concurrency_and_bounded_queue(monkeypatch):
+    monkeypatch.setattr(settings, "OLLAMA_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(settings, "OLLAMA_MAX_QUEUE", 2)
+    app = _stand_in(delay=0.05)
+    # 同一模型的多个客户端实例共用闸门
+    clients = [_client(app, "qwen-d") for _ in range(6)]
+    assert clients[0].gate is clients[5].gate
+    results = await asyncio.gather(*(c.chat(system="s", user="u") for c in clients), return_exceptions=True)
+    assert app.state.peak == 2
+    assert sum(isinstance(r, LLMUnavailableError) for r in results) == 2
+    assert results.count("设计输入") == 4
+    assert clients[0].gate.active == 0 and clients[0].gate.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_non_stream_timeout_not_retried(monkeypatch):
+    """非流式请求超时不重试（重试等于重新生成）；流式请求超时按 OLLAMA_MAX_RETRIES 重试。"""
+    monkeypatch.setattr(settings, "OLLAMA_FIRST_BYTE_TIMEOUT", 0.05)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.01)
+    app = _stand_in(delay=0.3)
+    with pytest.raises(LLMUnavailableError):
+        await _client(app, "qwen-t1", max_retries=2).chat(system="s", user="u")
+    assert len(app.state.requests) == 1
+    with pytest.raises(LLMUnavailableError):
+        [piece async for piece in _client(app, "qwen-t2", max_retries=2).chat_stream(system="s", user="u")]
+    assert len(app.state.requests) == 4
+
+
+def test_keep_alive_values():
+    assert _keep_alive("30m") == "30m"
+    assert _keep_alive("-1") == -1 and _keep_alive("600") == 600
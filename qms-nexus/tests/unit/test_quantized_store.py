@@ -0,0 +1,144 @@
+"""
+单元测试：core/quantized_store.py 量化向量存储
+"""
+import numpy as np
+import pytest
+from core.quantized_store import QuantizedVectorStore
+
+
+def _data(n: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    """带簇结构的向量，接近真实语义向量分布。"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, dim))
+    return (centers[rng.integers(0, 20, n)] + rng.normal(scale=0.5, size=(n, dim))).astype(np.float32)
+
+
+def _recall(store: QuantizedVectorStore, x: np.ndarray, queries: np.ndarray, k: int = 5) -> float:
+    xn = x / np.linalg.norm(x, axis=1, keepdims=True)
+    qn = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = np.argsort(-(qn @ xn.T), axis=1)[:, :k]
+    hits = store.search(queries, k)
+    return float(np.mean([len({int(i[1:]) for i, _ in h} & set(t.tolist())) / k for h, t in zip(hits, truth)]))
+
+
+@pytest.mark.parametrize("method,truncate", [("int8", 0), ("int8", 24), ("pq", 0)])
+def test_recall_after_rerank(tmp_path, method, truncate):
+    """压缩码召回 + 全精度重排后 recall@5 接近精确检索。"""
+    data = _data(2020)
+    x, queries = data[:2000], data[2000:]
+    store = QuantizedVectorStore(str(tmp_path), 32, method=method, truncate_dim=truncate, pq_subspaces=8, train_size=500)
+    store.add([f"c{i}" for i in range(len(x))], x)
+    assert store.stats()["codes_bytes"] == 2000 * store.code_size
+    assert _recall(store, x, queries) >= 0.95
+
+
+def test_overwrite_remove_and_filter(tmp_path):
+    x = _data(4)
+    store = QuantizedVectorStore(str(tmp_path), 32, train_size=256)
+    store.add(["a", "b"], x[:2])
+    store.add(["a"], x[2:3])  # 覆盖：a 指向新行
+    assert store.search(x[2:3], 1)[0][0][0] == "a"
+    assert store.search(x[0:1], 2, accept={"b"})[0][0][0] == "b"
+    store.remove(["a"])
+    assert [doc_id for doc_id, _ in store.search(x[2:3], 5)[0]] == ["b"]
+
+
+def test_refresh_loads_other_writer(tmp_path):
+    """其他进程追加的向量与训练好的量化器可增量加载；清空后整体重载。"""
+    x = _data(600)
+    writer = QuantizedVectorStore(str(tmp_path), 32, train_size=256)
+    reader = QuantizedVectorStore(str(tmp_path), 32, train_size=256)
+    writer.add([f"c{i}" for i in range(600)], x)
+    writer.commit()
+    reader.refresh()
+    assert len(reader) == 600 and reader.stats()["codes_bytes"] == 600 * 32
+    assert reader.search(x[7:8], 1)[0][0][0] == "c7"
+    writer.clear()
+    reader.refresh()
+    assert len(reader) == 0 and reader.search(x[:1], 1) == [[]]
+
+
+def test_ivf_probe_expands_for_filter(tmp_path):
+    """只探测 1 个桶时，过滤集合落在别的桶里也能扩大范围找到。"""
+    x = _data(2000)
+    store = QuantizedVectorStore(str(tmp_path), 32, train_size=500, nprobe=1)
+    store.add([f"c{i}" for i in range(2000)], x)
+    assert store.nlist > 1
+    qt = store._truncate(x[:1] / np.linalg.norm(x[:1]))[0]
+    first = store._lists[0]
+    far = next(i for i in range(2000) if store._lists[i] != first)
+    assert store.search(x[0:1], 1)[0][0][0] == "c0"
+    assert store.search(x[0:1], 1, accept={f"c{far}"})[0][0][0] == f"c{far}"
+    assert len(store._probe(qt, 2000, 1)) < 2000
+
+
+def test_concurrent_writers_get_disjoint_rows(tmp_path):
+    """两个写入者（如 API 与 worker 进程）同时追加，行号不重叠，id 取回的是自己的向量。"""
+    import threading
+
+    stores = [QuantizedVectorStore(str(tmp_path), 8, train_size=10000) for _ in range(2)]
+    data = {w: _data(200, dim=8, seed=w + 1) for w in range(2)}
+
+    def write(w):
+        for i in range(0, 200, 5):
+            stores[w].add([f"w{w}-{j}" for j in range(i, i + 5)], data[w][i:i + 5])
+        stores[w].commit()
+
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    reader = QuantizedVectorStore(str(tmp_path), 8, train_size=10000)
+    assert reader.stats()["rows"] == 400
+    for w in range(2):
+        ids, vecs = reader.get_vectors([f"w{w}-{j}" for j in range(200)])
+        expected = data[w] / np.linalg.norm(data[w], axis=1, keepdims=True)
+        assert len(ids) == 200 and np.allclose(vecs, expected, atol=1e-6)
+
+
+def test_stats_counts_row_map(tmp_path):
+    """常驻内存计入 id → 行号映射，不只是压缩码与存活标记。"""
+    store = QuantizedVectorStore(str(tmp_path), 32, train_size=500)
+    store.add([f"{i:036d}" for i in range(1000)], _data(1000))
+    stats = store.stats()
+    assert stats["resident_bytes"] - stats["codes_bytes"] - 1000 * 2 > 1000 * 100
+
+
+def test_vacuum_reclaims_dead_rows(tmp_path):
+    """反复覆盖写入后失效行超过阈值：commit 时重写为存活行，其他实例整体重载后结果一致。"""
+    x = _data(300)
+    writer = QuantizedVectorStore(str(tmp_path), 32, train_size=256, vacuum_ratio=0.3, vacuum_min_rows=250)
+    reader = QuantizedVectorStore(str(tmp_path), 32, train_size=256)
+    ids = [f"c{i}" for i in range(100)]
+    for _ in range(3):  # 同一批文档重新上传三次
+        writer.add(ids, x[:100])
+        writer.commit()
+    writer.add(ids[:50], x[100:150])
+    writer.remove(ids[50:60])
+    reader.refresh()
+    assert reader.stats()["rows"] == 350
+    writer.commit()
+    stats = writer.stats()
+    assert stats["rows"] == 90 and stats["dead_rows"] == 0 and stats["codes_bytes"] == 90 * 32
+    assert (tmp_path / "vectors.f32").stat().st_size == 90 * 32 * 4
+    reader.refresh()
+    assert len(reader) == 90 and reader.stats()["rows"] == 90
+    for store in (writer, reader):
+        assert store.search(x[100:101], 1)[0][0][0] == "c0"
+        assert store.search(x[70:71], 1)[0][0][0] == "c70"
+        assert "c55" not in {doc_id for doc_id, _ in store.search(x[55:56], 5)[0]}
+    # 重写后继续追加，行号从存活行之后分配
+    writer.add(["new"], x[200:201])
+    writer.commit()
+    reader.refresh()
+    assert reader.search(x[200:201], 1)[0][0][0] == "new"
+    assert QuantizedVectorStore(str(tmp_path), 32, train_size=256).search(x[100:101], 1)[0][0][0] == "c0"
+
+
+def test_stats_count_live_rows_only(tmp_path):
+    store = QuantizedVectorStore(str(tmp_path), 32, train_size=256, vacuum_min_rows=10_000)
+    store.add([f"c{i}" for i in range(300)], _data(300))
+    store.remove([f"c{i}" for i in range(100)])
+    stats = store.stats()
+    assert stats["codes_bytes"] == 200 * 32 and stats["dead_rows"] == 100 and stats["disk_bytes"] == 200 * 32 * 4
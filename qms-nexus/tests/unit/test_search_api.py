@@ -0,0 +1,38 @@
+"""
+单元测试：api/routes/search.py 检索接口返回字段
+"""
+from fastapi.testclient import TestClient
+
+from api.main import app
+from api.routes import search as search_route
+from core.models import SearchResult
+
+
+def _hits():
+    return [
+        SearchResult(text="设计输入", score=0.6, source="[来源：a.pdf, 第1页]", tags=[], rrf_score=1 / 61 + 1 / 62),
+        SearchResult(text="设计评审", score=0.9, source="[来源：b.pdf, 第2页]", tags=[], rrf_score=1 / 62),
+    ]
+
+
+def test_hybrid_search_returns_rrf_score(monkeypatch):
+    """混合检索按 rrf_score 排序，接口同时返回 rrf_score 与余弦 score。"""
+    calls = []
+
+    async def similarity_search(q, top_k, filter_tags, mode, tag_expr):
+        calls.append(mode)
+        return _hits()
+
+    async def similarity_search_many(queries, top_k, filter_tags, mode, tag_expr):
+        return [_hits() for _ in queries]
+
+    monkeypatch.setattr(search_route.client, "similarity_search", similarity_search)
+    monkeypatch.setattr(search_route.client, "similarity_search_many", similarity_search_many)
+    client = TestClient(app)
+    resp = client.get("/search", params={"q": "设计输入", "mode": "hybrid"})
+    assert resp.status_code == 200 and calls == ["hybrid"]
+    data = resp.json()
+    assert [r["rrf_score"] for r in data] == [1 / 61 + 1 / 62, 1 / 62]
+    assert [r["score"] for r in data] == [0.6, 0.9]
+    resp = client.post("/search/batch", json={"queries": ["设计输入"], "mode": "hybrid"})
+    assert resp.json()[0]["results"][0]["rrf_score"] == 1 / 61 + 1 / 62
@@ -0,0 +1,64 @@
+"""
+单元测试：core/search_cache.py 检索结果缓存与索引代数失效
+"""
+import pytest
+from core.models import Chunk
+from core.search_cache import normalize_query
+
+
+class _CountingCollection:
+    def __init__(self):
+        self.queries = 0
+        self.version = 0
+
+    def query(self, query_texts, n_results):
+        self.queries += 1
+        return {
+            "ids": [[f"v{self.version}"] for _ in query_texts],
+            "documents": [["段落"] for _ in query_texts],
+            "metadatas": [[{"filename": "a.pdf"}] for _ in query_texts],
+            "distances": [[0.1] for _ in query_texts],
+        }
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.version += 1
+
+
+@pytest.fixture
+def make_client(make_vectordb):
+    def make(coll):
+        client = make_vectordb(coll)
+        client.embedder = None
+        return client
+
+    return make
+
+
+def test_normalize_query():
+    assert normalize_query("  CAPA　 流程 ") == normalize_query("ＣＡＰＡ 流程") == "CAPA 流程"
+
+
+@pytest.mark.asyncio
+async def test_hit_and_invalidate_across_processes(make_client):
+    """重复查询命中缓存；另一进程写入后代数递增，不再返回旧结果。"""
+    coll = _CountingCollection()
+    api = make_client(coll)
+    worker = make_client(coll)
+    assert (await api.similarity_search("质量方针"))[0].id == "v0"
+    await api.similarity_search_many(["质量方针", " 质量方针 ", "设计评审"])
+    assert coll.queries == 2  # 第二次只检索未命中的“设计评审”
+
+    await worker.upsert_chunks([Chunk(id="c1", text="新段落", metadata={"filename": "a.pdf"})])
+    assert (await api.similarity_search("质量方针"))[0].id == "v1"
+    assert coll.queries == 3
+
+
+@pytest.mark.asyncio
+async def test_bypass_when_redis_down(make_client, fake_redis):
+    """Redis 不可用时不使用缓存，每次都检索。"""
+    fake_redis.down = True
+    coll = _CountingCollection()
+    client = make_client(coll)
+    await client.similarity_search("质量方针")
+    await client.similarity_search("质量方针")
+    assert coll.queries == 2
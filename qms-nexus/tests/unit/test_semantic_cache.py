@@ -0,0 +1,112 @@
+"""
+单元测试：core/semantic_cache.py 语义答案缓存及 RAGService 接入
+"""
+import numpy as np
+import pytest
+from core.rag_service import RAGService
+from core.corrections import CorrectionStore
+from core.models import SearchResult
+from core.semantic_cache import CachedAnswer, SemanticAnswerCache
+from core.single_flight import SingleFlight
+from services.context_builder import ContextBuilder
+
+
+def _vec(*values):
+    return np.asarray(values, dtype=np.float32)
+
+
+def test_threshold_and_eviction():
+    cache = SemanticAnswerCache(dim=2, max_entries=2, threshold=0.9)
+    cache.put(_vec(1, 0), CachedAnswer("设计开发的要求是什么", "答案A", [], {}))
+    cache.put(_vec(0, 1), CachedAnswer("CAPA 流程", "答案B", [], {}))
+    assert cache.lookup(_vec(1, 0.1))[1].answer == "答案A"  # 余弦约 0.995
+    assert cache.lookup(_vec(1, 1)) is None  # 余弦约 0.707，低于阈值
+    # 满后淘汰最久未命中的“CAPA 流程”
+    cache.put(_vec(-1, 0), CachedAnswer("质量方针", "答案C", [], {}))
+    assert len(cache) == 2
+    assert cache.lookup(_vec(0, 1)) is None
+
+
+def test_ttl_expire():
+    cache = SemanticAnswerCache(dim=2, ttl=0)
+    cache.put(_vec(1, 0), CachedAnswer("q", "a", [], {}))
+    assert cache.lookup(_vec(1, 0)) is None
+    assert len(cache) == 0
+
+
+class _FakeEmbedder:
+    def embed(self, texts):
+        # 两个释义问题映射到相近向量
+        return np.asarray([[1.0, 0.05] if "设计" in t else [0.0, 1.0] for t in texts], dtype=np.float32)
+
+
+class _FakeExecutor:
+    async def read(self, op, fn, *args):
+        return fn(*args)
+
+
+class _FakeDB:
+    def __init__(self):
+        self.embedder = _FakeEmbedder()
+        self.executor = _FakeExecutor()
+        self.versions = {"a.pdf": (1, 1)}
+        self.searches = 0
+
+    async def similarity_search(self, question, top_k):
+        self.searches += 1
+        return [
+            SearchResult(id="c1", text="段落", score=0.9, source="[来源：a.pdf, 第1页]", tags=[], metadata={"filename": "a.pdf"})
+        ]
+
+    async def document_versions(self, filenames):
+        return {f: self.versions.get(f) for f in filenames}
+
+
+class _FakeCache:
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, ttl=None, documents=()):
+        pass
+
+    async def acquire(self, key, ttl):
+        return "token"
+
+    async def release(self, key, token):
+        pass
+
+
+class _FakeLLM:
+    def __init__(self):
+        self.calls = 0
+
+    async def chat(self, system, user):
+        self.calls += 1
+        return f"答案{self.calls}"
+
+
+class _FakePrompt:
+    def render(self, variables):
+        return variables["question"]
+
+
+def _service() -> RAGService:
+    service = RAGService.__new__(RAGService)
+    service.db, service.llm, service.prompt, service.cache = _FakeDB(), _FakeLLM(), _FakePrompt(), _FakeCache()
+    service.flight = SingleFlight()
+    service.context = ContextBuilder()
+    service.corrections = CorrectionStore(":memory:")
+    service.semantic = SemanticAnswerCache(dim=2, threshold=0.95)
+    return service
+
+
+@pytest.mark.asyncio
+async def test_paraphrase_reuses_answer_until_source_updated():
+    service = _service()
+    assert (await service.answer("设计开发的要求是什么"))[0] == "答案1"
+    assert (await service.answer("设计和开发有哪些要求"))[0] == "答案1"
+    assert service.llm.calls == 1 and service.db.searches == 1
+    # 来源文档重新入库后版本变化，缓存答案失效
+    service.db.versions["a.pdf"] = (1, 2)
+    assert (await service.answer("设计和开发有哪些要求"))[0] == "答案2"
+    assert (await service.answer("CAPA 流程"))[0] == "答案3"
@@ -0,0 +1,118 @@
+"""
+单元测试：core/single_flight.py 请求合并及 RAGService 跨副本租约
+"""
+import asyncio
+
+import pytest
+from core.corrections import CorrectionStore
+from core.models import SearchResult
+from core.rag_service import RAGService
+from core.single_flight import SingleFlight
+from services.context_builder import ContextBuilder
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "答案"
+
+    results = await asyncio.gather(*(flight.do("质量方针", work) for _ in range(30)))
+    assert calls == 1
+    assert [shared for _, shared in results].count(False) == 1
+    assert all(r == "答案" for r, _ in results)
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_leader_cancel_does_not_fail_followers():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return 42
+
+    leader = asyncio.ensure_future(flight.do("k", work))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flight.do("k", work))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert (await follower) == (42, True)
+
+
+class _SharedRedis:
+    """两个副本共用的字典版缓存，实现 RAGService 用到的接口。"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ttl=None, documents=()):
+        self.data[key] = value
+
+    async def exists(self, key):
+        return key in self.data
+
+    async def acquire(self, key, ttl):
+        if key in self.data:
+            return None
+        self.data[key] = "token"
+        return "token"
+
+    async def release(self, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+
+
+class _SlowLLM:
+    def __init__(self):
+        self.calls = 0
+
+    async def chat(self, system, user):
+        self.calls += 1
+        await asyncio.sleep(0.1)
+        return "答案"
+
+
+class _FakeDB:
+    embedder = None
+
+    async def similarity_search(self, question, top_k):
+        return [SearchResult(text="段落", score=0.9, source="[来源：a.pdf, 第1页]", tags=[])]
+
+    async def document_versions(self, filenames):
+        return {}
+
+
+class _FakePrompt:
+    def render(self, variables):
+        return variables["question"]
+
+
+def _replica(cache, llm) -> RAGService:
+    service = RAGService.__new__(RAGService)
+    service.db, service.llm, service.prompt, service.cache = _FakeDB(), llm, _FakePrompt(), cache
+    service.semantic = None
+    service.flight = SingleFlight()
+    service.context = ContextBuilder()
+    service.corrections = CorrectionStore(":memory:")
+    return service
+
+
+@pytest.mark.asyncio
+async def test_replicas_coalesce_through_lease(monkeypatch):
+    """两个副本各收到 10 个相同问题：只调用一次大模型，租约随后释放。"""
+    monkeypatch.setattr("core.rag_service.settings.ASK_LEASE_POLL", 0.01)
+    cache, llm = _SharedRedis(), _SlowLLM()
+    a, b = _replica(cache, llm), _replica(cache, llm)
+    answers = await asyncio.gather(*(r.answer("质量方针是什么 ") for r in [a, b] * 10))
+    assert llm.calls == 1
+    assert all(ans == ("答案", ["[来源：a.pdf, 第1页]"]) for ans in answers)
+    assert list(cache.data) == ["q:质量方针是什么"]
@@ -0,0 +1,77 @@
+"""
+单元测试：core/bitmap.py 压缩位图与 core/tag_index.py 标签表达式预过滤
+"""
+import random
+
+import pytest
+from core.bitmap import RoaringBitmap
+from core.tag_index import TagIndex, parse_tag_expr
+
+
+def test_bitmap_ops_match_python_sets():
+    """数组容器与位图容器混合运算，结果与 Python 集合一致。"""
+    rng = random.Random(7)
+    for size_a, size_b in [(10, 20), (6000, 30), (50000, 8000)]:
+        a = set(rng.sample(range(200000), size_a))
+        b = set(rng.sample(range(200000), size_b))
+        ba, bb = RoaringBitmap(a), RoaringBitmap(b)
+        assert set((ba & bb).to_array().tolist()) == a & b
+        assert set((ba | bb).to_array().tolist()) == a | b
+        assert set((ba - bb).to_array().tolist()) == a - b
+        assert len(ba) == len(a)
+    bm = RoaringBitmap([1, 70000])
+    bm.discard_many([1])
+    assert 1 not in bm and 70000 in bm
+
+
+def test_parse_precedence_and_quotes():
+    """NOT > AND > OR，双引号包裹含空格的标签。"""
+    assert parse_tag_expr('A OR B AND NOT "C D"') == (
+        "or", ("tag", "A"), ("and", ("tag", "B"), ("not", ("tag", "C D")))
+    )
+    for bad in ["", "A AND", "(A OR B", "A B", "AND A"]:
+        with pytest.raises(ValueError):
+            parse_tag_expr(bad)
+
+
+def _index(path=None) -> TagIndex:
+    idx = TagIndex(path)
+    idx.set_tags(
+        ["c1", "c2", "c3", "c4"],
+        [["设计文档"], ["设计文档", "作废"], ["风险分析"], []],
+    )
+    return idx
+
+
+def test_select_expressions():
+    idx = _index()
+    assert sorted(idx.select("设计文档 AND NOT 作废").ids()) == ["c1"]
+    assert sorted(idx.select(["作废", "风险分析"]).ids()) == ["c2", "c3"]
+    assert sorted(idx.select("NOT (设计文档 OR 风险分析)").ids()) == ["c4"]
+    assert "c3" in idx.select("风险分析") and "c1" not in idx.select("风险分析")
+    assert len(idx.select("不存在的标签")) == 0
+
+
+def test_retag_and_remove():
+    """改标签覆盖旧标签；删除后 NOT 也不再返回该 chunk。"""
+    idx = _index()
+    hits = idx.select("设计文档")
+    idx.set_tags(["c1"], [["风险分析"]])
+    assert sorted(hits.ids()) == ["c1", "c2"]  # 已求值的结果不受后续写入影响
+    assert sorted(idx.select("设计文档").ids()) == ["c2"]
+    idx.remove(["c4"])
+    assert idx.select("NOT 设计文档").ids() == ["c1", "c3"]
+    assert idx.counts() == {"设计文档": 1, "作废": 1, "风险分析": 2}
+
+
+def test_segments_persist_and_refresh(tmp_path):
+    writer = _index(str(tmp_path))
+    writer.commit()
+    reader = TagIndex(str(tmp_path))
+    assert sorted(reader.select("设计文档").ids()) == ["c1", "c2"]
+
+    writer.set_tags(["c3"], [["设计文档"]])
+    writer.remove(["c2"])
+    writer.commit()
+    assert reader.refresh() == 1
+    assert sorted(reader.select("设计文档").ids()) == ["c1", "c3"]
@@ -0,0 +1,120 @@
+"""
+单元测试：VectorDBClient.upsert_chunks 流式分批写入
+"""
+import time
+
+import numpy as np
+import pytest
+from core.embedding import EmbeddingEngine
+from core.models import Chunk, EmbeddingConfig
+
+
+class _SlowCollection:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        time.sleep(self.delay)
+        self.batches.append(documents)
+
+
+class _SlowEngine(EmbeddingEngine):
+    def __init__(self, delay: float):
+        super().__init__(EmbeddingConfig(dim=2))
+        self.delay = delay
+
+    def _embed_batch(self, texts):
+        time.sleep(self.delay)
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+
+@pytest.mark.asyncio
+async def test_async_iterator_respects_backend_max_batch(make_vectordb):
+    """异步迭代器输入，批大小受后端 max_batch_size 限制。"""
+    async def gen():
+        for i in range(5):
+            yield Chunk(id=f"c{i}", text=f"段落{i}", metadata={"filename": "a.pdf"})
+
+    coll = _SlowCollection()
+    ids = await make_vectordb(coll, max_batch_size=2).upsert_chunks(gen(), batch_size=3)
+    assert ids == [f"c{i}" for i in range(5)]
+    assert [len(b) for b in coll.batches] == [2, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_embedding_overlaps_previous_write(make_vectordb):
+    """第 N 批写入与第 N+1 批向量化并行。"""
+    coll = _SlowCollection(delay=0.1)
+    client = make_vectordb(coll, max_batch_size=2, embedder=_SlowEngine(delay=0.1))
+    chunks = [Chunk(text=f"段落{i}") for i in range(8)]
+    t0 = time.perf_counter()
+    await client.upsert_chunks(iter(chunks))
+    # 串行需 4×(0.1+0.1)=0.8s，流水线约 0.5s
+    assert time.perf_counter() - t0 < 0.7
+    assert sum(len(b) for b in coll.batches) == 8
+
+
+class _ScoredCollection:
+    def __init__(self, name, scores):
+        self.name = name
+        self.scores = scores
+
+    def query(self, query_texts, n_results):
+        ids = [f"{self.name}-{i}" for i in range(len(self.scores))][:n_results]
+        return {
+            "ids": [ids],
+            "documents": [["段落"] * len(ids)],
+            "metadatas": [[{"filename": f"{self.name}.pdf"}] * len(ids)],
+            "distances": [[1 - s for s in self.scores][:n_results]],
+        }
+
+
+@pytest.mark.asyncio
+async def test_search_collections_merges_by_score(make_vectordb):
+    """每个 collection 各自的句柄；合并后按分数取全局 top_k。"""
+    scores = {"qa_docs": [0.9, 0.5], "rd_docs": [0.8, 0.7]}
+    client = make_vectordb(factory=lambda name: _ScoredCollection(name, scores[name]))
+    client.embedder = None
+    results = await client.search_collections("设计评审", ["qa_docs", "rd_docs"], top_k=3)
+    assert [r.id for r in results] == ["qa_docs-0", "rd_docs-0", "rd_docs-1"]
+    assert results[1].metadata["collection"] == "rd_docs"
+    with pytest.raises(ValueError):
+        await client.search_collections("设计评审", ["../etc"])
+
+
+def test_side_indexes_shared_across_clients(tmp_path, make_vectordb):
+    """同一 persist_dir 的多个实例共用一份侧索引。"""
+    a = make_vectordb(_SlowCollection())
+    b = make_vectordb(_SlowCollection())
+    assert a._get_bm25("shared") is b._get_bm25("shared")
+    assert a._get_registry("shared") is b._get_registry("shared")
+    assert make_vectordb(_SlowCollection(), tmp_path / "other")._get_registry("shared") is not a._get_registry("shared")
+
+
+@pytest.mark.asyncio
+async def test_pinned_handle_survives_eviction(make_vectordb, monkeypatch):
+    """写入期间句柄被占用，打开其他 collection 不会把它淘汰、丢掉未 commit 的侧索引变更。"""
+    from core.config import settings
+
+    monkeypatch.setattr(settings, "VECTORDB_MAX_COLLECTIONS", 1)
+    client = make_vectordb(_SlowCollection())
+    with client._pinned("coll_a") as handle:
+        handle.tags.set_tags(["c1"], [["CAPA"]])
+        client._handle("coll_b")
+        client._handle("coll_c")
+        assert client._handle("coll_a") is handle
+    # 释放后按 LRU 淘汰
+    client._handle("coll_d")
+    assert client._handle("coll_a") is not handle
+
+    # upsert 全程占用：写批次之间打开其他 collection 不影响最终 commit
+    async def gen():
+        yield Chunk(id="x1", text="段落1", metadata={"filename": "a.pdf"})
+        client._handle("coll_e")
+        yield Chunk(id="x2", text="段落2", metadata={"filename": "a.pdf"})
+        client._handle("coll_f")
+        yield Chunk(id="x3", text="段落3", metadata={"filename": "a.pdf"})
+
+    await client.upsert_chunks(gen(), collection="coll_g", batch_size=1)
+    assert client._get_registry("coll_g").ids("a.pdf") == ["x1", "x2", "x3"]